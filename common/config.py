@@ -24,6 +24,7 @@ class DicomTarget(BaseModel):
 
 
 mri4_all_config_path = Path(runtime.get_base_path()) / "config/mri4all.json"
+fftw_wisdom_path = Path(runtime.get_base_path()) / "config/fftw_wisdom.pickle"
 
 
 class Configuration(BaseModel):
@@ -34,6 +35,17 @@ class Configuration(BaseModel):
     scanner_ip: str = Field(default="10.42.0.251", description="Scanner IP (internal)")
     debug_mode: str = Field(default="False", description="Debug Mode")
     hardware_simulation: str = Field(default="False", description="Hardware Simulation")
+    recon_max_workers: int = Field(default=2, description="Parallel Reconstructions")
+    recon_fft_backend: str = Field(
+        default="scipy", description="FFT Backend (numpy, scipy, pyfftw)"
+    )
+    recon_fft_workers: int = Field(default=-1, description="FFT Threads (-1 = all)")
+    recon_cache_size_mb: int = Field(
+        default=2048, description="Recon Cache Size (MB, 0 = off)"
+    )
+    seq_cache_size_mb: int = Field(
+        default=1024, description="Sequence Cache Size (MB, 0 = off)"
+    )
     dicom_targets: List[DicomTarget] = []
 
     @classmethod
@@ -17,6 +17,9 @@ class mri4all_paths:
     DATA_FAILURE = DATA + "/failure"
     DATA_ARCHIVE = DATA + "/archive"
     DATA_STATE = DATA + "/state"
+    DATA_ACQ_PREPARED = DATA + "/acq_prepared"
+    DATA_CACHE = DATA + "/cache"
+    DATA_CACHE_SEQ = DATA_CACHE + "/sequences"
 
 
 class mri4all_files:
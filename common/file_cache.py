@@ -0,0 +1,132 @@
+"""
+Size-limited cache of files in a folder, used by the reconstruction stage cache and the sequence
+cache. Entries are files or folders named by a content-addressed key. They are written under a
+temporary name and then renamed, so that other processes never read partial entries, and the least
+recently used entries are evicted when the cache exceeds its size limit.
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, List
+
+import common.logger as logger
+
+log = logger.get_logger()
+
+HASH_CHUNK_SIZE = 1024 * 1024
+TEMP_SUFFIX = ".tmp"
+
+
+def update_digest(digest: Any, file_path: str) -> None:
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+
+def hash_file(file_path: str) -> str:
+    """Returns a hash of the content of the given file"""
+    digest = hashlib.sha256()
+    update_digest(digest, file_path)
+    return digest.hexdigest()
+
+
+def hash_files(file_paths: List[str]) -> str:
+    """Returns a hash of the names and content of the given files (missing files included)"""
+    digest = hashlib.sha256()
+    for file_path in file_paths:
+        digest.update(os.path.basename(file_path).encode())
+        if not os.path.exists(file_path):
+            digest.update(b"missing")
+            continue
+        update_digest(digest, file_path)
+    return digest.hexdigest()
+
+
+def hash_description(description: Dict[str, Any]) -> str:
+    """Returns the key of an entry, given a description of all settings that affect its content"""
+    text = json.dumps(description, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def get_size(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(folder, file))
+        for folder, _, files in os.walk(path)
+        for file in files
+    )
+
+
+def remove(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class FileCache:
+    def __init__(self, folder: str, max_size_mb: int):
+        self.folder = folder
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self.enabled = max_size_mb > 0
+        if self.enabled and not os.path.isdir(folder):
+            try:
+                os.makedirs(folder, exist_ok=True)
+            except OSError as e:
+                log.warning(f"Unable to create cache folder {folder}: {e}")
+                self.enabled = False
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def is_entry(self, entry: os.DirEntry) -> bool:
+        """Selects the entries of the folder that belong to the cache (and count for its size)"""
+        return not entry.name.endswith(TEMP_SUFFIX)
+
+    def touch(self, name: str) -> None:
+        # The modification time is used as time of last use for the eviction
+        os.utime(self.path(name))
+
+    def write(self, name: str, write_entry: Callable[[str], None]) -> bool:
+        """
+        Creates an entry by calling write_entry with a temporary path, which is renamed to the
+        entry afterwards. Returns False if the entry could not be written.
+        """
+        if not self.enabled:
+            return False
+        entry_path = self.path(name)
+        temp_path = f"{entry_path}.{os.getpid()}{TEMP_SUFFIX}"
+        try:
+            write_entry(temp_path)
+            if os.path.isdir(entry_path):
+                shutil.rmtree(entry_path, ignore_errors=True)
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            log.warning(f"Unable to write cache entry {name}: {e}")
+            remove(temp_path)
+            return False
+        self.evict()
+        return True
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits into its size limit"""
+        entries = []
+        for entry in os.scandir(self.folder):
+            if not self.is_entry(entry):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, get_size(entry.path), entry.path))
+            except OSError:
+                continue
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                remove(path)
+            except OSError:
+                pass
+            total_size -= size
@@ -58,9 +58,12 @@ def is_terminated() -> bool:
 
 
 class AsyncTimer(object):
-    def __init__(self, interval: float, func):
+    """Calls func periodically. If a trigger event is provided, func is also called as soon as the event is set."""
+
+    def __init__(self, interval: float, func, trigger: Optional[asyncio.Event] = None):
         self.func = func
         self.time = interval
+        self.trigger = trigger
         self.is_running = False
         self._task: Optional[asyncio.Task] = None
 
@@ -73,11 +76,21 @@ class AsyncTimer(object):
     def stop(self) -> None:
         """Signal to stop after the current"""
         self.is_running = False
+        if self.trigger is not None:
+            # Wake up the timer so that it terminates immediately
+            self.trigger.set()
 
     async def _run(self) -> None:
         global terminate_process
         while self.is_running:
-            await asyncio.sleep(self.time)
+            if self.trigger is None:
+                await asyncio.sleep(self.time)
+            else:
+                try:
+                    await asyncio.wait_for(self.trigger.wait(), self.time)
+                except asyncio.TimeoutError:
+                    pass
+                self.trigger.clear()
             if terminate_process:
                 self.stop()
 
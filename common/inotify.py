@@ -0,0 +1,94 @@
+"""
+Minimal wrapper around the Linux inotify API. It is implemented with ctypes, so that no additional
+package needs to be installed. On systems without inotify support, creating an Inotify instance
+raises an OSError, which callers should handle by falling back to polling.
+"""
+import os
+import struct
+import ctypes
+import ctypes.util
+from typing import List, Tuple, Optional
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Layout of struct inotify_event (without the variable-length name)
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+_libc: Optional[ctypes.CDLL] = None
+
+
+def _get_libc() -> ctypes.CDLL:
+    global _libc
+    if _libc is None:
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("Unable to locate libc")
+        _libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(_libc, "inotify_init1"):
+            _libc = None
+            raise OSError("inotify is not supported on this system")
+    return _libc
+
+
+class Inotify:
+    """Non-blocking inotify instance. The file descriptor can be registered with an asyncio loop via fileno()."""
+
+    def __init__(self):
+        libc = _get_libc()
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Adds a watch for the given path and returns the watch descriptor."""
+        wd = _get_libc().inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        # Failures are ignored, as the kernel removes watches automatically when the target is deleted
+        _get_libc().inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        """Returns all pending events as list of (watch descriptor, mask, name) tuples."""
+        events: List[Tuple[int, int, str]] = []
+        while True:
+            try:
+                buffer = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            if not buffer:
+                break
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset : offset + name_len].rstrip(b"\0")
+                offset += name_len
+                events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -1,2 +1,2 @@
-from .ipc import Communicator
+from .ipc import Communicator, Transport
 from . import messages
\ No newline at end of file
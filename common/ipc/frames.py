@@ -0,0 +1,66 @@
+"""
+Length-prefixed binary frames for the socket transport of the Communicator. Objects are serialized with
+pickle protocol 5. Buffers of objects that support out-of-band pickling (e.g., NumPy arrays) are sent
+as raw bytes after the pickle stream, so that large arrays are neither copied into the pickle stream
+nor converted into lists.
+
+Frame layout (little endian):
+    uint64 pickle length | uint32 buffer count | uint64 length of each buffer | pickle | buffers
+"""
+import pickle
+import socket
+import struct
+from typing import Any, List
+
+
+_FRAME_HEADER = struct.Struct("<QI")
+_BUFFER_LENGTH = struct.Struct("<Q")
+
+
+def write_frame(sock: socket.socket, obj: Any) -> int:
+    """Sends the object as a single frame through the socket. Returns the number of bytes sent."""
+    buffers: List[pickle.PickleBuffer] = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+
+    header = bytearray(_FRAME_HEADER.pack(len(payload), len(raw_buffers)))
+    for raw in raw_buffers:
+        header += _BUFFER_LENGTH.pack(raw.nbytes)
+
+    # Small frames are sent with a single call, large buffers are sent without copying them first
+    sock.sendall(bytes(header) + payload)
+    sent = len(header) + len(payload)
+    for raw in raw_buffers:
+        sock.sendall(raw)
+        sent += raw.nbytes
+    return sent
+
+
+def _read_exactly(sock: socket.socket, length: int) -> bytearray:
+    data = bytearray(length)
+    view = memoryview(data)
+    received = 0
+    while received < length:
+        count = sock.recv_into(view[received:], length - received)
+        if count == 0:
+            raise EOFError("Connection closed")
+        received += count
+    return data
+
+
+def read_frame(sock: socket.socket) -> Any:
+    """Receives a single frame from the socket. Raises EOFError if the connection has been closed."""
+    payload_length, buffer_count = _FRAME_HEADER.unpack(
+        _read_exactly(sock, _FRAME_HEADER.size)
+    )
+    buffer_lengths = []
+    if buffer_count > 0:
+        lengths_data = _read_exactly(sock, buffer_count * _BUFFER_LENGTH.size)
+        buffer_lengths = [
+            _BUFFER_LENGTH.unpack_from(lengths_data, i * _BUFFER_LENGTH.size)[0]
+            for i in range(buffer_count)
+        ]
+
+    payload = _read_exactly(sock, payload_length)
+    buffers = [_read_exactly(sock, length) for length in buffer_lengths]
+    return pickle.loads(payload, buffers=buffers)
@@ -1,9 +1,16 @@
 import atexit
+import errno
 import json
 import os
+import socket
+import selectors
+import stat
+import struct
+import asyncio
+import concurrent.futures
 from pathlib import Path
 from time import sleep
-from typing import Any, Dict, Literal, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 from uuid import uuid5
 import uuid
 
@@ -16,10 +23,11 @@ import common.logger as logger
 log = logger.get_logger()
 
 import threading
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from common.constants import *
 from common.ipc.messages import *
+import common.ipc.frames as frames
 
 from common.types import ScanTask
 import common.helper as helper
@@ -38,10 +46,12 @@ class PipeFile(Enum):
 
 class CommunicatorEnvelope(BaseModel):
     """
-    Contains a message, an id, and an error bool
+    Contains a message, an id, and an error bool. Responses carry the id of the request they
+    answer in reply_to.
     """
 
-    id: str = str(uuid.uuid1())
+    id: str = Field(default_factory=lambda: str(uuid.uuid1()))
+    reply_to: str = ""
     value: Union[
         UserResponseMessage,
         UserQueryMessage,
@@ -52,6 +62,7 @@ class CommunicatorEnvelope(BaseModel):
         IntensityMapResult,
         DoShimMessage,
         AcqDataMessage,
+        SharedArrayMessage,
     ]
     error: bool = False
 
@@ -70,6 +81,264 @@ class PipeEnd(Enum):
     UI_RECON = (PipeFile.UI_RECON, PipeFile.RECON)
 
 
+class Transport(Enum):
+    """
+    Available transports between the Communicator ends.
+
+    FIFO: Each message is written as JSON line into a named pipe, which is opened again for every message.
+    SOCKET: Messages are sent as length-prefixed pickle frames through a persistent Unix domain socket
+            connection, so that arrays contained in the messages are transferred as raw buffers.
+    """
+
+    FIFO = "fifo"
+    SOCKET = "socket"
+
+
+class SocketChannel:
+    """
+    Endpoint of the socket transport. Listens for frames on the in-socket and keeps a persistent
+    connection to the in-socket of the other end for sending. All Communicator instances of a process
+    that use the same pipe end share one channel (see get_socket_channel).
+
+    The in-socket is only created when the process starts receiving (see bind), as Communicator
+    instances are also created by modules that are imported by processes that never receive on the
+    pipe end (e.g., the sequence modules imported by the UI).
+    """
+
+    def __init__(self, in_file: str, out_file: str):
+        self.in_file = in_file
+        self.out_file = out_file
+        self.send_lock = threading.Lock()
+        self.receive_lock = threading.Lock()
+        self.bind_lock = threading.Lock()
+        self.out_socket: Optional[socket.socket] = None
+        self.server: Optional[socket.socket] = None
+        self.selector = selectors.DefaultSelector()
+        atexit.register(self.close)
+
+    def bind(self) -> None:
+        """Creates the in-socket, unless it has already been created by this process."""
+        with self.bind_lock:
+            if self.server is not None:
+                return
+
+            # Remove stale socket file from previous runs, similar to mkfifo. A socket file with a
+            # live listener belongs to another process that receives on the same pipe end, which
+            # must not be replaced
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.in_file)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                os.unlink(self.in_file)
+            else:
+                raise OSError(
+                    errno.EADDRINUSE,
+                    "Pipe end is already used by another process",
+                    self.in_file,
+                )
+            finally:
+                probe.close()
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(self.in_file)
+            server.listen(4)
+            self.selector.register(server, selectors.EVENT_READ)
+            self.server = server
+
+    @staticmethod
+    def _is_same_user(connection: socket.socket) -> bool:
+        # Received frames are unpickled, so only connections from the same user are accepted
+        credentials = connection.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid == os.getuid()
+
+    def _connect(self) -> bool:
+        if not os.path.exists(self.out_file):
+            return False
+        out_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            out_socket.connect(self.out_file)
+        except OSError:
+            # Socket file exists, but the other end is not running
+            out_socket.close()
+            return False
+        self.out_socket = out_socket
+        return True
+
+    def _disconnect(self) -> None:
+        if self.out_socket is not None:
+            try:
+                self.out_socket.close()
+            except OSError:
+                pass
+        self.out_socket = None
+
+    def send(self, obj: Any) -> bool:
+        with self.send_lock:
+            # If sending fails, the other end might have been restarted. Try once more with a new connection
+            for _ in range(2):
+                if self.out_socket is None and not self._connect():
+                    return False
+                try:
+                    frames.write_frame(self.out_socket, obj)  # type: ignore
+                    return True
+                except OSError:
+                    self._disconnect()
+            return False
+
+    def receive(self) -> Any:
+        """Blocks until the next frame has been received from any connection and returns the object."""
+        self.bind()
+        with self.receive_lock:
+            while True:
+                for key, _ in self.selector.select():
+                    if key.fileobj is self.server:
+                        connection, _ = self.server.accept()
+                        if not self._is_same_user(connection):
+                            log.warning("Rejected IPC connection from another user")
+                            connection.close()
+                            continue
+                        self.selector.register(connection, selectors.EVENT_READ)
+                        continue
+                    connection = key.fileobj  # type: ignore
+                    try:
+                        return frames.read_frame(connection)
+                    except (EOFError, OSError):
+                        self.selector.unregister(connection)
+                        connection.close()
+
+    def close(self) -> None:
+        self._disconnect()
+        if self.server is None:
+            # The socket file belongs to another process (or does not exist)
+            return
+        try:
+            os.unlink(self.in_file)
+        except:
+            log.info(
+                f"Unable to remove socket file {self.in_file}, but not to worry about"
+            )
+
+
+# IPC can be disabled in worker processes forked from a service, as these must not write into the
+# connections inherited from the parent process
+ipc_enabled = True
+
+
+def disable_ipc() -> None:
+    """Disables sending messages from the current process (all sends fail silently)."""
+    global ipc_enabled
+    ipc_enabled = False
+
+
+socket_channels: Dict[str, SocketChannel] = {}
+socket_channels_lock = threading.Lock()
+
+
+def get_socket_channel(in_file: str, out_file: str) -> SocketChannel:
+    """Returns the socket channel for the given pipe end, which is created when called for the first time."""
+    with socket_channels_lock:
+        if in_file not in socket_channels:
+            socket_channels[in_file] = SocketChannel(in_file, out_file)
+        return socket_channels[in_file]
+
+
+class Dispatcher:
+    """
+    Receives the messages arriving at a pipe end in a background thread. Responses are matched to the
+    pending queries by their request id, so that several queries can be in flight at the same time.
+    All other messages are forwarded to the listening Communicator instances. All Communicator
+    instances of a process that use the same pipe end share one dispatcher (see get_dispatcher).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending: Dict[str, concurrent.futures.Future] = {}
+        self.listeners: List["Communicator"] = []
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, source) -> None:
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, args=(source,), daemon=True)
+            self.thread.start()
+
+    def add_listener(self, communicator: "Communicator") -> None:
+        with self.lock:
+            if communicator in self.listeners:
+                raise Exception("already listening")
+            self.listeners.append(communicator)
+
+    def add_pending(self, request_id: str) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self.lock:
+            self.pending[request_id] = future
+        return future
+
+    def remove_pending(self, request_id: str) -> None:
+        with self.lock:
+            self.pending.pop(request_id, None)
+
+    def _run(self, source) -> None:
+        for envelope in source:
+            try:
+                self.dispatch(envelope)
+            except Exception as e:
+                log.exception(e)
+
+    def dispatch(self, envelope: CommunicatorEnvelope) -> None:
+        with self.lock:
+            future = self.pending.pop(envelope.reply_to, None)
+            if (
+                future is None
+                and not envelope.reply_to
+                and isinstance(envelope.value, UserResponseMessage)
+                and len(self.pending) == 1
+            ):
+                # Response from an end that does not send request ids. Can only be matched if
+                # there is a single query in flight
+                future = self.pending.pop(next(iter(self.pending)))
+            listeners = list(self.listeners)
+
+        if future is not None:
+            future.set_result(envelope)
+            return
+
+        if not listeners:
+            log.warning(f"Dropping unexpected message of type {envelope.value.type}")
+        for listener in listeners:
+            listener.received.emit(envelope)
+
+
+def prepare_pipe_folder(folder: str) -> None:
+    """
+    Creates the folder for the pipe files, accessible only by the current user. Fails if the folder
+    has been created by another user, who could otherwise send messages through the pipe ends.
+    """
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    folder_stat = os.lstat(folder)
+    if not stat.S_ISDIR(folder_stat.st_mode) or folder_stat.st_uid != os.getuid():
+        raise PermissionError(f"Pipe folder {folder} is not owned by the current user")
+    if stat.S_IMODE(folder_stat.st_mode) != 0o700:
+        os.chmod(folder, 0o700)
+
+
+dispatchers: Dict[str, Dispatcher] = {}
+dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(in_file: str) -> Dispatcher:
+    """Returns the dispatcher for the given pipe end, which is created when called for the first time."""
+    with dispatchers_lock:
+        if in_file not in dispatchers:
+            dispatchers[in_file] = Dispatcher()
+        return dispatchers[in_file]
+
+
 class Communicator(QObject, Helper):
     """
     Use this mechanism to communicate between the UI and the acquisition / recon services.
@@ -84,6 +353,10 @@ class Communicator(QObject, Helper):
 
     These are handled in services/ui/examination.py:ExaminationWindow.received_message
 
+    Queries are matched with their responses by request id, so multiple queries can be in flight. From
+    asyncio code, queries can be awaited without blocking the event loop:
+        result = await communicator.query(UserQueryMessage(request="Pick a number"))
+
     """
 
     RECON = PipeEnd.RECON
@@ -92,21 +365,26 @@ class Communicator(QObject, Helper):
     UI_RECON = PipeEnd.UI_RECON
 
     received = pyqtSignal(object)
-    receive_thread = None
     base = "/tmp/mri4all/pipes"
     pipe_end = None
 
-    def __init__(self, pipe_end: PipeEnd):
+    def __init__(self, pipe_end: PipeEnd, transport: Transport = Transport.SOCKET):
         in_, out_ = pipe_end.value
         self.pipe_end = pipe_end
+        self.transport = transport
         super().__init__()
-        Path(self.base).mkdir(parents=True, exist_ok=True)
-
-        self.in_file = str(Path(self.base, in_.value))
-        self.out_file = str(Path(self.base, out_.value))
-
-        self.mkfifo(str(self.in_file))
-        atexit.register(self.cleanup)
+        prepare_pipe_folder(self.base)
+
+        if self.transport == Transport.SOCKET:
+            self.in_file = str(Path(self.base, in_.value + ".sock"))
+            self.out_file = str(Path(self.base, out_.value + ".sock"))
+            self.channel = get_socket_channel(self.in_file, self.out_file)
+        else:
+            self.in_file = str(Path(self.base, in_.value))
+            self.out_file = str(Path(self.base, out_.value))
+            self.mkfifo(str(self.in_file))
+            atexit.register(self.cleanup)
+        self.dispatcher = get_dispatcher(self.in_file)
 
     def is_open(self):
         if not os.path.exists(self.out_file):
@@ -122,24 +400,66 @@ class Communicator(QObject, Helper):
             )
 
     def listen(self):
-        if self.receive_thread:
-            raise Exception("already listening")
-        self.receive_thread = threading.Thread(target=self._listen_emit, daemon=True)
-        self.receive_thread.start()
+        """Forwards all incoming messages that are not responses to queries through the received signal."""
+        self.dispatcher.add_listener(self)
+        self.start_dispatcher()
+
+    def start_dispatcher(self):
+        """Starts receiving messages in the background. Needed for queries, called automatically."""
+        if self.transport == Transport.SOCKET:
+            # Fails here (and not in the background thread) if another process receives on the pipe end
+            self.channel.bind()
+        self.dispatcher.start(self._listen())
+
+    def _send(self, obj: FifoMessageType, error=False, reply_to: str = ""):
+        return self._send_envelope(
+            CommunicatorEnvelope(value=obj, error=error, reply_to=reply_to)
+        )
+
+    def _send_envelope(self, envelope: CommunicatorEnvelope):
+        if not ipc_enabled:
+            return False
+
+        if self.transport == Transport.SOCKET:
+            return self.channel.send(envelope)
 
-    def _send(self, obj: FifoMessageType, error=False):
         if not os.path.exists(self.out_file):
             return False
         with open(self.out_file, "w") as f:
-            f.write(CommunicatorEnvelope(value=obj, error=error).model_dump_json())
+            f.write(envelope.model_dump_json())
             f.write("\n")
         return True
 
-    def _query(self, obj):
-        if not self._send(obj):
+    def _request(
+        self, obj: FifoMessageType
+    ) -> Tuple[str, concurrent.futures.Future]:
+        self.start_dispatcher()
+        envelope = CommunicatorEnvelope(value=obj)
+        future = self.dispatcher.add_pending(envelope.id)
+        if not self._send_envelope(envelope):
+            self.dispatcher.remove_pending(envelope.id)
             raise Exception("Other end of the pipe is not available.")
+        return envelope.id, future
+
+    def _query(self, obj, timeout: Optional[float] = None):
+        request_id, future = self._request(obj)
+        try:
+            result = future.result(timeout)
+        finally:
+            self.dispatcher.remove_pending(request_id)
+
+        if result.error:
+            raise Exception("IPC query failed")
+        return result.value
+
+    async def query(self, obj: FifoMessageType, timeout: Optional[float] = None):
+        """Sends the message and waits for the response without blocking the asyncio loop."""
+        request_id, future = self._request(obj)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        finally:
+            self.dispatcher.remove_pending(request_id)
 
-        result = next(self._listen())
         if result.error:
             raise Exception("IPC query failed")
         return result.value
@@ -160,15 +480,15 @@ class Communicator(QObject, Helper):
             os.mkfifo(FIFO)
 
     def _listen(self):
+        if self.transport == Transport.SOCKET:
+            while True:
+                yield self.channel.receive()
+
         while True:
             with open(self.in_file) as fifo:
                 for line in fifo:
                     yield self.parse(line)
 
-    def _listen_emit(self):
-        for o in self._listen():
-            self.received.emit(o)
-            # self.handle(o)
 
 
 # def new_user_values(values):
@@ -67,11 +67,37 @@ class AcqDataMessage(FifoMessageType):
     disable_statustimer: bool = False
 
 
+SharedArrayTarget = Literal["shim", "plot", "image"]
+
+
+class SharedArrayMessage(FifoMessageType):
+    """
+    Descriptor of an array that has been placed into the shared-memory ring of the sending service
+    (see common/ipc/shared_arrays.py). The array data itself is not part of the message.
+    """
+
+    type: Literal["shared_array"] = "shared_array"
+    name: str
+    offset: int
+    dtype: str
+    shape: List[int]
+    sequence: int
+    target: SharedArrayTarget = "plot"
+    xlabel: str = ""
+    ylabel: str = ""
+    title: str = ""
+
+
 class Helper:
     def show_dicoms(self, dicoms: List[str]):
         return self._query(ShowDicomMessage(dicom_files=dicoms))
 
-    def do_shim(self, new_user_values, new_signal, signal_tick_mul=4, values_tick=0.1):
+    def do_shim(self, new_user_values, new_signal, signal_tick_mul=1, values_tick=0.1):
+        """
+        Runs the interactive shimming loop. The user values are polled every values_tick seconds and a new
+        signal is acquired every signal_tick_mul ticks. As the signal is streamed through shared memory,
+        it can be acquired at every tick.
+        """
         log = logger.get_logger()
         self.shim_start()
 
@@ -104,7 +130,39 @@ class Helper:
         return self._query(DoShimMessage(message="get"))
 
     def shim_put(self, data):
-        self._send(DoShimMessage(message="put", data=data))
+        # The signal is streamed through shared memory, so that the UI can be updated at the rate
+        # of the scanner
+        self.publish_array(data, target="shim")
+
+    def publish_array(self, data, target: SharedArrayTarget = "plot", **kwargs):
+        """
+        Sends an array to the UI through the shared-memory ring without waiting for a response. Only a
+        small descriptor message is sent through the pipe.
+        """
+        from common.ipc.shared_arrays import get_shared_array_ring
+
+        return self._send(get_shared_array_ring().publish(data, target, **kwargs))
+
+    def show_array(
+        self,
+        data,
+        target: SharedArrayTarget = "plot",
+        *,
+        xlabel: str = "",
+        ylabel: str = "",
+        title: str = "",
+    ):
+        """
+        Shows a NumPy array as plot (1D/2D) or image (2D/3D) in a dialog. Other than show_plot and
+        show_image, the data is transferred through shared memory instead of converting it to lists.
+        """
+        from common.ipc.shared_arrays import get_shared_array_ring
+
+        return self._query(
+            get_shared_array_ring().publish(
+                data, target, xlabel=xlabel, ylabel=ylabel, title=title
+            )
+        )
 
     def show_image(
         self,
@@ -138,11 +196,14 @@ class Helper:
             )
         return self._query(ShowPlotMessage(plot=plot))
 
-    def send_user_response(self, response=None, error=False):
+    def send_user_response(self, response=None, error=False, reply_to: str = ""):
         """
         Sends the user's response from the UI.
+        reply_to: Id of the envelope of the query that is answered
         """
-        return self._send(UserResponseMessage(response=response), error=error)
+        return self._send(
+            UserResponseMessage(response=response), error=error, reply_to=reply_to
+        )
 
     def send_user_alert(
         self,
@@ -182,7 +243,7 @@ class Helper:
     def send_status(self, message: str):
         return self._send(SetStatusMessage(message=message))
 
-    def _send(self, x: FifoMessageType, error=False):
+    def _send(self, x: FifoMessageType, error=False, reply_to: str = ""):
         pass
 
     def _query(self, x: FifoMessageType):
@@ -0,0 +1,180 @@
+"""
+Shared-memory ring buffer for streaming NumPy arrays from the acquisition/reconstruction services to the UI.
+The producing service copies the array into a shared-memory segment and sends only a small descriptor
+(SharedArrayMessage) through the Communicator. The UI maps the same segment and reads the array from
+there, so that the array data never needs to be serialized.
+
+Each record in the ring starts with a header of two int64 values (sequence number, size in bytes). The
+sequence number is invalidated while a record is written, so that readers can detect if a record has been
+overwritten by newer data while reading it.
+"""
+import atexit
+import threading
+from multiprocessing import shared_memory
+from multiprocessing import resource_tracker
+from typing import Optional
+
+import numpy as np
+
+import common.logger as logger
+from common.ipc.messages import SharedArrayMessage, SharedArrayTarget
+
+log = logger.get_logger()
+
+DEFAULT_RING_SIZE = 64 * 1024 * 1024
+_RECORD_HEADER_SIZE = 16
+_RECORD_ALIGNMENT = 64
+_INVALID_SEQUENCE = -1
+
+
+def _aligned(size: int) -> int:
+    return (size + _RECORD_ALIGNMENT - 1) // _RECORD_ALIGNMENT * _RECORD_ALIGNMENT
+
+
+class SharedArrayRing:
+    """Producer side of the shared-memory ring. Arrays are written sequentially and the ring wraps around."""
+
+    def __init__(self, size: int = DEFAULT_RING_SIZE):
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.write_offset = 0
+        self.segment: Optional[shared_memory.SharedMemory] = None
+        self._allocate(size)
+        atexit.register(self.close)
+
+    def _allocate(self, size: int) -> None:
+        if self.segment is not None:
+            # Readers that have already mapped the old segment can still access it after unlinking
+            self.close()
+        self.segment = shared_memory.SharedMemory(create=True, size=_aligned(size))
+        self.write_offset = 0
+
+    def publish(
+        self, data, target: SharedArrayTarget = "plot", **kwargs
+    ) -> SharedArrayMessage:
+        """
+        Copies the array into the ring and returns the descriptor message that needs to be sent to the UI.
+        Additional keyword arguments are passed to the message (e.g., axis labels).
+        """
+        array = np.ascontiguousarray(data)
+        record_size = _aligned(_RECORD_HEADER_SIZE + array.nbytes)
+
+        with self.lock:
+            if self.segment is None or record_size > self.segment.size:
+                log.info(f"Increasing size of shared-memory ring to {2 * record_size} bytes")
+                self._allocate(2 * record_size)
+            assert self.segment is not None
+
+            if self.write_offset + record_size > self.segment.size:
+                self.write_offset = 0
+            offset = self.write_offset
+            self.write_offset += record_size
+            self.sequence += 1
+
+            header = np.ndarray((2,), dtype=np.int64, buffer=self.segment.buf, offset=offset)
+            header[0] = _INVALID_SEQUENCE
+            header[1] = array.nbytes
+            target_array = np.ndarray(
+                array.shape,
+                dtype=array.dtype,
+                buffer=self.segment.buf,
+                offset=offset + _RECORD_HEADER_SIZE,
+            )
+            target_array[...] = array
+            # Mark the record as valid once the data has been written completely
+            header[0] = self.sequence
+
+            return SharedArrayMessage(
+                name=self.segment.name,
+                offset=offset,
+                dtype=array.dtype.str,
+                shape=list(array.shape),
+                sequence=self.sequence,
+                target=target,
+                **kwargs,
+            )
+
+    def close(self) -> None:
+        if self.segment is None:
+            return
+        try:
+            self.segment.close()
+            self.segment.unlink()
+        except:
+            log.info(f"Unable to remove shared-memory segment {self.segment.name}")
+        self.segment = None
+
+
+class SharedArrayReader:
+    """Consumer side of the shared-memory ring. Maps the segment named in the descriptor messages."""
+
+    def __init__(self):
+        self.segment: Optional[shared_memory.SharedMemory] = None
+
+    def _attach(self, name: str) -> bool:
+        if self.segment is not None and self.segment.name == name:
+            return True
+        self.close()
+        try:
+            self.segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            log.warning(f"Shared-memory segment {name} not available")
+            return False
+        # The segment is owned by the producer. Prevent the resource tracker from removing it when
+        # the UI terminates
+        try:
+            resource_tracker.unregister(self.segment._name, "shared_memory")  # type: ignore
+        except Exception:
+            pass
+        return True
+
+    def read(self, message: SharedArrayMessage, copy: bool = True) -> Optional[np.ndarray]:
+        """
+        Returns the array described by the message, or None if the data has been overwritten already.
+        If copy is False, a view into the shared memory is returned, which is only valid until the
+        producer wraps around.
+        """
+        if not self._attach(message.name):
+            return None
+        assert self.segment is not None
+
+        header = np.ndarray(
+            (2,), dtype=np.int64, buffer=self.segment.buf, offset=message.offset
+        )
+        if header[0] != message.sequence:
+            return None
+
+        array = np.ndarray(
+            tuple(message.shape),
+            dtype=np.dtype(message.dtype),
+            buffer=self.segment.buf,
+            offset=message.offset + _RECORD_HEADER_SIZE,
+        )
+        if not copy:
+            return array
+
+        result = array.copy()
+        if header[0] != message.sequence:
+            # Record has been overwritten while copying
+            return None
+        return result
+
+    def close(self) -> None:
+        if self.segment is not None:
+            try:
+                self.segment.close()
+            except BufferError:
+                # Views into the segment are still in use. The mapping is released with them
+                pass
+            self.segment = None
+
+
+shared_array_ring: Optional[SharedArrayRing] = None
+
+
+def get_shared_array_ring() -> SharedArrayRing:
+    """Returns the shared-memory ring of the current process, which is created when called first."""
+    global shared_array_ring
+    if shared_array_ring is None:
+        shared_array_ring = SharedArrayRing()
+    return shared_array_ring
@@ -46,11 +46,11 @@ def new_signal(temp_folder):
     # return the new signal that is produced by user values. should return the FFT or whatever
     # MEASURE THE FFT OF THE SIGNAL
     rxd = abs(sequence_instance.rxd)
-    return rxd.tolist()
+    return rxd
 
 
 if __name__ == "__main__":
-    k = Communicator(Communicator.RECON)
+    k = Communicator(Communicator.ACQ)
 
     result = k.do_shim(new_user_values, new_signal)
     print("Final result", result)
@@ -1,6 +1,7 @@
 import os
 import time
-from typing import Dict
+import asyncio
+from typing import Dict, List, Optional, Set
 from pathlib import Path
 import common.runtime as rt
 import common.logger as logger
@@ -8,8 +9,15 @@ import common.logger as logger
 log = logger.get_logger()
 
 import common.helper as helper
+import common.inotify as inotify
 from common.constants import *
 
+# Interval for full rescans of the queue folders if change notifications are available. The rescan
+# only serves as fallback in case a notification gets lost.
+QUEUE_RESCAN_INTERVAL = 5.0
+# Interval for polling the queue folders if inotify is not supported by the system
+QUEUE_POLLING_INTERVAL = 0.1
+
 
 def create_folder(folder_path) -> bool:
     if not os.path.isdir(folder_path):
@@ -45,6 +53,12 @@ def check_and_create_folders() -> bool:
         return False
     if not create_folder(mri4all_paths.DATA_STATE):
         return False
+    if not create_folder(mri4all_paths.DATA_ACQ_PREPARED):
+        return False
+    if not create_folder(mri4all_paths.DATA_CACHE):
+        return False
+    if not create_folder(mri4all_paths.DATA_CACHE_SEQ):
+        return False
     if not prepare_state():
         return False
 
@@ -182,15 +196,226 @@ def get_scan_ready_for_acq() -> str:
     return scanpath_ready_for_acq
 
 
-def get_scan_ready_for_recon() -> str:
-    scanpath_ready_for_recon = ""
-
+def get_scans_ready_for_recon() -> List[str]:
+    """Returns the names of all scans in the recon queue that are not locked, sorted by their age."""
     folders = sorted(
         Path(mri4all_paths.DATA_QUEUE_RECON).iterdir(), key=os.path.getmtime
     )
-    for entry in folders:
-        if entry.is_dir() and (not (entry / mri4all_files.LOCK).exists()):
-            scanpath_ready_for_recon = entry.name
-            break
+    return [
+        entry.name
+        for entry in folders
+        if entry.is_dir() and (not (entry / mri4all_files.LOCK).exists())
+    ]
+
+
+def get_scan_ready_for_recon() -> str:
+    ready_scans = get_scans_ready_for_recon()
+    if ready_scans:
+        return ready_scans[0]
+    return ""
+
+
+class QueueWatcher:
+    """
+    Watches a queue folder and signals through an asyncio event when the content of the folder or of one
+    of the task folders has changed (e.g., a task has been added or the PREPARED/EDITING/LOCK markers have
+    been changed). This allows the services to rescan the queue only when needed. If inotify is not
+    available, the event is never set and the services fall back to polling the queue periodically.
+
+    The names of the changed tasks are collected as well and can be fetched with get_changed_tasks(). If
+    no asyncio loop is passed to start(), pending notifications are processed when calling poll().
+    """
+
+    FOLDER_EVENTS = (
+        inotify.IN_CREATE
+        | inotify.IN_DELETE
+        | inotify.IN_MOVED_FROM
+        | inotify.IN_MOVED_TO
+        | inotify.IN_ATTRIB
+    )
+
+    def __init__(self, folder_path: str, watch_tasks: bool = True):
+        self.folder_path = folder_path
+        self.watch_tasks = watch_tasks
+        self.event = asyncio.Event()
+        self.rescan_interval = QUEUE_POLLING_INTERVAL
+        self.notifier: Optional[inotify.Inotify] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.folder_wd = -1
+        # Watch descriptors of the task folders, needed to stop watching tasks that left the queue
+        self.task_watches: Dict[str, int] = {}
+        self.task_names: Dict[int, str] = {}
+        self.changed_tasks: Set[str] = set()
+        self.rescan_needed = True
+
+    def is_active(self) -> bool:
+        return self.notifier is not None
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> bool:
+        """Starts watching the queue folder. Returns False if the watcher has to fall back to polling."""
+        # Always scan the queue once after starting
+        self.event.set()
+        self.rescan_needed = True
+
+        try:
+            self.notifier = inotify.Inotify()
+            self.folder_wd = self.notifier.add_watch(
+                self.folder_path, self.FOLDER_EVENTS | inotify.IN_ONLYDIR
+            )
+        except OSError as e:
+            log.warning(
+                f"Unable to watch queue folder {self.folder_path} ({e}). Falling back to polling."
+            )
+            self.stop()
+            return False
+
+        self._watch_all_tasks()
 
-    return scanpath_ready_for_recon
+        if loop is not None:
+            self.loop = loop
+            self.loop.add_reader(self.notifier.fileno(), self._handle_events)
+        self.rescan_interval = QUEUE_RESCAN_INTERVAL
+        return True
+
+    def stop(self) -> None:
+        if self.notifier is not None:
+            if self.loop is not None:
+                self.loop.remove_reader(self.notifier.fileno())
+            self.notifier.close()
+        self.notifier = None
+        self.loop = None
+        self.task_watches.clear()
+        self.task_names.clear()
+        self.rescan_needed = True
+        self.rescan_interval = QUEUE_POLLING_INTERVAL
+
+    def poll(self) -> None:
+        """Processes pending notifications. Only needed if the watcher has been started without asyncio loop."""
+        if self.loop is None:
+            self._handle_events()
+
+    def get_changed_tasks(self) -> Optional[Set[str]]:
+        """
+        Returns the names of the tasks that have changed since the last call. Returns None if the changes
+        are unknown (e.g., after start or if notifications have been lost), so that a full rescan is needed.
+        """
+        self.poll()
+        if self.rescan_needed or self.notifier is None:
+            self.rescan_needed = False
+            self.changed_tasks.clear()
+            return None
+        changed_tasks = self.changed_tasks
+        self.changed_tasks = set()
+        return changed_tasks
+
+    def _watch_all_tasks(self) -> None:
+        if not self.watch_tasks:
+            return
+        for entry in os.scandir(self.folder_path):
+            if entry.is_dir():
+                self._watch_task(entry.name)
+
+    def _watch_task(self, task_name: str) -> None:
+        if self.notifier is None or not self.watch_tasks:
+            return
+        try:
+            wd = self.notifier.add_watch(
+                self.folder_path + "/" + task_name,
+                self.FOLDER_EVENTS | inotify.IN_ONLYDIR,
+            )
+        except OSError:
+            # Task folder has already been moved away again
+            return
+        self.task_watches[task_name] = wd
+        self.task_names[wd] = task_name
+
+    def _unwatch_task(self, task_name: str) -> None:
+        if self.notifier is None:
+            return
+        wd = self.task_watches.pop(task_name, None)
+        if wd is not None:
+            self.task_names.pop(wd, None)
+            self.notifier.rm_watch(wd)
+
+    def _handle_events(self) -> None:
+        if self.notifier is None:
+            return
+
+        changed = False
+        for wd, mask, name in self.notifier.read_events():
+            if mask & inotify.IN_IGNORED:
+                continue
+            changed = True
+            if mask & inotify.IN_Q_OVERFLOW:
+                # Events have been dropped, so the watches need to be rebuilt
+                for task_name in list(self.task_watches.keys()):
+                    self._unwatch_task(task_name)
+                self._watch_all_tasks()
+                self.rescan_needed = True
+                continue
+            if wd == self.folder_wd:
+                self.changed_tasks.add(name)
+                if mask & inotify.IN_ISDIR:
+                    if mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+                        self._watch_task(name)
+                    elif mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+                        self._unwatch_task(name)
+            elif wd in self.task_names:
+                self.changed_tasks.add(self.task_names[wd])
+
+        if changed:
+            self.event.set()
+
+
+class TaskStateIndex:
+    """
+    Keeps track of changes in all state folders of the data directory (i.e., the queue and processing
+    folders), so that the UI only needs to determine the state of tasks that have actually changed.
+    """
+
+    def __init__(self):
+        # Task folders are only watched in the acq queue, where the PREPARED marker determines the state
+        self.watchers = [
+            QueueWatcher(mri4all_paths.DATA_QUEUE_ACQ, watch_tasks=True),
+            QueueWatcher(mri4all_paths.DATA_ACQ, watch_tasks=False),
+            QueueWatcher(mri4all_paths.DATA_QUEUE_RECON, watch_tasks=False),
+            QueueWatcher(mri4all_paths.DATA_RECON, watch_tasks=False),
+            QueueWatcher(mri4all_paths.DATA_COMPLETE, watch_tasks=False),
+            QueueWatcher(mri4all_paths.DATA_FAILURE, watch_tasks=False),
+        ]
+        self.started = False
+
+    def start(self) -> bool:
+        self.started = True
+        success = True
+        for watcher in self.watchers:
+            if not watcher.start():
+                success = False
+        return success
+
+    def stop(self) -> None:
+        for watcher in self.watchers:
+            watcher.stop()
+        self.started = False
+
+    def invalidate(self) -> None:
+        """Enforces a full rescan during the next call of get_changed_tasks()."""
+        for watcher in self.watchers:
+            watcher.rescan_needed = True
+
+    def get_changed_tasks(self) -> Optional[Set[str]]:
+        """
+        Returns the names of the tasks that have changed state folder since the last call, or None
+        if a full rescan is needed.
+        """
+        if not self.started:
+            self.start()
+
+        changed_tasks: Optional[Set[str]] = set()
+        for watcher in self.watchers:
+            watcher_changes = watcher.get_changed_tasks()
+            if watcher_changes is None:
+                changed_tasks = None
+            elif changed_tasks is not None:
+                changed_tasks.update(watcher_changes)
+        return changed_tasks
@@ -0,0 +1,168 @@
+"""
+Append-only storage of raw data, organized by readouts. The raw data is written into a memory-mapped .npy
+file (readouts x samples) that is allocated with its final size when the acquisition starts. A second .npy
+file contains one flag per readout, which is set after the readout has been written. This allows the
+reconstruction to read readouts that have been completed while the acquisition is still running.
+
+Because the data file is a regular .npy file, it can still be read with np.load() once the acquisition
+has finished.
+
+Note: The marcos server returns all samples of a sequence in the reply to a single run command, so
+run_pulseq currently writes the complete data after the sequence has finished (see save_rawdata), and
+the reconstruction starts only after the acquisition. The readout index allows reconstructing while
+readouts arrive, as soon as the acquisition is able to deliver them in chunks.
+"""
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+import common.logger as logger
+
+log = logger.get_logger()
+
+INDEX_SUFFIX = ".index.npy"
+
+
+def get_index_path(file_path: str) -> str:
+    """Returns the path of the readout index that belongs to the given raw data file."""
+    if file_path.endswith(".npy"):
+        file_path = file_path[: -len(".npy")]
+    return file_path + INDEX_SUFFIX
+
+
+class RawDataWriter:
+    """Writes the readouts of an acquisition into the raw data file as they become available."""
+
+    def __init__(
+        self, file_path: str, readouts: int, samples: int, dtype=np.complex128
+    ):
+        self.file_path = file_path
+        self.index_path = get_index_path(file_path)
+        self.readouts = readouts
+        self.samples = samples
+        self.position = 0
+
+        for path in [self.file_path, self.index_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        # The index is created first, so that readers never see a data file without index
+        self.index = np.lib.format.open_memmap(
+            self.index_path, mode="w+", dtype=np.uint8, shape=(readouts,)
+        )
+        self.data = np.lib.format.open_memmap(
+            self.file_path, mode="w+", dtype=dtype, shape=(readouts, samples)
+        )
+
+    def append(self, readouts: np.ndarray) -> int:
+        """
+        Appends one or multiple readouts (shape samples, or readouts x samples). Returns the number of
+        readouts that have been written so far.
+        """
+        readouts = np.asarray(readouts).reshape(-1, self.samples)
+        count = readouts.shape[0]
+        if self.position + count > self.readouts:
+            raise ValueError(
+                f"Too many readouts for raw data file ({self.position + count} > {self.readouts})"
+            )
+
+        self.data[self.position : self.position + count] = readouts
+        self.data.flush()
+        # Only mark the readouts as completed after the data has been written
+        self.index[self.position : self.position + count] = 1
+        self.index.flush()
+        self.position += count
+        return self.position
+
+    def is_complete(self) -> bool:
+        return self.position == self.readouts
+
+    def close(self) -> None:
+        if not self.is_complete():
+            log.warning(
+                f"Raw data file closed with {self.position} of {self.readouts} readouts"
+            )
+        self.data.flush()
+        self.index.flush()
+        del self.data
+        del self.index
+
+
+def save_rawdata(file_path: str, data: np.ndarray, readouts: int) -> None:
+    """
+    Stores the received data in the readout-based format. If the data cannot be split into the given
+    number of readouts of equal size, the samples are stored as received with np.save() (without
+    index), so that the data of the acquisition is never lost.
+    """
+    data = np.asarray(data).reshape(-1)
+    if readouts < 1 or data.shape[0] % readouts != 0:
+        log.warning(
+            f"Unable to split {data.shape[0]} samples into {readouts} readouts. "
+            + "Storing samples without readout index."
+        )
+        index_path = get_index_path(file_path)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        np.save(file_path, data)
+        return
+    writer = RawDataWriter(file_path, readouts, data.shape[0] // readouts, data.dtype)
+    writer.append(data)
+    writer.close()
+
+
+class RawDataReader:
+    """
+    Reads readouts from a raw data file, while the acquisition might still be writing it. Files that have
+    been stored with np.save() (i.e., without index) are treated as completely written.
+    """
+
+    def __init__(self, file_path: str, samples: Optional[int] = None):
+        self.file_path = file_path
+        self.index_path = get_index_path(file_path)
+        self.data = np.load(file_path, mmap_mode="r")
+        if samples:
+            # Files stored with np.save() usually contain the samples of all readouts in a single row
+            self.data = self.data.reshape(-1, samples)
+        self.index: Optional[np.ndarray] = None
+        if os.path.exists(self.index_path):
+            self.index = np.load(self.index_path, mmap_mode="r")
+            if self.index.shape[0] != self.readouts:
+                # The data file has been replaced after the acquisition (e.g., by post-processing)
+                self.index = None
+
+    @property
+    def readouts(self) -> int:
+        return self.data.shape[0]
+
+    def completed_readouts(self) -> int:
+        """Returns the number of readouts at the beginning of the file that have been written completely."""
+        if self.index is None:
+            return self.readouts
+        missing = np.flatnonzero(self.index == 0)
+        if missing.size == 0:
+            return self.readouts
+        return int(missing[0])
+
+    def is_complete(self) -> bool:
+        return self.completed_readouts() == self.readouts
+
+    def wait_for_readouts(
+        self, count: int, timeout: float = 0, polling_interval: float = 0.1
+    ) -> int:
+        """
+        Waits until at least the given number of readouts is available, or until the timeout (in seconds)
+        has expired. Returns the number of completed readouts.
+        """
+        deadline = time.time() + timeout
+        completed = self.completed_readouts()
+        while completed < count and time.time() < deadline:
+            time.sleep(polling_interval)
+            completed = self.completed_readouts()
+        return completed
+
+    def read(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Returns a copy of the given range of readouts (readouts x samples)."""
+        if stop is None:
+            stop = self.readouts
+        return np.array(self.data[start:stop])
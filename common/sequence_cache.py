@@ -0,0 +1,197 @@
+"""
+Content-addressed cache for calculated and interpreted sequences, so that repeated scans with
+unchanged protocol parameters and system configuration skip the sequence calculation.
+
+Two kinds of entries are stored:
+
+- Calculated sequences: the files that calculate_sequence() writes into the working folder (the
+  .seq file, the phase encoding order, the ADC phases, ...). The key is derived from the sequence
+  name, the sequence parameters, the configuration values that the calculation depends on, and the
+  source code of the modules that calculate the sequence and of pypulseq.
+- Sequence programs: the instructions (flodict) and parameters created by the Pulseq interpreter
+  from a .seq file, and the machine code compiled from the instructions by the marcos client. The
+  key is derived from the content of the .seq file, the interpreter settings, and the source code of
+  the interpreter. The machine code is only used if the Experiment settings match the settings it
+  was compiled with.
+
+The entries are stored in the data/cache/sequences folder (see common.file_cache).
+"""
+import functools
+import os
+import pickle
+import shutil
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import common.config as config
+import common.logger as logger
+from common.constants import *
+from common.file_cache import FileCache, hash_description, hash_file, hash_files
+
+log = logger.get_logger()
+
+# Changing the version invalidates all entries, e.g., if the format of the entries changes
+CACHE_VERSION = 2
+PROGRAM_SUFFIX = ".pickle"
+
+
+def get_key(kind: str, description: Dict[str, Any]) -> str:
+    """Returns the key of an entry, given all settings that affect its content"""
+    return hash_description(
+        {"version": CACHE_VERSION, "kind": kind, "description": description}
+    )
+
+
+def hash_modules(modules: List[ModuleType]) -> str:
+    return hash_files([module.__file__ for module in modules])
+
+
+@functools.lru_cache(maxsize=None)
+def hash_package(package_folder: str) -> str:
+    """Returns a hash of all Python source files of a package (computed once per process)"""
+    file_paths = []
+    for folder, subfolders, files in os.walk(package_folder):
+        subfolders.sort()
+        file_paths += [
+            os.path.join(folder, file) for file in sorted(files) if file.endswith(".py")
+        ]
+    return hash_files(file_paths)
+
+
+def get_sequence_key(
+    sequence_name: str,
+    parameters: Dict[str, Any],
+    config_values: Dict[str, Any] = {},
+    modules: List[ModuleType] = [],
+) -> str:
+    """
+    Returns the key of a calculated sequence. The source files of the given modules and of pypulseq
+    are part of the key, so that changes of the sequence code invalidate the cached sequences.
+    """
+    import pypulseq
+
+    return get_key(
+        "sequence",
+        {
+            "sequence": sequence_name,
+            "parameters": parameters,
+            "config": config_values,
+            "code": hash_modules(modules),
+            "pypulseq": hash_package(os.path.dirname(pypulseq.__file__)),
+        },
+    )
+
+
+class SequenceProgram:
+    """Interpreted sequence, with the machine code if it has been compiled"""
+
+    def __init__(self, instructions: Dict[str, tuple], param_dict: Dict[str, Any]):
+        self.instructions = instructions
+        self.param_dict = param_dict
+        self.machine_code: Optional[np.ndarray] = None
+        self.cic_factors: Optional[tuple] = None
+        self.experiment_settings: Optional[Dict[str, Any]] = None
+
+
+class SequenceCache(FileCache):
+    def __init__(
+        self, folder: str = mri4all_paths.DATA_CACHE_SEQ, max_size_mb: int = 1024
+    ):
+        super().__init__(folder, max_size_mb)
+
+    def restore_files(self, key: str, target_folder: str) -> bool:
+        """
+        Copies the files of a calculated sequence into the target folder. Returns False if the
+        sequence is not cached.
+        """
+        if not self.enabled:
+            return False
+        entry_path = self.path(key)
+        try:
+            for folder, _, files in os.walk(entry_path):
+                relative_folder = os.path.relpath(folder, entry_path)
+                os.makedirs(os.path.join(target_folder, relative_folder), exist_ok=True)
+                for file in files:
+                    shutil.copyfile(
+                        os.path.join(folder, file),
+                        os.path.join(target_folder, relative_folder, file),
+                    )
+            self.touch(key)
+        except OSError:
+            # Not cached (or evicted by another process)
+            return False
+        return os.path.isdir(entry_path)
+
+    def store_files(self, key: str, source_folder: str, files: List[str]) -> None:
+        """Stores the given files (paths relative to the source folder) as calculated sequence"""
+
+        def copy_files(temp_path: str) -> None:
+            for file in files:
+                target_path = os.path.join(temp_path, file)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                shutil.copyfile(os.path.join(source_folder, file), target_path)
+
+        self.write(key, copy_files)
+
+    def get_program(self, key: str) -> Optional[SequenceProgram]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self.path(key + PROGRAM_SUFFIX), "rb") as f:
+                program = pickle.load(f)
+            self.touch(key + PROGRAM_SUFFIX)
+            return program
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def put_program(self, key: str, program: SequenceProgram) -> None:
+        def write_program(temp_path: str) -> None:
+            with open(temp_path, "wb") as f:
+                pickle.dump(program, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.write(key + PROGRAM_SUFFIX, write_program)
+
+
+def get_sequence_cache() -> SequenceCache:
+    return SequenceCache(max_size_mb=config.get_config().seq_cache_size_mb)
+
+
+def list_files(folder: str) -> Dict[str, tuple]:
+    """Returns the modification time and size of all files, by path relative to the folder"""
+    files = {}
+    for subfolder, _, names in os.walk(folder):
+        for name in names:
+            file_path = os.path.join(subfolder, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            relative_path = os.path.relpath(file_path, folder)
+            files[relative_path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def calculate_cached(
+    key: str, working_folder: str, calculate: Callable[[], bool]
+) -> bool:
+    """
+    Restores the calculated sequence from the cache into the working folder. If the sequence is
+    not cached, it is calculated, and all files that the calculation has written into the working
+    folder are stored in the cache.
+    """
+    cache = get_sequence_cache()
+    if cache.restore_files(key, working_folder):
+        log.info("Using cached sequence")
+        return True
+
+    files_before = list_files(working_folder)
+    if not calculate():
+        return False
+    files_after = list_files(working_folder)
+    changed_files = [
+        file for file, stat in files_after.items() if files_before.get(file) != stat
+    ]
+    cache.store_files(key, working_folder, changed_files)
+    return True
@@ -96,6 +96,14 @@ FailStages = Literal[
 ]
 
 
+class StageTiming(BaseModel):
+    name: str = ""
+    duration_sec: float = 0.0
+    output_mb: float = 0.0
+    peak_memory_mb: float = 0.0
+    cached: bool = False
+
+
 class ScanJournal(BaseModel):
     created_at: str = ""
     prepared_at: str = ""
@@ -103,6 +111,7 @@ class ScanJournal(BaseModel):
     acquisition_end: str = ""
     reconstruction_start: str = ""
     reconstruction_end: str = ""
+    reconstruction_stages: List[StageTiming] = []
     failed_at: str = ""
     fail_stage: FailStages = "none"
 
@@ -12,7 +12,8 @@ class PSInterpreter:
 
     Attributes:
         out_dict (complex): Output sequence data
-        readout_number (int): Expected number of readouts
+        readout_number (int): Expected number of readout samples (of all ADC events)
+        adc_number (int): Expected number of ADC events, i.e., readouts
     """
 
     def __init__(self, rf_center=3e+6, rf_amp_max=5e+3, grad_max=1e+7,
@@ -108,6 +109,7 @@ class PSInterpreter:
 
         self.out_data = {}
         self.readout_number = 0
+        self.adc_number = 0
         self.is_assembled = False
 
     # Wrapper for full compilation
@@ -132,8 +134,10 @@ class PSInterpreter:
         self._compile_tx_data()
         self._compile_grad_data()
         self.out_data, self.readout_number = self._stream_all_blocks()
+        self.adc_number = sum(1 for block in self._blocks.values() if block['adc'] != 0)
         self.is_assembled = True
-        param_dict = {'readout_number' : self.readout_number, 'tx_t' : self._tx_t, 'rx_t' : self._rx_t, 'grad_t': self._grad_t}
+        param_dict = {'readout_number' : self.readout_number, 'adc_number' : self.adc_number,
+                      'tx_t' : self._tx_t, 'rx_t' : self._rx_t, 'grad_t': self._grad_t}
         for key, value in self._definitions.items():
             if key in param_dict:
                 self._logger.warning(f'Key conflict: overwriting key [{key}], value [{param_dict[key]}] with new value [{value}]')
@@ -337,6 +337,20 @@ class Experiment:
 
         self._seq_compiled = True
 
+    def get_machine_code(self):
+        """ Return the compiled machine code and the RX CIC scale correction factors,
+        compiling the sequence first if necessary """
+        if not self._seq_compiled:
+            self.compile()
+        return self._machine_code, (self._rx0_cic_factor, self._rx1_cic_factor)
+
+    def set_machine_code(self, machine_code, cic_factors):
+        """ Use machine code compiled previously (see get_machine_code()) by an Experiment
+        with the same settings, instead of compiling the sequence """
+        self._machine_code = machine_code
+        self._rx0_cic_factor, self._rx1_cic_factor = cic_factors
+        self._seq_compiled = True
+
     def get_flodict(self, intd=None):
         """Calculate floating-point dictionaries based on the data inside the
         Experiment class so far -- useful for plotting or testing the sequence"""
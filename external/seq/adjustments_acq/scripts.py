@@ -20,6 +20,8 @@ from external.flocra_pulseq.interpreter import (
 )  # pylint: disable=import-error
 
 import common.helper as helper
+import common.rawdata as rawdata
+import common.sequence_cache as sequence_cache
 from common.constants import *
 import common.logger as logger
 
@@ -29,6 +31,9 @@ from common.ipc import Communicator
 
 ipc_comm = Communicator(Communicator.ACQ)
 
+# Number of readouts that are written to the ISMRMRD file at once
+ISMRMRD_CHUNK_READOUTS = 256
+
 
 # TODO: Remove references to cfg class from here
 def run_pulseq(
@@ -55,6 +60,7 @@ def run_pulseq(
     raw_filename="",
     expected_duration_sec=-1,
     hardware_simulation=False,
+    ismrmrd_writer=None,
 ):
     """
     Interpret pulseq .seq file through flocra_pulseq
@@ -75,6 +81,7 @@ def run_pulseq(
         expt (flocra_pulseq.interpreter): Default None, pass in existing experiment to continue an object
         plot_instructions (bool): Default None, plot instructions for debugging
         gui_test (bool): Default False, load dummy data for gui testing
+        ismrmrd_writer (ISMRMRDWriter): Default None, opened ISMRMRD file to which the readouts are appended
 
     Returns:
         numpy.ndarray: Rx data array
@@ -95,23 +102,44 @@ def run_pulseq(
 
     print(f"case path = {case_path}")
 
-    # Convert .seq file to machine dict
-    psi = PSInterpreter(
-        rf_center=rf_center * 1e6,
-        tx_warmup=tx_warmup,
-        rf_amp_max=rf_max,
-        tx_t=tx_t,
-        grad_t=grad_t,
-        gx_max=gx_max,
-        gy_max=gy_max,
-        gz_max=gz_max,
-        log_file=case_path + "/flocra",
+    interpreter_settings = {
+        "rf_center": rf_center * 1e6,
+        "tx_warmup": tx_warmup,
+        "rf_amp_max": rf_max,
+        "tx_t": tx_t,
+        "grad_t": grad_t,
+        "gx_max": gx_max,
+        "gy_max": gy_max,
+        "gz_max": gz_max,
+    }
+
+    # The interpreted and shimmed sequence is cached, keyed by the .seq file content
+    cache = sequence_cache.get_sequence_cache()
+    program_key = sequence_cache.get_key(
+        "program",
+        {
+            "seq": sequence_cache.hash_file(seq_file),
+            "interpreter": interpreter_settings,
+            "shim": [shim_x, shim_y, shim_z],
+            "code": sequence_cache.hash_modules([sys.modules[PSInterpreter.__module__]]),
+        },
     )
-    instructions, param_dict = psi.interpret(seq_file)
+    program = cache.get_program(program_key)
+
+    if program is not None:
+        log.info("Using cached sequence instructions")
+        instructions, param_dict = program.instructions, program.param_dict
+    else:
+        # Convert .seq file to machine dict
+        psi = PSInterpreter(**interpreter_settings, log_file=case_path + "/flocra")
+        instructions, param_dict = psi.interpret(seq_file)
 
-    # Shim
-    log.debug("Running shim function...")
-    instructions = shim(instructions, (shim_x, shim_y, shim_z))
+        # Shim
+        log.debug("Running shim function...")
+        instructions = shim(instructions, (shim_x, shim_y, shim_z))
+
+        program = sequence_cache.SequenceProgram(instructions, param_dict)
+        cache.put_program(program_key, program)
 
     # temp = instructions
     # instructions = {
@@ -150,16 +178,24 @@ def run_pulseq(
         return [], []
 
     # Initialize experiment class
+    experiment_settings = None
     if expt is None:
         log.debug("Initializing marcos client...")
-        expt = ex.Experiment(
-            lo_freq=rf_center,
-            rx_t=param_dict["rx_t"],
-            init_gpa=True,
-            gpa_fhdo_offset_time=grad_t / 3,
-            grad_max_update_rate=0.125,
-            halt_and_reset=True,
-        )
+        experiment_settings = {
+            "lo_freq": rf_center,
+            "rx_t": param_dict["rx_t"],
+            "init_gpa": True,
+            "gpa_fhdo_offset_time": grad_t / 3,
+            "grad_max_update_rate": 0.125,
+            "halt_and_reset": True,
+        }
+        expt = ex.Experiment(**experiment_settings)
+        experiment_settings["grad_board"] = ex.grad_board
+
+    # The machine code can only be reused if it has been compiled by an Experiment with
+    # the same settings, and if the gradient board has not been calibrated since
+    if grad_cal:
+        experiment_settings = None
 
     # Optionbally run gradient linearization calibration
     if grad_cal:
@@ -171,13 +207,29 @@ def run_pulseq(
             poly_degree=5,
         )
 
-    # Add flat delay to avoid housekeeping at the start
-    flat_delay = 10
-    for buf in instructions.keys():
-        instructions[buf] = (instructions[buf][0] + flat_delay, instructions[buf][1])
-
-    # Load instructions
-    expt.add_flodict(instructions)
+    if (
+        experiment_settings is not None
+        and program.machine_code is not None
+        and program.experiment_settings == experiment_settings
+    ):
+        log.info("Using cached machine code")
+        expt.set_machine_code(program.machine_code, program.cic_factors)
+    else:
+        # Add flat delay to avoid housekeeping at the start (as new dict, so that the
+        # cached instructions are not modified)
+        flat_delay = 10
+        instructions = {
+            buf: (times + flat_delay, values)
+            for buf, (times, values) in instructions.items()
+        }
+
+        # Load instructions
+        expt.add_flodict(instructions)
+
+        if experiment_settings is not None:
+            program.machine_code, program.cic_factors = expt.get_machine_code()
+            program.experiment_settings = experiment_settings
+            cache.put_program(program_key, program)
 
     # if plot_instructions:
     #     expt.plot_sequence()
@@ -199,7 +251,8 @@ def run_pulseq(
 
     # Announce completion
     nSamples = param_dict["readout_number"]
-    log.debug(f"Finished -- read {nSamples} samples")
+    nReadouts = param_dict["adc_number"]
+    log.debug(f"Finished -- read {nSamples} samples in {nReadouts} readouts")
 
     if not raw_filename:
         from datetime import datetime
@@ -212,7 +265,20 @@ def run_pulseq(
         filename = Path(case_path) / mri4all_taskdata.RAWDATA / f"{raw_filename}.npy"
         if os.path.exists(filename):
             os.remove(filename)
-        np.save(filename, rxd["rx0"])
+        # Stored per readout, so that the reconstruction can process completed readouts
+        rawdata.save_rawdata(str(filename), rxd["rx0"], nReadouts)
+
+    # Optionally append the readouts to an ISMRMRD file that has been opened at scan start. The
+    # export must not fail the scan, so the incomplete file is removed on errors (the
+    # reconstruction creates the file then)
+    if ismrmrd_writer is not None:
+        try:
+            readouts = np.asarray(rxd["rx0"]).reshape(nReadouts, -1)
+            for start in range(0, readouts.shape[0], ISMRMRD_CHUNK_READOUTS):
+                ismrmrd_writer.append(readouts[start : start + ISMRMRD_CHUNK_READOUTS])
+        except Exception as e:
+            log.error(f"Unable to write ISMRMRD file: {e}")
+            ismrmrd_writer.discard()
 
     # Optionally save rx output array as .mat file
     if save_mat:
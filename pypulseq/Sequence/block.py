@@ -1,7 +1,9 @@
+import copy
 from types import SimpleNamespace
 
 import numpy as np
 
+from pypulseq.Sequence.block_table import NUM_EVENT_COLUMNS
 from pypulseq.block_to_events import block_to_events
 from pypulseq.calc_duration import calc_duration
 from pypulseq.compress_shape import compress_shape
@@ -11,15 +13,15 @@ from pypulseq.supported_labels import get_supported_labels
 
 def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
     """
-    Inserts PyPulseq block of sequence events into `self.dict_block_events` at position `block_index`. Also performs
+    Inserts PyPulseq block of sequence events into `self.block_table` at position `block_index`. Also performs
     gradient checks.
 
     Parameters
     ----------
     block_index : int
-        Index at which `SimpleNamespace` objects have to be inserted into `self.dict_block_events`.
+        Index at which `SimpleNamespace` objects have to be inserted into `self.block_table`.
     args : iterable[SimpleNamespace]
-        Iterable of `SimpleNamespace` objects to be added to `self.dict_block_events`.
+        Iterable of `SimpleNamespace` objects to be added to `self.block_table`.
 
     Raises
     ------
@@ -33,7 +35,7 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
     """
     events = block_to_events(args)
     block_duration = calc_duration(*events)
-    self.dict_block_events[block_index] = np.zeros(7, dtype=int) # np.int deprecated
+    event_ind = np.zeros(NUM_EVENT_COLUMNS, dtype=np.int32)
     duration = 0
 
     check_g = {}  # Key-value mapping of index and  pairs of gradients/times
@@ -74,7 +76,7 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
             if not found:
                 self.rf_library.insert(data_id, data)
 
-            self.dict_block_events[block_index][1] = data_id
+            event_ind[1] = data_id
             duration = max(duration, len(mag) * self.rf_raster_time + event.delay)
         elif event.type == 'grad':
             channel_num = ['x', 'y', 'z'].index(event.channel)
@@ -100,7 +102,7 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
             grad_id, found = self.grad_library.find(data)
             if not found:
                 self.grad_library.insert(grad_id, data, 'g')
-            self.dict_block_events[block_index][idx] = grad_id
+            event_ind[idx] = grad_id
             duration = max(duration, event.delay + len(g) * self.grad_raster_time)
         elif event.type == 'trap':
             channel_num = ['x', 'y', 'z'].index(event.channel)
@@ -115,7 +117,7 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
             trap_id, found = self.grad_library.find(data)
             if not found:
                 self.grad_library.insert(trap_id, data, 't')
-            self.dict_block_events[block_index][idx] = trap_id
+            event_ind[idx] = trap_id
             duration = max(duration, event.delay + event.rise_time + event.flat_time + event.fall_time)
         elif event.type == 'adc':
             data = [event.num_samples, event.dwell, max(event.delay, event.dead_time), event.freq_offset,
@@ -123,14 +125,14 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
             adc_id, found = self.adc_library.find(data)
             if not found:
                 self.adc_library.insert(adc_id, data)
-            self.dict_block_events[block_index][5] = adc_id
+            event_ind[5] = adc_id
             duration = max(duration, event.delay + event.num_samples * event.dwell + event.dead_time)
         elif event.type == 'delay':
             data = [event.delay]
             delay_id, found = self.delay_library.find(data)
             if not found:
                 self.delay_library.insert(delay_id, data)
-            self.dict_block_events[block_index][0] = delay_id
+            event_ind[0] = delay_id
             duration = max(duration, event.delay)
         elif event.type == 'output' or event.type == 'trigger':
             event_type = ['output', 'trigger'].index(event.type) + 1
@@ -202,7 +204,7 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
                     self.extensions_library.insert(extension_id, data)
 
         # Now we add the ID
-        self.dict_block_events[block_index][6] = extension_id
+        event_ind[6] = extension_id
 
     # =========
     # PERFORM GRADIENT CHECKS
@@ -214,7 +216,7 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
                 raise ValueError('No delay allowed for gradients which start with a non-zero amplitude')
 
             if block_index > 1:
-                prev_id = self.dict_block_events[block_index - 1][grad_to_check.idx]
+                prev_id = self.block_table[block_index - 1][grad_to_check.idx]
                 if prev_id != 0:
                     prev_lib = self.grad_library.get(prev_id)
                     prev_dat = prev_lib['data']
@@ -236,22 +238,23 @@ def add_block(self, block_index: int, *args: SimpleNamespace) -> None:
 
     eps = np.finfo(float).eps # np.float deprecated
     assert abs(duration - block_duration) < eps
-    self.arr_block_durations.append(block_duration)
+    self.block_table.set_block(block_index, event_ind, block_duration)
 
 
 def get_block(self, block_index: int) -> SimpleNamespace:
     """
-    Returns PyPulseq block at `block_index` position in `self.dict_block_events`.
+    Returns PyPulseq block at `block_index` position in `self.block_table`. The events are constructed once for each
+    event ID (see `get_block_events()`), the block contains copies of them.
 
     Parameters
     ----------
     block_index : int
-        Index of PyPulseq block to be retrieved from `self.dict_block_events`.
+        Index of PyPulseq block to be retrieved from `self.block_table`.
 
     Returns
     -------
     block : SimpleNamespace
-        PyPulseq block at 'block_index' position in `self.dict_block_events`.
+        PyPulseq block at 'block_index' position in `self.block_table`.
 
     Raises
     ------
@@ -259,10 +262,50 @@ def get_block(self, block_index: int) -> SimpleNamespace:
         If a trigger event of an unsupported control type is encountered.
         If a label object of an unknown extension ID is encountered.
     """
-
     block = SimpleNamespace()
-    event_ind = self.dict_block_events[block_index]
+    for column, event_id in enumerate(self.block_table[block_index].tolist()):
+        if event_id > 0:
+            for name, event in get_block_events(self, column, event_id).items():
+                if isinstance(event, dict):
+                    event = {i: copy.copy(e) for i, e in event.items()}
+                else:
+                    event = copy.copy(event)
+                setattr(block, name, event)
+    return block
+
+
+def get_block_events(self, column: int, event_id: int) -> dict:
+    """
+    Returns the events for the given column of the block table and event ID, as a dict of block attributes (e.g.
+    'rf', or 'trigger' and 'label' for extensions). The events are cached in `self.event_cache`, which has to be
+    cleared when the event libraries are modified.
+
+    Parameters
+    ----------
+    column : int
+        Column of the block table (see `EVENT_COLUMNS`).
+    event_id : int
+        ID of the event in the corresponding event library.
 
+    Returns
+    -------
+    events : dict
+        Block attributes and the corresponding events. Must not be modified.
+    """
+    key = (column, event_id)
+    if key not in self.event_cache:
+        block = SimpleNamespace()
+        event_ind = np.zeros(NUM_EVENT_COLUMNS, dtype=np.int32)
+        event_ind[column] = event_id
+        __build_block(self, block, event_ind)
+        self.event_cache[key] = vars(block)
+    return self.event_cache[key]
+
+
+def __build_block(self, block: SimpleNamespace, event_ind: np.ndarray) -> None:
+    """
+    Constructs the events of a row of the block table and adds them to `block`.
+    """
     if event_ind[0] > 0:  # Delay
         delay = SimpleNamespace()
         delay.type = 'delay'
@@ -371,5 +414,3 @@ def get_block(self, block_index: int) -> SimpleNamespace:
                 raise RuntimeError(f'Unknown extension ID {ext_data[0]}')
 
             next_ext_id = ext_data[2]
-
-    return block
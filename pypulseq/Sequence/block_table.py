@@ -0,0 +1,159 @@
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# Columns of the block table, in the order of the [BLOCKS] section of .seq files
+EVENT_COLUMNS = ['delay', 'rf', 'gx', 'gy', 'gz', 'adc', 'ext']
+NUM_EVENT_COLUMNS = len(EVENT_COLUMNS)
+
+
+class BlockTable:
+    """
+    Columnar storage of the blocks of a sequence. Each block is one row of event IDs (delay, RF, GX, GY, GZ, ADC and
+    extensions, 0 = no event) in an int32 array, and the block durations are stored in a second array. Blocks are
+    addressed by 1-based block indices, like the block IDs in .seq files. The arrays grow by doubling their capacity.
+
+    For compatibility, the table can be used like a dict that maps block indices to rows of event IDs.
+
+    Attributes
+    ----------
+    num_blocks : int
+        Number of blocks in the table.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._events = np.zeros((capacity, NUM_EVENT_COLUMNS), dtype=np.int32)
+        self._durations = np.zeros(capacity)
+        self.num_blocks = 0
+
+    def __str__(self):
+        return f'BlockTable: {self.num_blocks} blocks'
+
+    def __len__(self) -> int:
+        return self.num_blocks
+
+    def __contains__(self, block_index: int) -> bool:
+        return 1 <= block_index <= self.num_blocks
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(1, self.num_blocks + 1))
+
+    def __getitem__(self, block_index: int) -> np.ndarray:
+        if block_index not in self:
+            raise KeyError(block_index)
+        return self._events[block_index - 1]
+
+    def __setitem__(self, block_index: int, events: np.ndarray) -> None:
+        self.set_block(block_index, events)
+
+    def keys(self) -> range:
+        return range(1, self.num_blocks + 1)
+
+    def values(self) -> List[np.ndarray]:
+        return list(self.events)
+
+    def items(self) -> List[Tuple[int, np.ndarray]]:
+        return list(zip(self.keys(), self.events))
+
+    @classmethod
+    def from_arrays(cls, events: np.ndarray, durations: np.ndarray = None) -> 'BlockTable':
+        """
+        Creates a block table from the event IDs of all blocks (one row per block) and the block durations.
+
+        Parameters
+        ----------
+        events : numpy.ndarray
+            Event IDs of the blocks, shape (number of blocks, `NUM_EVENT_COLUMNS`).
+        durations : numpy.ndarray, default=None
+            Durations of the blocks. Zero if not given.
+
+        Returns
+        -------
+        table : BlockTable
+            Block table containing the given blocks.
+        """
+        table = cls(capacity=max(len(events), 1))
+        table.num_blocks = len(events)
+        table._events[:len(events)] = events
+        if durations is not None:
+            table._durations[:len(events)] = durations
+        return table
+
+    @property
+    def events(self) -> np.ndarray:
+        """Event IDs of all blocks (a view, one row per block)."""
+        return self._events[:self.num_blocks]
+
+    @property
+    def durations(self) -> np.ndarray:
+        """Durations of all blocks (a view)."""
+        return self._durations[:self.num_blocks]
+
+    def _grow(self, capacity: int) -> None:
+        events = np.zeros((capacity, NUM_EVENT_COLUMNS), dtype=np.int32)
+        events[:self.num_blocks] = self.events
+        durations = np.zeros(capacity)
+        durations[:self.num_blocks] = self.durations
+        self._events, self._durations = events, durations
+
+    def set_block(self, block_index: int, events: np.ndarray, duration: float = 0) -> None:
+        """
+        Sets the event IDs and the duration of the block at `block_index`. The block is appended if `block_index` is
+        the index after the last block.
+
+        Parameters
+        ----------
+        block_index : int
+            Index of block, from 1 to number of blocks + 1.
+        events : numpy.ndarray
+            Event IDs of the block.
+        duration : float, default=0
+            Duration of the block.
+
+        Raises
+        ------
+        IndexError
+            If `block_index` is not in the table and not the index after the last block.
+        """
+        if block_index == self.num_blocks + 1:
+            if self.num_blocks == len(self._events):
+                self._grow(2 * len(self._events))
+            self.num_blocks += 1
+        elif block_index not in self:
+            raise IndexError(f'Block index {block_index} out of range (number of blocks: {self.num_blocks})')
+        self._events[block_index - 1] = events
+        self._durations[block_index - 1] = duration
+
+    def get_event_ids(self, event: str) -> np.ndarray:
+        """
+        Returns the IDs of the given event type in all blocks (0 for blocks without such an event).
+
+        Parameters
+        ----------
+        event : str
+            Event type, one of `EVENT_COLUMNS`.
+
+        Returns
+        -------
+        event_ids : numpy.ndarray
+            Event IDs, one per block (a view).
+        """
+        return self.events[:, EVENT_COLUMNS.index(event)]
+
+    def find_blocks(self, event: str) -> np.ndarray:
+        """Returns the indices (1-based) of the blocks that contain an event of the given type."""
+        return np.flatnonzero(self.get_event_ids(event)) + 1
+
+    def start_times(self) -> np.ndarray:
+        """Returns the start times of all blocks."""
+        start_times = np.zeros(self.num_blocks)
+        np.cumsum(self.durations[:-1], out=start_times[1:])
+        return start_times
+
+    def total_duration(self) -> float:
+        # Summed sequentially, like the block-by-block accumulation of the start times
+        return float(np.cumsum(self.durations)[-1]) if self.num_blocks > 0 else 0
+
+    def event_count(self) -> np.ndarray:
+        """Returns the number of blocks that contain an event, for each event type."""
+        return np.count_nonzero(self.events > 0, axis=0).astype(float)
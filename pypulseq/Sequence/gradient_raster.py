@@ -0,0 +1,249 @@
+import math
+from types import SimpleNamespace
+from typing import Tuple
+from warnings import warn
+
+import numpy as np
+from scipy.signal import argrelextrema
+
+from pypulseq.Sequence import block
+from pypulseq.Sequence.block_table import EVENT_COLUMNS
+from pypulseq.points_to_waveform import points_to_waveform
+
+# Columns of the gradient axes in the block table
+GRAD_COLUMNS = [EVENT_COLUMNS.index(channel) for channel in ['gx', 'gy', 'gz']]
+
+
+def grad_to_waveform(grad: SimpleNamespace, grad_raster_time: float) -> Tuple[int, np.ndarray]:
+    """
+    Rasterises a single gradient event.
+
+    Parameters
+    ----------
+    grad : SimpleNamespace
+        Trapezoid or arbitrary gradient event.
+    grad_raster_time : float
+        Gradient raster time.
+
+    Returns
+    -------
+    nt_start : int
+        Start of the waveform relative to the start of the block, in gradient raster steps.
+    waveform : numpy.ndarray
+        Gradient waveform.
+    """
+    if grad.type == 'grad':
+        nt_start = round((grad.delay + grad.t[0]) / grad_raster_time)
+        waveform = grad.waveform
+    else:
+        nt_start = round(grad.delay / grad_raster_time)
+        if abs(grad.flat_time) > np.finfo(float).eps:
+            t = np.cumsum([0, grad.rise_time, grad.flat_time, grad.fall_time])
+            trap_form = np.multiply([0, 1, 1, 0], grad.amplitude)
+        else:
+            t = np.cumsum([0, grad.rise_time, grad.fall_time])
+            trap_form = np.multiply([0, 1, 0], grad.amplitude)
+
+        tn = math.floor(t[-1] / grad_raster_time)
+        t = np.append(t, t[-1] + grad_raster_time)
+        trap_form = np.append(trap_form, 0)
+
+        if abs(grad.amplitude) > np.finfo(float).eps:
+            waveform = points_to_waveform(times=t, amplitudes=trap_form, grad_raster_time=grad_raster_time)
+        else:
+            waveform = np.zeros(tn + 1)
+
+    if len(waveform) != np.sum(np.isfinite(waveform)):
+        warn('Not all elements of the generated waveform are finite')
+
+    return nt_start, waveform
+
+
+def rasterize_gradients(self, wave_length: int) -> np.ndarray:
+    """
+    Decompresses the gradient waveforms of all blocks. Each gradient event is rasterised once per event ID, and all
+    its occurrences are written with a single indexed assignment. Where the waveform of a block extends into the
+    following blocks, the waveforms of later blocks take precedence.
+
+    Parameters
+    ----------
+    wave_length : int
+        Minimum number of gradient raster steps of the result.
+
+    Returns
+    -------
+    grad_waveforms : numpy.ndarray
+        Decompressed gradient waveforms, shape (3, number of gradient raster steps).
+    """
+    grad_raster_time = self.grad_raster_time
+    block_starts = np.round(self.block_table.start_times() / grad_raster_time).astype(int)
+    event_table = self.block_table.events
+
+    # Rasterise each gradient event once, the waveforms are stored back to back in one array
+    grad_columns = dict()
+    for column in reversed(GRAD_COLUMNS):
+        grad_columns.update((grad_id, column) for grad_id in np.unique(event_table[:, column]).tolist() if grad_id > 0)
+    grad_ids = sorted(grad_columns)
+    max_id = grad_ids[-1] if len(grad_ids) > 0 else 0
+    nt_starts = np.zeros(max_id + 1, dtype=int)
+    lengths = np.zeros(max_id + 1, dtype=int)
+    waveforms = []
+    for grad_id in grad_ids:
+        column = grad_columns[grad_id]
+        grad = block.get_block_events(self, column, grad_id)[EVENT_COLUMNS[column]]
+        nt_starts[grad_id], waveform = grad_to_waveform(grad, grad_raster_time)
+        lengths[grad_id] = len(waveform)
+        waveforms.append(waveform)
+    offsets = np.cumsum(lengths) - lengths
+    waveform_table = np.concatenate(waveforms) if waveforms else np.zeros(0)
+
+    # Raster indices and waveform samples of all gradient events of each axis
+    axis_indices, axis_samples, axis_blocks = [], [], []
+    for column in GRAD_COLUMNS:
+        blocks = np.flatnonzero(event_table[:, column])
+        ids = event_table[blocks, column]
+        event_lengths = lengths[ids]
+        sample_index = np.arange(np.sum(event_lengths)) - np.repeat(np.cumsum(event_lengths) - event_lengths,
+                                                                    event_lengths)
+        axis_indices.append(np.repeat(block_starts[blocks] + nt_starts[ids], event_lengths) + sample_index)
+        axis_samples.append(np.repeat(offsets[ids], event_lengths) + sample_index)
+        axis_blocks.append(np.repeat(blocks, event_lengths))
+
+    # The waveforms can extend beyond the duration of the sequence, so the length is determined before allocating
+    wave_length = max([wave_length] + [int(indices.max()) + 1 for indices in axis_indices if len(indices) > 0])
+    grad_waveforms = np.zeros((len(GRAD_COLUMNS), wave_length))
+
+    indices = np.concatenate([indices + j * wave_length for j, indices in enumerate(axis_indices)])
+    samples = np.concatenate(axis_samples)
+    blocks = np.concatenate(axis_blocks)
+
+    # Samples written by several blocks are taken from the last of these blocks
+    last_block = np.full(grad_waveforms.size, -1)
+    np.maximum.at(last_block, indices, blocks)
+    is_last = last_block[indices] == blocks
+    grad_waveforms.reshape(-1)[indices[is_last]] = waveform_table[samples[is_last]]
+
+    return grad_waveforms
+
+
+def integrate_gradients(gw: np.ndarray, grad_raster_time: float, i_excitation: np.ndarray, i_refocusing: np.ndarray,
+                        spoil_val: float = []) -> np.ndarray:
+    """
+    Integrates the gradient waveforms to the k-space trajectory. The trajectory is set to 0 at excitations and
+    inverted at refocusing pulses.
+
+    The inversions are taken into account by integrating the gradients with the sign of the current refocusing
+    period, so that the trajectory is one cumulative sum that is segmented only at the excitations.
+
+    Parameters
+    ----------
+    gw : numpy.ndarray
+        Gradient waveforms, shape (3, number of gradient raster steps).
+    grad_raster_time : float
+        Gradient raster time.
+    i_excitation : numpy.ndarray
+        Gradient raster indices of the excitations, in ascending order.
+    i_refocusing : numpy.ndarray
+        Gradient raster indices of the refocusing pulses, in ascending order.
+    spoil_val : float, default=[]
+        If given, spoiler gradients that move the trajectory beyond 90 % of this value set it back to 0.
+
+    Returns
+    -------
+    k_traj : numpy.ndarray
+        K-space trajectory, with NaN at the raster step before each excitation.
+    """
+    num_samples = gw.shape[1]
+    i_excitation = np.asarray(i_excitation, dtype=int)
+    i_refocusing = np.asarray(i_refocusing, dtype=int)
+
+    num_refocusing = np.cumsum(np.bincount(i_refocusing[i_refocusing < num_samples], minlength=num_samples))
+    sign = np.where(num_refocusing % 2, -1.0, 1.0)
+    k_signed = gw * (sign * grad_raster_time)
+    np.cumsum(k_signed, axis=1, out=k_signed)
+
+    # Subtract the integral up to the start of the excitation segment of every raster step
+    segment_starts = np.unique(i_excitation[(i_excitation > 0) & (i_excitation < num_samples)])
+    segment_lengths = np.diff(np.concatenate(([0], segment_starts, [num_samples])))
+    offsets = np.hstack((np.zeros((gw.shape[0], 1)), k_signed[:, segment_starts - 1]))
+    k_traj = k_signed - np.repeat(offsets, segment_lengths, axis=1)
+    k_traj *= sign
+
+    if spoil_val != []:
+        period_ends = np.unique(np.concatenate((i_excitation, i_refocusing, [num_samples])))
+        segment_ends = np.append(segment_starts, num_samples)
+        for j in range(gw.shape[0]):
+            __reset_spoilers(k_traj[j], k_signed[j], sign, gw[j] * grad_raster_time, spoil_val * 0.9, period_ends,
+                             segment_ends)
+
+    k_traj[:, i_excitation - 1] = np.nan
+
+    return k_traj
+
+
+def __reset_spoilers(k_traj: np.ndarray, k_signed: np.ndarray, sign: np.ndarray, gw: np.ndarray, threshold: float,
+                     period_ends: np.ndarray, segment_ends: np.ndarray) -> None:
+    """
+    Sets the trajectory of one axis to 0 during spoiler gradients that move it beyond `threshold`, and restarts the
+    integration after the spoiler. The spoiler extends from the last zero or local minimum of the gradient before
+    the trajectory exceeds the threshold to the next zero of the gradient, within the period between the RF pulses.
+    """
+    # The trajectory is only modified until the next excitation, so the excitation segments are processed separately
+    violations = np.flatnonzero(np.abs(k_traj) >= threshold)
+    segment_starts = np.concatenate(([0], segment_ends[:-1]))
+    for segment in np.unique(np.searchsorted(segment_ends, violations, side='right')).tolist():
+        position, segment_end = segment_starts[segment], segment_ends[segment]
+        while True:
+            exceeds = np.abs(k_traj[position:segment_end]) >= threshold
+            if not np.any(exceeds):
+                break
+            v = position + np.argmax(exceeds)
+            period_start = period_ends[np.searchsorted(period_ends, v, side='right') - 1] if v >= period_ends[0] else 0
+            period_end = period_ends[np.searchsorted(period_ends, v, side='right')]
+
+            gw_before = gw[period_start:v + 1]
+            zeros_before = np.flatnonzero(gw_before == 0)
+            minima_before = argrelextrema(gw_before, np.less)[0]
+            spoil_start = period_start + max(zeros_before[-1] if len(zeros_before) > 0 else -1,
+                                             minima_before[-1] if len(minima_before) > 0 else -1)
+            zeros_after = np.flatnonzero(gw[v + 2:period_end] == 0)
+            restart = v + 1 + zeros_after[0] if len(zeros_after) > 0 else period_end - 1
+
+            k_traj[max(spoil_start, period_start):restart] = 0
+            k_restarted = k_signed[restart:segment_end] - k_signed[restart - 1]
+            k_traj[restart:segment_end] = k_restarted * sign[restart:segment_end]
+            position = max(restart, v + 1)
+
+
+def sample_trajectory(k_traj: np.ndarray, grad_raster_time: float, t: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolates the k-space trajectory at the times `t`, for all axes at once. The trajectory is sampled at
+    the end of each gradient raster step, like in `numpy.interp`.
+
+    Parameters
+    ----------
+    k_traj : numpy.ndarray
+        K-space trajectory, shape (3, number of gradient raster steps).
+    grad_raster_time : float
+        Gradient raster time.
+    t : numpy.ndarray
+        Sampling times.
+
+    Returns
+    -------
+    k_traj_sampled : numpy.ndarray
+        K-space trajectory at the times `t`, shape (3, number of sampling times).
+    """
+    t_raster = np.arange(1, k_traj.shape[1] + 1) * grad_raster_time
+    i = np.clip(np.searchsorted(t_raster, t, side='right') - 1, 0, max(k_traj.shape[1] - 2, 0))
+    k_left = k_traj[:, i]
+    if k_traj.shape[1] < 2:
+        return k_left
+    k_right = k_traj[:, i + 1]
+    slope = (k_right - k_left) / (t_raster[i + 1] - t_raster[i])
+    k_traj_sampled = slope * (t - t_raster[i]) + k_left
+    # Outside of the raster, the first and last values are used. Values on the raster points are taken as is.
+    k_traj_sampled = np.where(t == t_raster[i], k_left, k_traj_sampled)
+    k_traj_sampled[:, t <= t_raster[0]] = k_traj[:, [0]]
+    k_traj_sampled[:, t >= t_raster[-1]] = k_traj[:, [-1]]
+    return k_traj_sampled
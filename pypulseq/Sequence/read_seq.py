@@ -1,9 +1,10 @@
 import re
-from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 import numpy as np
 
+from pypulseq.Sequence import block
+from pypulseq.Sequence.block_table import BlockTable
 from pypulseq.calc_duration import calc_duration
 from pypulseq.event_lib import EventLibrary
 from pypulseq.supported_labels import get_supported_labels
@@ -11,7 +12,8 @@ from pypulseq.supported_labels import get_supported_labels
 
 def read(self, path: str, detect_rf_use: bool = False) -> None:
     """
-    Reads a `.seq` file from `path`.
+    Reads a `.seq` file from `path`. The file is split into sections in one pass, and the numeric sections are
+    parsed into NumPy tables in bulk.
 
     Parameters
     ----------
@@ -26,10 +28,13 @@ def read(self, path: str, detect_rf_use: bool = False) -> None:
     RuntimeError
     """
 
-    input_file = open(path, 'r')
+    with open(path, 'r') as input_file:
+        sections = __split_sections(input_file.read())
+
     self.shape_library = EventLibrary()
     self.adc_library = EventLibrary()
     self.delay_library = EventLibrary()
+    self.extensions_library = EventLibrary()
     self.grad_library = EventLibrary()
     self.grad_raster_time = self.system.grad_raster_time
     self.rf_library = EventLibrary()
@@ -38,21 +43,20 @@ def read(self, path: str, detect_rf_use: bool = False) -> None:
     self.label_set_library = EventLibrary()
     self.trigger_library = EventLibrary()
 
-    self.dict_block_events = {}
+    self.block_table = BlockTable()
     self.dict_definitions = {}
+    self.event_cache.clear()
 
     jemris_generated = False
+    compatibility_mode_12x_13x = False
 
-    while True:
-        section = __skip_comments(input_file)
-        if section == -1:
-            break
+    for section, lines in sections:
         if section == '[DEFINITIONS]':
-            self.dict_definitions = __read_definitions(input_file)
+            self.dict_definitions = __read_definitions(lines)
         elif section == '[JEMRIS]':
             jemris_generated = True
         elif section == '[VERSION]':
-            version_major, version_minor, version_revision = __read_version(input_file)
+            version_major, version_minor, version_revision = __read_version(lines)
 
             if version_major != self.version_major:
                 raise RuntimeError(f'Unsupported version_major: {version_major}. Expected: {self.version_major}')
@@ -75,90 +79,43 @@ def read(self, path: str, detect_rf_use: bool = False) -> None:
                 self.version_revision = version_revision
 
         elif section == '[BLOCKS]':
-            self.dict_block_events = __read_blocks(input_file, compatibility_mode_12x_13x)
+            self.block_table = __read_blocks(lines, compatibility_mode_12x_13x)
         elif section == '[RF]':
             if jemris_generated:
-                self.rf_library = __read_events(input_file, (1, 1, 1, 1, 1), event_library=self.rf_library)
+                __read_events(lines, self.rf_library, (1, 1, 1, 1, 1))
             else:
-                self.rf_library = __read_events(input_file, (1, 1, 1, 1e-6, 1, 1), event_library=self.rf_library)
+                __read_events(lines, self.rf_library, (1, 1, 1, 1e-6, 1, 1))
         elif section == '[GRADIENTS]':
-            self.grad_library = __read_events(input_file, (1, 1, 1e-6), 'g', self.grad_library)
+            __read_events(lines, self.grad_library, (1, 1, 1e-6), 'g')
         elif section == '[TRAP]':
             if jemris_generated:
-                self.grad_library = __read_events(input_file, (1, 1e-6, 1e-6, 1e-6), 't', self.grad_library)
+                __read_events(lines, self.grad_library, (1, 1e-6, 1e-6, 1e-6), 't')
             else:
-                self.grad_library = __read_events(input_file, (1, 1e-6, 1e-6, 1e-6, 1e-6), 't', self.grad_library)
+                __read_events(lines, self.grad_library, (1, 1e-6, 1e-6, 1e-6, 1e-6), 't')
         elif section == '[ADC]':
-            self.adc_library = __read_events(input_file, (1, 1e-9, 1e-6, 1, 1), event_library=self.adc_library)
+            __read_events(lines, self.adc_library, (1, 1e-9, 1e-6, 1, 1))
         elif section == '[DELAYS]':
-            self.delay_library = __read_events(input_file, (1e-6,), event_library=self.delay_library)
+            __read_events(lines, self.delay_library, (1e-6,))
         elif section == '[SHAPES]':
-            self.shape_library = __read_shapes(input_file)
+            self.shape_library = __read_shapes(lines)
         elif section == '[EXTENSIONS]':
-            self.extensions_library = __read_events(input_file)
+            __read_events(lines, self.extensions_library)
         elif section[:18] == 'extension TRIGGERS':
             extension_id = int(section[18:])
             self.set_extension_string_ID('TRIGGERS', extension_id)
-            self.trigger_library = __read_events(input_file, (1, 1, 1e-6, 1e-6), event_library=self.trigger_library)
+            __read_events(lines, self.trigger_library, (1, 1, 1e-6, 1e-6))
         elif section[:18] == 'extension LABELSET':
             extension_id = int(section[18:])
             self.set_extension_string_ID('LABELSET', extension_id)
-            l1 = lambda s: int(s)
-            l2 = lambda s: get_supported_labels().index(s) + 1
-            self.label_set_library = __read_and_parse_events(input_file, l1, l2)
+            self.label_set_library = __read_label_events(lines)
         elif section[:18] == 'extension LABELINC':
             extension_id = int(section[18:])
             self.set_extension_string_ID('LABELINC', extension_id)
-            l1 = lambda s: int(s)
-            l2 = lambda s: get_supported_labels().index(s) + 1
-            self.label_inc_library = __read_and_parse_events(input_file, l1, l2)
+            self.label_inc_library = __read_label_events(lines)
         else:
             raise ValueError(f'Unknown section code: {section}')
 
-    self.arr_block_durations = np.zeros(len(self.dict_block_events))
-    grad_channels = ['gx', 'gy', 'gz']
-    grad_prev_last = np.zeros(len(grad_channels))
-    for block_counter in range(len(self.dict_block_events)):
-        block = self.get_block(block_counter + 1)
-        block_duration = calc_duration(block)
-        self.arr_block_durations[block_counter] = block_duration
-        # We also need to keep track of the event IDs because some PyPulseq files written by external software may contain
-        # repeated entries so searching by content will fail
-        event_idx = self.dict_block_events[block_counter + 1]
-        # Update the objects by filling in the fields not contained in the PyPulseq file
-        for j in range(len(grad_channels)):
-            if hasattr(block, grad_channels[j]):
-                grad = getattr(block, grad_channels[j])
-            else:
-                grad_prev_last[j] = 0
-                continue
-
-            if grad.type == 'grad':
-                if grad.delay > 0:
-                    grad_prev_last[j] = 0
-
-                if hasattr(grad, 'first'):
-                    continue
-
-                grad.first = grad_prev_last[j]
-                # Restore samples on the edges of the gradient raster intervals for that we need the first sample
-                odd_step1 = [grad.first, *2 * grad.waveform]
-                odd_step2 = odd_step1 * (np.mod(range(len(odd_step1)), 2) * 2 - 1)
-                waveform_odd_rest = np.cumsum(odd_step2) * (np.mod(len(odd_step2), 2) * 2 - 1)
-                grad.lsat = waveform_odd_rest[-1]
-                grad_prev_last[j] = grad.last
-
-                eps = np.finfo(np.float).eps
-                if grad.delay + len(grad.waveform) * self.grad_raster_time + eps < block_duration:
-                    grad_prev_last[j] = 0
-
-                amplitude = np.max(np.abs(grad.waveform))
-                old_data = [amplitude, grad.shape_id, grad.delay]
-                new_data = [amplitude, grad.shape_id, grad.delay, grad.first, grad.last]
-                event_id = event_idx[j + 2]
-                # update_data()
-            else:
-                grad_prev_last[j] = 0
+    self.block_table.durations[:] = __calc_block_durations(self)
 
     if detect_rf_use:
         for k in self.rf_library.keys():
@@ -171,16 +128,109 @@ def read(self, path: str, detect_rf_use: bool = False) -> None:
                 else:
                     lib_data[8] = 2
                 self.rf_library.data[k] = lib_data
+        self.event_cache.clear()
+
+
+def __calc_block_durations(self) -> np.ndarray:
+    """
+    Calculates the durations of all blocks. The duration of a block is the maximum duration of its events, so the
+    duration of each event is calculated once, instead of constructing every block.
+
+    Returns
+    -------
+    durations : numpy.ndarray
+        Duration of each block, in order of the block IDs.
+    """
+    event_table = self.block_table.events
+    durations = np.zeros(len(event_table))
+    for column in range(event_table.shape[1]):
+        event_ids, block_events = np.unique(event_table[:, column], return_inverse=True)
+        event_durations = np.zeros(len(event_ids))
+        for i, event_id in enumerate(event_ids.tolist()):
+            if event_id == 0:
+                continue
+            events = []
+            for event in block.get_block_events(self, column, event_id).values():
+                events.extend(event.values() if isinstance(event, dict) else [event])
+            event_durations[i] = calc_duration(*events)
+        durations = np.maximum(durations, event_durations[block_events.reshape(-1)])
+
+    return durations
+
+
+def __split_sections(text: str) -> List[Tuple[str, List[str]]]:
+    """
+    Splits the content of a .seq file into sections.
+
+    Parameters
+    ----------
+    text : str
+        Content of .seq file.
+
+    Returns
+    -------
+    sections : list
+        List of section headers (e.g. '[BLOCKS]' or 'extension TRIGGERS 1') and the corresponding lines. Empty lines
+        and comments (including comments at the end of lines) are removed.
+
+    Raises
+    ------
+    ValueError
+        If the file contains data before the first section header.
+    """
+    text = re.sub(r'#[^\n]*', '', text)
+    headers = list(re.finditer(r'^[ \t]*(\[[^\n]*|extension [^\n]*)', text, flags=re.M))
+
+    preamble = text[:headers[0].start()] if headers else text
+    if preamble.strip() != '':
+        raise ValueError(f'Unknown section code: {preamble.split()[0]}')
+
+    sections = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        lines = [line.strip() for line in text[header.end():end].splitlines()]
+        sections.append((header.group(1).strip(), [line for line in lines if line != '']))
+    return sections
+
+
+def __read_table(lines: List[str], dtype=float) -> np.ndarray:
+    """
+    Parses the lines of a numeric section into a table.
+
+    Parameters
+    ----------
+    lines : list
+        Lines of section, one row per line.
+    dtype : type, default=float
+        Data type of the table.
+
+    Returns
+    -------
+    table : numpy.ndarray
+        Table with one row per line.
+
+    Raises
+    ------
+    ValueError
+        If the lines have a different number of values, or values that are not numeric.
+    """
+    if len(lines) == 0:
+        return np.zeros((0, 0), dtype=dtype)
+    table = np.fromstring('\n'.join(lines), dtype=dtype, sep=' ')
+    num_columns = len(lines[0].split())
+    if table.size != len(lines) * num_columns:
+        raise ValueError(f'Unable to parse section starting with: {lines[0]}')
+    return table.reshape(len(lines), num_columns)
 
 
-def __read_definitions(input_file) -> Dict[str, str]:
+def __read_definitions(lines: List[str]) -> Dict[str, str]:
     """
     Read dict_definitions from .seq file.
 
     Parameters
     ----------
-    input_file : file object
-        .seq file
+    lines : list
+        Lines of [DEFINITIONS] section.
 
     Returns
     -------
@@ -188,36 +238,33 @@ def __read_definitions(input_file) -> Dict[str, str]:
         Dict object containing key value pairs of dict_definitions.
     """
     definitions = dict()
-    line = __strip_line(input_file)
-    while line != '' and line[0] != '#':
+    for line in lines:
         tok = line.split(' ')
         try:  # Try converting every element into a float
             [float(x) for x in tok[1:]]
             definitions[tok[0]] = np.array(tok[1:], dtype=float)
         except ValueError:  # Try clause did not work!
             definitions[tok[0]] = tok[1:]
-        line = __strip_line(input_file)
 
     return definitions
 
 
-def __read_version(input_file) -> Tuple[int, int, int]:
+def __read_version(lines: List[str]) -> Tuple[int, int, int]:
     """
     Read version from .seq file.
 
     Parameters
     ----------
-    input_file : file object
-        .seq file
+    lines : list
+        Lines of [VERSION] section.
 
     Returns
     -------
     tuple
         Tuple of major, minor and revision number.
     """
-    line = __strip_line(input_file)
     major, minor, revision = 0, 0, 0
-    while line != '' and line[0] != '#':
+    for line in lines:
         tok = line.split(' ')
         if tok[0] == 'major':
             major = int(tok[1])
@@ -227,172 +274,136 @@ def __read_version(input_file) -> Tuple[int, int, int]:
             revision = tok[1]
         else:
             raise RuntimeError(f'Incompatible version. Expected: {major}{minor}{revision}')
-        line = __strip_line(input_file)
 
     return major, minor, revision
 
 
-def __read_blocks(input_file, compatibility_mode_12x_13x: bool) -> dict:
+def __read_blocks(lines: List[str], compatibility_mode_12x_13x: bool) -> BlockTable:
     """
     Read Pulseq blocks from .seq file.
 
     Parameters
     ----------
-    input_file : file
-        .seq file
+    lines : list
+        Lines of [BLOCKS] section.
     compatibility_mode_12x_13x : bool
 
     Returns
     -------
-    event_table : dict
-        Dict object containing key value pairs of Pulseq block ID and block definition.
-    """
+    block_table : BlockTable
+        Event IDs of the blocks, in order of the block IDs.
 
-    line = __strip_line(input_file)
-
-    event_table = dict()
-    while line != '' and line != '#':
-        block_events = np.fromstring(line, dtype=int, sep=' ')
+    Raises
+    ------
+    ValueError
+        If the block IDs are not consecutive.
+    """
+    table = __read_table(lines, dtype=int)
+    if len(table) == 0:
+        return BlockTable()
 
-        if compatibility_mode_12x_13x:
-            event_table[block_events[0]] = np.array([*block_events[1:], 0])
-        else:
-            event_table[block_events[0]] = block_events[1:]
+    table = table[np.argsort(table[:, 0], kind='stable')]
+    if not np.array_equal(table[:, 0], np.arange(1, len(table) + 1)):
+        raise ValueError('Block IDs must be consecutive, starting at 1')
 
-        line = __strip_line(input_file)
+    block_events = table[:, 1:]
+    if compatibility_mode_12x_13x:
+        block_events = np.hstack((block_events, np.zeros((len(table), 1), dtype=int)))
 
-    return event_table
+    return BlockTable.from_arrays(block_events)
 
 
-def __read_events(input_file, scale: list = (1,), event_type: str = str(),
-                  event_library: EventLibrary = EventLibrary()) -> EventLibrary:
+def __read_events(lines: List[str], event_library: EventLibrary, scale: list = (1,),
+                  event_type: str = str()) -> EventLibrary:
     """
     Read Pulseq events from .seq file.
 
     Parameters
     ----------
-    input_file : file object
-        .seq file
+    lines : list
+        Lines of event section.
+    event_library : EventLibrary
+        EventLibrary that the events are inserted into.
     scale : list, default=(1,)
         Scaling factor.
     event_type : str
         Type of Pulseq event.
-    event_library : EventLibrary, default=EventLibrary()
-        EventLibrary
 
     Returns
     -------
-    dict_definitions : dict
+    event_library : EventLibrary
         `EventLibrary` object containing Pulseq event dict_definitions.
     """
-    line = __strip_line(input_file)
-
-    while line != '' and line != '#':
-        data = np.fromstring(line, dtype=float, sep=' ')
-        event_id = data[0]
-        data = data[1:] * scale
-        if event_type == '':
-            event_library.insert(key_id=event_id, new_data=data)
-        else:
-            event_library.insert(key_id=event_id, new_data=data, data_type=event_type)
-        line = __strip_line(input_file)
+    table = __read_table(lines)
+    if len(table) == 0:
+        return event_library
 
-    return event_library
-
-
-def __read_and_parse_events(input_file, *args) -> EventLibrary:
-    event_library = EventLibrary()
-    line = __strip_line(input_file)
-
-    while line != '' and line != '#':
-        datas = re.split('(\s+)', line)
-        datas = [d for d in datas if d != ' ']
-        data = np.zeros(len(datas) - 1, dtype=np.int)
-        event_id = int(datas[0])
-        for i in range(1, len(datas)):
-            if i > len(args):
-                data[i - 1] = int(datas[i])
-            else:
-                data[i - 1] = args[i - 1](datas[i])
-        event_library.insert(key_id=event_id, new_data=data)
-        line = __strip_line(input_file)
+    event_ids = table[:, 0].astype(int).tolist()
+    data = table[:, 1:] * scale
+    for event_id, event_data in zip(event_ids, data):
+        event_library.insert(key_id=event_id, new_data=event_data, data_type=event_type)
 
     return event_library
 
 
-def __read_shapes(input_file) -> EventLibrary:
+def __read_label_events(lines: List[str]) -> EventLibrary:
     """
-    Read Pulseq shapes from .seq file.
+    Read label events (id, value, label name) from .seq file.
 
     Parameters
     ----------
-    input_file : file
-        .seq file
+    lines : list
+        Lines of label extension section.
 
     Returns
     -------
-    shape_library : EventLibrary
-        `EventLibrary` object containing shape dict_definitions.
+    event_library : EventLibrary
+        `EventLibrary` object containing the value and label ID of each label event.
     """
-    shape_library = EventLibrary()
+    event_library = EventLibrary()
+    label_ids = {label: i + 1 for i, label in enumerate(get_supported_labels())}
 
-    line = __skip_comments(input_file)
+    for line in lines:
+        tok = line.split()
+        data = np.array([int(tok[1]), label_ids[tok[2]], *[int(x) for x in tok[3:]]], dtype=int)
+        event_library.insert(key_id=int(tok[0]), new_data=data)
 
-    while line != -1 and (line != '' or line[0:8] == 'shape_id'):
-        tok = line.split(' ')
-        id = int(tok[1])
-        line = __skip_comments(input_file)
-        tok = line.split(' ')
-        num_samples = int(tok[1])
-        data = []
-        line = __skip_comments(input_file)
-        while line != '' and line != '#':
-            data.append(float(line))
-            line = __strip_line(input_file)
-        line = __skip_comments(input_file)
-        data.insert(0, num_samples)
-        data = np.asarray(data)
-        shape_library.insert(key_id=id, new_data=data)
-    return shape_library
+    return event_library
 
 
-def __skip_comments(input_file) -> str:
+def __read_shapes(lines: List[str]) -> EventLibrary:
     """
-    Skip one '#' comment in .seq file.
+    Read Pulseq shapes from .seq file.
 
     Parameters
     ----------
-    input_file : file
-        .seq file
+    lines : list
+        Lines of [SHAPES] section.
 
     Returns
     -------
-    line : str
-        First line in `input_file` after skipping one '#' comment block. Note: File pointer is remembered, so successive calls work as expected.
-    """
-
-    line = __strip_line(input_file)
-
-    while line != -1 and (line == '' or line[0] == '#'):
-        line = __strip_line(input_file)
-
-    return line
-
-
-def __strip_line(input_file) -> str:
+    shape_library : EventLibrary
+        `EventLibrary` object containing shape dict_definitions.
     """
-    Removes spaces and newline whitespaces.
-
-    Parameters
-    ----------
-    input_file : file
-        .seq file
+    shape_library = EventLibrary()
 
-    Returns
-    -------
-    line : str
-        First line in input_file after removing spaces and newline whitespaces. Note: File pointer is remembered,
-        so successive calls work as expected. Returns -1 for eof.
-    """
-    line = input_file.readline()  # If line is an empty string, end of the file has been reached
-    return line.strip() if line != '' else -1
+    # Each shape starts with 'shape_id' and 'num_samples' lines, followed by one sample per line
+    headers = [i for i, line in enumerate(lines) if line.startswith('shape_id')]
+    if len(headers) == 0:
+        return shape_library
+
+    sample_lines = np.ones(len(lines), dtype=bool)
+    sample_lines[headers] = False
+    sample_lines[np.add(headers, 1)] = False
+    samples = np.array([line for line, is_sample in zip(lines, sample_lines) if is_sample], dtype=float)
+
+    ends = [*headers[1:], len(lines)]
+    offset = 0
+    for start, end in zip(headers, ends):
+        shape_id = int(lines[start].split()[1])
+        num_samples = int(lines[start + 1].split()[1])
+        count = end - start - 2
+        data = np.concatenate(([num_samples], samples[offset:offset + count]))
+        offset += count
+        shape_library.insert(key_id=shape_id, new_data=data)
+    return shape_library
@@ -8,10 +8,11 @@ from warnings import warn
 import matplotlib as mpl
 import numpy as np
 from matplotlib import pyplot as plt
-from scipy.signal import argrelextrema
 
 from pypulseq import major, minor, revision
 from pypulseq.Sequence import block
+from pypulseq.Sequence.block_table import BlockTable, EVENT_COLUMNS
+from pypulseq.Sequence.gradient_raster import integrate_gradients, rasterize_gradients, sample_trajectory
 from pypulseq.Sequence import parula
 from pypulseq.Sequence.read_seq import read
 from pypulseq.Sequence.test_report import test_report as ext_test_report
@@ -21,7 +22,6 @@ from pypulseq.check_timing import check_timing as ext_check_timing
 from pypulseq.decompress_shape import decompress_shape
 from pypulseq.event_lib import EventLibrary
 from pypulseq.opts import Opts
-from pypulseq.points_to_waveform import points_to_waveform
 from pypulseq.supported_labels import get_supported_labels
 
 
@@ -53,10 +53,10 @@ class Sequence:
         self.rf_raster_time = self.system.rf_raster_time  # RF raster time (system dependent)
         self.grad_raster_time = self.system.grad_raster_time  # Gradient raster time (system dependent)
 
-        self.dict_block_events = OrderedDict()  # Event table
+        self.block_table = BlockTable()  # Event table and block durations
         self.dict_definitions = OrderedDict()  # Optional sequence dict_definitions
 
-        self.arr_block_durations = []  # Cache of block durations
+        self.event_cache = dict()  # Events constructed from the libraries, see block.get_block_events()
         self.arr_extension_numeric_idx = []  # numeric IDs of the used extensions
         self.arr_extension_string_idx = []  # string IDs of the used extensions
 
@@ -70,7 +70,7 @@ class Sequence:
         s += "\nextensions_library: " + str(self.extensions_library)  # inserted for trigger support by mveldmann
         s += "\nrf_raster_time: " + str(self.rf_raster_time)
         s += "\ngrad_raster_time: " + str(self.grad_raster_time)
-        s += "\ndict_block_events: " + str(len(self.dict_block_events))
+        s += "\nblock_table: " + str(len(self.block_table))
         return s
 
     def add_block(self, *args: SimpleNamespace) -> None:
@@ -82,7 +82,21 @@ class Sequence:
         args
             Event or list of events to be added as a block to `Sequence`.
         """
-        block.add_block(self, len(self.dict_block_events) + 1, *args)
+        block.add_block(self, len(self.block_table) + 1, *args)
+
+    @property
+    def dict_block_events(self) -> BlockTable:
+        """
+        Event table, for compatibility with code that accesses the blocks as a dict of block indices and event IDs.
+        """
+        return self.block_table
+
+    @property
+    def arr_block_durations(self) -> np.ndarray:
+        """
+        Durations of all blocks.
+        """
+        return self.block_table.durations
 
     def calculate_kspace(self, trajectory_delay: int = 0, spoil_val: float = []) -> Tuple[np.array, np.array, np.array, np.array, np.array]:
         """
@@ -92,6 +106,8 @@ class Sequence:
         ----------
         trajectory_delay : int, default=0
             Compensation factor in millis to align ADC and gradients in the reconstruction.
+        spoil_val : float, default=[]
+            If given, the trajectory is set back to 0 during spoiler gradients that move it beyond 90 % of this value.
 
         Returns
         -------
@@ -106,110 +122,42 @@ class Sequence:
         t_adc : numpy.array
             Sampling timepoints.
         """
-        # Initialise the counters and accumulator objects
-        count_excitation = 0
-        count_refocusing = 0
-        count_adc_samples = 0
-
-        # Loop through the blocks to prepare preallocations
-        for block_counter in range(len(self.dict_block_events)):
-            block = self.get_block(block_counter + 1)
-            if hasattr(block, 'rf'):
-                if not hasattr(block.rf, 'use') or block.rf.use != 'refocusing':
-                    count_excitation += 1
-                else:
-                    count_refocusing += 1
-
-            if hasattr(block, 'adc'):
-                count_adc_samples += int(block.adc.num_samples)
-
-        t_excitation = np.zeros(count_excitation)
-        t_refocusing = np.zeros(count_refocusing)
-        k_time = np.zeros(count_adc_samples)
-        current_duration = 0
-        count_excitation = 0
-        count_refocusing = 0
-        kc_outer = 0
-        traj_recon_delay = trajectory_delay
-
-        # Go through the blocks and collect RF and ADC timing data
-        for block_counter in range(len(self.dict_block_events)):
-            block = self.get_block(block_counter + 1)
-
-            if hasattr(block, 'rf'):
-                rf = block.rf
-                rf_center, _ = calc_rf_center(rf)
-                t = rf.delay + rf_center
-                if not hasattr(block.rf, 'use') or block.rf.use != 'refocusing':
-                    t_excitation[count_excitation] = current_duration + t
-                    count_excitation += 1
-                else:
-                    t_refocusing[count_refocusing] = current_duration + t
-                    count_refocusing += 1
-
-            if hasattr(block, 'adc'):
-                _k_time = np.arange(block.adc.num_samples) + 0.5
-                _k_time = _k_time * block.adc.dwell + block.adc.delay + current_duration + traj_recon_delay
-                k_time[kc_outer:kc_outer + block.adc.num_samples] = _k_time
-                kc_outer += block.adc.num_samples
-            current_duration += self.arr_block_durations[block_counter]
+        # Collect RF and ADC timing data with the start times of the blocks. The events are taken from the event
+        # IDs in the block table, so that each event is constructed only once.
+        start_times = self.block_table.start_times()
+
+        rf_ids = self.block_table.get_event_ids('rf')
+        rf_blocks = np.flatnonzero(rf_ids)
+        rf_centers, rf_refocusing = dict(), dict()
+        for rf_id in np.unique(rf_ids[rf_blocks]).tolist():
+            rf = block.get_block_events(self, EVENT_COLUMNS.index('rf'), rf_id)['rf']
+            rf_center, _ = calc_rf_center(rf)
+            rf_centers[rf_id] = rf.delay + rf_center
+            rf_refocusing[rf_id] = hasattr(rf, 'use') and rf.use == 'refocusing'
+        block_rf_ids = rf_ids[rf_blocks].tolist()
+        t_rf = start_times[rf_blocks] + np.array([rf_centers[rf_id] for rf_id in block_rf_ids])
+        is_refocusing = np.array([rf_refocusing[rf_id] for rf_id in block_rf_ids], dtype=bool)
+        t_excitation = t_rf[~is_refocusing]
+        t_refocusing = t_rf[is_refocusing]
+
+        adc_ids = self.block_table.get_event_ids('adc')
+        adc_blocks = np.flatnonzero(adc_ids)
+        adcs = {adc_id: block.get_block_events(self, EVENT_COLUMNS.index('adc'), adc_id)['adc'] for adc_id in
+                np.unique(adc_ids[adc_blocks]).tolist()}
+        block_adcs = [adcs[adc_id] for adc_id in adc_ids[adc_blocks].tolist()]
+        num_samples = np.array([adc.num_samples for adc in block_adcs], dtype=int)
+        sample_index = np.arange(np.sum(num_samples)) - np.repeat(np.cumsum(num_samples) - num_samples, num_samples)
+        k_time = (sample_index + 0.5) * np.repeat([adc.dwell for adc in block_adcs], num_samples)
+        k_time = k_time + np.repeat([adc.delay for adc in block_adcs], num_samples)
+        k_time = k_time + np.repeat(start_times[adc_blocks], num_samples) + trajectory_delay
 
         # Now calculate the actual k-space trajectory based on the gradient waveforms
         gw = self.gradient_waveforms()
-        i_excitation = np.round(t_excitation / self.grad_raster_time)
-        i_refocusing = np.round(t_refocusing / self.grad_raster_time)
-        i_periods = np.sort([1, *(i_excitation + 1), *(i_refocusing + 1), gw.shape[1] + 1]).astype(int)
-        # i_periods -= 1  # Python is 0-indexed
-        ii_next_excitation = min(len(i_excitation), 1)
-        ii_next_refocusing = min(len(i_refocusing), 1)
-        k_traj = np.zeros_like(gw)
-        k = np.zeros((3, 1))
-
-        for i in range(len(i_periods) - 1):
-            i_period_end = i_periods[i + 1] - 1
-            gw_period = gw[:, i_periods[i] - 1:i_period_end] * self.grad_raster_time
-            k_period = np.concatenate((k, gw_period), axis=1)
-            k_period = np.cumsum(k_period, axis=1)
-            # account for spoiling: when traj is out of bound, set it back to 0
-            if spoil_val != []:
-                for j in range(3):
-                    while max(abs(k_period[j,:]))>=spoil_val*0.9:
-                        ind_spoil = np.where(abs(k_period[j,:]) >= spoil_val*0.9)[0][0]
-                        spoil_start_1 = np.where(gw_period[j,:ind_spoil] == 0)[0]
-                        spoil_start_2 = argrelextrema(gw_period[j,:ind_spoil], np.less)[0]
-                        spoil_end = np.where(gw_period[j,ind_spoil+1:] == 0)[0]
-
-                        spoil_start_1 = spoil_start_1[-1] + 1 if spoil_start_1.size > 0 else 0
-                        spoil_start_2 = spoil_start_2[-1] + 1 if spoil_start_2.size > 0 else 0
-                        spoil_start = max(spoil_start_1,spoil_start_2)
-                        spoil_end = ind_spoil + 1 + spoil_end[0] if spoil_end.size > 0 else -1
-
-                        k_period_temp = np.concatenate((k[j,:], gw_period[j,:]))
-                        k_period[j,:spoil_start] = np.cumsum(k_period_temp[:spoil_start])
-                        k_period[j,spoil_start:spoil_end] = 0
-                        k_period[j,spoil_end:] = np.cumsum(k_period_temp[spoil_end:])
-
-            k_traj[:, i_periods[i] - 1:i_period_end] = k_period[:, 1:]
-            k = k_period[:, -1]
-
-            if ii_next_excitation > 0 and i_excitation[ii_next_excitation - 1] == i_period_end:
-                k[:] = 0
-                k_traj[:, i_period_end - 1] = np.nan
-                ii_next_excitation = min(len(i_excitation), ii_next_excitation + 1)
-
-            if ii_next_refocusing > 0 and i_refocusing[ii_next_refocusing - 1] == i_period_end:
-                k = -k
-                ii_next_refocusing = min(len(i_refocusing), ii_next_refocusing + 1)
-
-            k = k.reshape((-1, 1))  # To be compatible with np.concatenate
-
-        k_traj_adc = []
-        for _k_traj_row in k_traj:
-            result = np.interp(xp=np.array(range(1, k_traj.shape[1] + 1)) * self.grad_raster_time,
-                               fp=_k_traj_row,
-                               x=k_time)
-            k_traj_adc.append(result)
-        k_traj_adc = np.stack(k_traj_adc)
+        i_excitation = np.round(t_excitation / self.grad_raster_time).astype(int)
+        i_refocusing = np.round(t_refocusing / self.grad_raster_time).astype(int)
+        k_traj = integrate_gradients(gw, self.grad_raster_time, i_excitation, i_refocusing, spoil_val)
+
+        k_traj_adc = sample_trajectory(k_traj, self.grad_raster_time, k_time)
         t_adc = k_time
 
         return k_traj_adc, k_traj, t_excitation, t_refocusing, t_adc
@@ -240,7 +188,7 @@ class Sequence:
         """
         error_report = []
         is_ok = True
-        num_blocks = len(self.dict_block_events)
+        num_blocks = len(self.block_table)
         total_duration = 0
 
         for block_counter in range(num_blocks):
@@ -280,12 +228,9 @@ class Sequence:
             Number of events in this sequence.
         """
 
-        num_blocks = len(self.dict_block_events)
-        event_count = np.zeros(len(self.dict_block_events[1]))
-        duration = 0
-        for block_counter in range(num_blocks):
-            event_count += self.dict_block_events[block_counter + 1] > 0
-            duration += self.arr_block_durations[block_counter]
+        num_blocks = len(self.block_table)
+        event_count = self.block_table.event_count()
+        duration = self.block_table.total_duration()
 
         return duration, num_blocks, event_count
 
@@ -402,59 +347,10 @@ class Sequence:
         grad_waveforms : numpy.ndarray
             Decompressed gradient waveform.
         """
-        duration, num_blocks, _ = self.duration()
-
+        duration, _, _ = self.duration()
         wave_length = math.ceil(duration / self.grad_raster_time)
-        grad_channels = 3
-        grad_waveforms = np.zeros((grad_channels, wave_length))
-        grad_channels = ['gx', 'gy', 'gz']
-
-        t0 = 0
-        t0_n = 0
-        for block_counter in range(num_blocks):
-            block = self.get_block(block_counter + 1)
-            for j in range(len(grad_channels)):
-                if hasattr(block, grad_channels[j]):
-                    grad = getattr(block, grad_channels[j])
-                    if grad.type == 'grad':
-                        nt_start = round((grad.delay + grad.t[0]) / self.grad_raster_time)
-                        waveform = grad.waveform
-                    else:
-                        nt_start = round(grad.delay / self.grad_raster_time)
-                        if abs(grad.flat_time) > np.finfo(float).eps:
-                            t = np.cumsum([0, grad.rise_time, grad.flat_time, grad.fall_time])
-                            trap_form = np.multiply([0, 1, 1, 0], grad.amplitude)
-                        else:
-                            t = np.cumsum([0, grad.rise_time, grad.fall_time])
-                            trap_form = np.multiply([0, 1, 0], grad.amplitude)
-
-                        tn = math.floor(t[-1] / self.grad_raster_time)
-                        t = np.append(t, t[-1] + self.grad_raster_time)
-                        trap_form = np.append(trap_form, 0)
-
-                        if abs(grad.amplitude) > np.finfo(float).eps:
-                            waveform = points_to_waveform(times=t, amplitudes=trap_form,
-                                                          grad_raster_time=self.grad_raster_time)
-                        else:
-                            waveform = np.zeros(tn + 1)
-
-                    if len(waveform) != np.sum(np.isfinite(waveform)):
-                        warn('Not all elements of the generated waveform are finite')
-
-                    """
-                    Matlab dynamically resizes arrays during slice assignment operation if assignment is out of bounds
-                    Numpy does not; following is a workaround
-                    """
-                    l1, l2 = int(t0_n + nt_start), int(t0_n + nt_start + len(waveform))
-                    if l2 > grad_waveforms.shape[1]:
-                        z = np.zeros((grad_waveforms.shape[0], l2 - grad_waveforms.shape[1]))
-                        grad_waveforms = np.hstack((grad_waveforms, z))
-                    grad_waveforms[j, l1:l2] = waveform
-
-            t0 += self.arr_block_durations[block_counter]
-            t0_n = round(t0 / self.grad_raster_time)
 
-        return grad_waveforms
+        return rasterize_gradients(self, wave_length)
 
     def mod_grad_axis(self, axis: str, modifier: int) -> None:
         """
@@ -483,8 +379,7 @@ class Sequence:
         other_channels.remove(channel_num)
 
         # Go through all event table entries and list gradient objects in the library
-        all_grad_events = np.array(list(self.dict_block_events.values()))
-        all_grad_events = all_grad_events[:, 2:5]
+        all_grad_events = self.block_table.events[:, 2:5]
 
         selected_events = np.unique(all_grad_events[:, channel_num])
         selected_events = selected_events[selected_events != 0]
@@ -498,6 +393,7 @@ class Sequence:
                 # Need to update first and last fields
                 self.grad_library.data[selected_events[i]][3] *= modifier
                 self.grad_library.data[selected_events[i]][4] *= modifier
+        self.event_cache.clear()
 
     def plot(self, label: str = str(), save: bool = False, time_range=(0, np.inf), time_disp: str = 's',
              plot_type: str = 'Gradient') -> None:
@@ -554,7 +450,7 @@ class Sequence:
             p = parula.main(len(label_idx_to_plot) + 1)
             label_colors_to_plot = p(np.arange(len(label_idx_to_plot)))
 
-        for block_counter in range(len(self.dict_block_events)):
+        for block_counter in range(len(self.block_table)):
             block = self.get_block(block_counter + 1)
             is_valid = time_range[0] <= t0 <= time_range[1]
             if is_valid:
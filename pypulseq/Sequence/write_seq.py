@@ -54,11 +54,11 @@ def write(self, file_name: str) -> None:
     output_file.write('# Format of blocks:\n')
     output_file.write('#  #  D RF  GX  GY  GZ ADC EXT\n')
     output_file.write('[BLOCKS]\n')
-    id_format_width = '{:' + str(len(str(len(self.dict_block_events)))) + 'd}'
+    id_format_width = '{:' + str(len(str(len(self.block_table)))) + 'd}'
     id_format_str = id_format_width + ' ' + '{:2d} {:2d} {:3d} {:3d} {:3d} {:2d} {:2d}\n'
-    for block_counter in range(len(self.dict_block_events)):
-        s = id_format_str.format(*(block_counter + 1, *self.dict_block_events[block_counter + 1]))
-        output_file.write(s)
+    output_file.write(
+        ''.join(id_format_str.format(i + 1, *events) for i, events in enumerate(self.block_table.events.tolist()))
+    )
     output_file.write('\n')
 
     if len(self.rf_library.keys) != 0:
@@ -2,11 +2,88 @@ from typing import Tuple
 
 import numpy as np
 
+# Events with up to this many values are keyed by formatting the values in Python, longer events (shapes) by
+# quantising the values with NumPy. The two kinds of keys never compare equal, but events with the same data always
+# have the same length and therefore the same kind of key.
+MAX_FORMATTED_KEY_LENGTH = 32
+# Number of significant digits of the keys, corresponds to the '%.6g' format
+KEY_SIGNIFICANT_DIGITS = 6
+
+
+def get_key(data: np.ndarray) -> bytes:
+    """
+    Returns the canonical key of event data. Floating point values are rounded to `KEY_SIGNIFICANT_DIGITS`
+    significant digits, integer values are kept exact. Integer and floating point data with the same values have the
+    same key.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Event data.
+
+    Returns
+    -------
+    key : bytes
+        Key of `data`.
+    """
+    data = data.ravel()
+    is_integer = data.dtype.kind in 'biu'
+    if len(data) <= MAX_FORMATTED_KEY_LENGTH:
+        value_format = '%d' if is_integer else '%.6g'
+        return ' '.join([value_format % x for x in data.tolist()]).encode()
+
+    if is_integer:
+        mantissa = data.astype(np.int64)
+        exponent = np.zeros(len(data), dtype=np.int64)
+    else:
+        mantissa, exponent = quantise(data.astype(np.float64))
+
+    # Remove trailing zeros of the mantissa, so that integer and rounded floating point values have the same key
+    trailing_zeros = (mantissa % 10 == 0) & (mantissa != 0)
+    while np.any(trailing_zeros):
+        mantissa[trailing_zeros] //= 10
+        exponent[trailing_zeros] += 1
+        trailing_zeros = (mantissa % 10 == 0) & (mantissa != 0)
+    return mantissa.tobytes() + exponent.tobytes()
+
+
+def quantise(data: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rounds `data` to `KEY_SIGNIFICANT_DIGITS` significant digits. Returns integer mantissas and decimal exponents, such
+    that `data ~= mantissa * 10 ** exponent`. Non-finite values are mapped to a zero mantissa and a reserved exponent.
+    """
+    finite = np.isfinite(data)
+    magnitude = np.abs(np.where(finite, data, 0))
+    nonzero = magnitude > 0
+
+    exponent = np.zeros(len(data), dtype=np.int64)
+    exponent[nonzero] = np.floor(np.log10(magnitude[nonzero])).astype(np.int64) - (KEY_SIGNIFICANT_DIGITS - 1)
+    scaled = magnitude / np.power(10.0, exponent)
+    # log10 can be off by one close to powers of ten
+    low, high = 10 ** (KEY_SIGNIFICANT_DIGITS - 1), 10 ** KEY_SIGNIFICANT_DIGITS
+    exponent[nonzero & (scaled < low)] -= 1
+    exponent[scaled >= high] += 1
+    scaled = magnitude / np.power(10.0, exponent)
+
+    mantissa = np.rint(scaled)
+    # Rounding up to the next power of ten (e.g. 9.999996 -> 10.0000)
+    carry = mantissa >= high
+    mantissa[carry] = low
+    exponent[carry] += 1
+
+    mantissa = np.copysign(mantissa, data).astype(np.int64)
+    mantissa[~finite] = 0
+    exponent[~finite] = np.select([np.isnan(data), data > 0], [1000, 1001], 1002)[~finite]
+    return mantissa, exponent
+
 
 class EventLibrary:
     """
     Defines an event library. Provides methods to insert new data and find existing data.
 
+    Events are looked up by a canonical key of their data, see `get_key()`. Events are considered identical if their
+    values agree to 6 significant digits, which is the precision of the .seq file format.
+
     Attributes
     ----------
     keys : dict{str, int}
@@ -17,12 +94,15 @@ class EventLibrary:
         Key-value pairs of event keys and corresponding length of data values in `self.data`.
     type : dict{str, str}
         Key-value pairs of event keys and corresponding event types.
-    keymap : dict{str, int}
-        Key-value pairs of data values and corresponding event keys.
+    keymap : dict{bytes, int}
+        Key-value pairs of data keys and corresponding event keys.
+    next_free_id : int
+        Event key that is returned for data that is not in the library.
     """
 
     def __init__(self):
         self.keys, self.data, self.lengths, self.type, self.keymap = dict(), dict(), dict(), dict(), dict()
+        self.next_free_id = 1
 
     def __str__(self):
         s = "EventLibrary:"
@@ -48,18 +128,11 @@ class EventLibrary:
         found : bool
             If `new_data` was found in the event library or not.
         """
-        new_data = np.array(new_data)
-        data_string = np.array2string(new_data, formatter={'float': lambda x: f'{x:.6g}'})
-        data_string = data_string.replace('[', '')
-        data_string = data_string.replace(']', '')
-        try:
-            key_id = self.keymap[data_string]
-            found = True
-        except KeyError:
-            key_id = 1 if len(self.keys) == 0 else max(self.keys) + 1
-            found = False
-
-        return key_id, found
+        data_key = get_key(np.asarray(new_data))
+        key_id = self.keymap.get(data_key)
+        if key_id is None:
+            return self.next_free_id, False
+        return key_id, True
 
     def insert(self, key_id: int, new_data: np.ndarray, data_type: str = str()) -> None:
         """
@@ -78,10 +151,8 @@ class EventLibrary:
         self.keys[key_id] = key_id
         self.data[key_id] = new_data
         self.lengths[key_id] = max(new_data.shape)
-        data_string = np.array2string(new_data, formatter={'float_kind': lambda x: "%.6g" % x})
-        data_string = data_string.replace('[', '')
-        data_string = data_string.replace(']', '')
-        self.keymap[data_string] = key_id
+        self.keymap[get_key(new_data)] = key_id
+        self.next_free_id = max(self.next_free_id, int(key_id) + 1)
         if data_type != '':
             self.type[key_id] = data_type
 
@@ -1,9 +1,13 @@
+import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Any, Mapping, TypedDict
 
 import common.logger as logger
 
 from recon.B0Correction import OCTOPUS as oc
+from recon.B0Correction.MFIEngine import MFIEngine
+from recon.B0Correction.ConjugatePhase import CPREngine, FSCPREngine
 import recon.recon_utils as ru
 
 # from B0Correction import OCTOPUS as oc
@@ -36,7 +40,11 @@ class B0Corrector:
                  df: Optional[np.ndarray], 
                  Lx: int=1,
                  nonCart: Optional[bool]=None, 
-                 params: Optional[B0Params]=None):
+                 params: Optional[B0Params]=None,
+                 method: str='MFI',
+                 workers: Optional[int]=None,
+                 slice_batch: int=4,
+                 dtype=complex):
         
         self.Y = Y  # raw k-space (rads)
         self.kt = kt  # k-space trajectory, acq times for each frequency encode (s) 
@@ -44,11 +52,19 @@ class B0Corrector:
         self.Lx = Lx  # number of basis images to use for conjugate phase methods
         self.nonCart = nonCart # non-Cartesian trajectory?
         self.params = params  # trajectory parameters for B0 correction
+        self.method = method  # MFI (default), CPR, or fsCPR
+        self.workers = workers or os.cpu_count() or 1  # threads for slice-wise correction of 3D data
+        self.slice_batch = slice_batch  # number of slices processed per thread call
+        self.dtype = dtype  # complex type of the corrected image (e.g., complex64 for single precision)
                     
     def __call__(self) -> np.ndarray:
         if self.df is None:  # if no B0, directly perform ifft
             return self.direct_recon()
         
+        if self.method == 'CPR':
+            return self.correct_CPR()
+        if self.method == 'fsCPR':
+            return self.correct_fsCPR()
         return self.correct_MFI()  # default method
     
     
@@ -94,12 +110,49 @@ class B0Corrector:
             Corrected image data.
         '''
         log.info("Running multi-frequency interpolation for off-resonance corrected reconstruction")
-        if len(self.Y.shape) <= 2:
+        if len(self.Y.shape) == 2 and self.nonCart:
             return oc.MFI(self.Y, 'raw', self.kt, self.df, Lx=self.Lx, nonCart=self.nonCart, params=self.params) 
-        elif len(self.Y.shape)  == 3:
-            mfi_img = np.zeros(self.Y.shape)
-            for i in range(self.Y.shape[2]):
-                 mfi_img[..., i] = oc.MFI(self.Y[..., i], self.kt, self.df[..., i], Lx=1, nonCart=False, params=self.params) 
-            return mfi_img
-        else:
+        return self.correct_slices(MFIEngine(self.kt, self.df, Lx=self.Lx, dtype=self.dtype))
+
+    def correct_CPR(self) -> np.ndarray:
+        '''
+        Off-resonance correction by Conjugate Phase Reconstruction (OCTOPUS.CPR)
+        '''
+        log.info("Running conjugate phase off-resonance corrected reconstruction")
+        if len(self.Y.shape) == 2 and self.nonCart:
+            return oc.CPR(self.Y, 'raw', self.kt, self.df, nonCart=self.nonCart, params=self.params)
+        return self.correct_slices(CPREngine(self.kt, self.df, dtype=self.dtype))
+
+    def correct_fsCPR(self) -> np.ndarray:
+        '''
+        Off-resonance correction by frequency-segmented Conjugate Phase Reconstruction (OCTOPUS.fs_CPR)
+        '''
+        log.info("Running frequency-segmented conjugate phase off-resonance corrected reconstruction")
+        if len(self.Y.shape) == 2 and self.nonCart:
+            return oc.fs_CPR(self.Y, 'raw', self.kt, self.df, self.Lx, nonCart=self.nonCart, params=self.params)
+        return self.correct_slices(FSCPREngine(self.kt, self.df, Lx=self.Lx, dtype=self.dtype))
+
+    def correct_slices(self, engine) -> np.ndarray:
+        '''
+        Runs the correction engine on Cartesian 2D or 3D data. The engine holds everything that is
+        shared between the slices (frequencies, phase ramps, coefficients), so that slices of 3D data
+        can be dispatched in batches to a thread pool. The FFTs and array operations release the GIL.
+        '''
+        if len(self.Y.shape) == 2:
+            return engine(self.Y)
+        if len(self.Y.shape) != 3:
             raise ValueError(f'Input data shape {self.Y.shape} not supported')
+
+        slices = self.Y.shape[2]
+        batches = [list(range(i, min(i + self.slice_batch, slices))) for i in range(0, slices, self.slice_batch)]
+        if self.workers <= 1 or len(batches) == 1:
+            return engine(self.Y)
+
+        corrected = np.zeros(self.Y.shape, dtype=self.dtype)
+        def correct_batch(batch):
+            corrected[..., batch] = engine(self.Y, slices=batch)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as executor:
+            # Raise exceptions from the worker threads
+            list(executor.map(correct_batch, batches))
+        return corrected
@@ -0,0 +1,80 @@
+import numpy as np
+from math import ceil, pi
+from typing import Optional, Sequence
+
+from recon.B0Correction.MFIEngine import cartesian_basis_images
+
+
+class CPREngine:
+    '''
+    Off-resonance correction by Conjugate Phase Reconstruction for Cartesian data (same method as
+    OCTOPUS.CPR). Every pixel is taken from the image demodulated with its field-map value. The
+    unique field-map values are determined once for the whole volume, and the demodulated images of
+    each slice are reconstructed in batches of frequencies, in the given complex type.
+    '''
+    def __init__(self, kt: np.ndarray, df: np.ndarray, batch_size: int = 32, dtype=complex):
+        self.kt = kt
+        self.batch_size = batch_size
+        self.dtype = dtype
+        self.df_values, df_index = np.unique(df, return_inverse=True)
+        self.df_index = df_index.reshape(df.shape)
+
+    def _correct_slice(self, Y: np.ndarray, df_index: np.ndarray) -> np.ndarray:
+        M_hat = np.zeros(Y.shape, dtype=self.dtype)
+        values = np.unique(df_index)
+        for start in range(0, len(values), self.batch_size):
+            batch = values[start:start + self.batch_size]
+            phase_ramps = np.exp(1j * 2 * pi * self.df_values[batch][:, None, None] * self.kt[None, :, :])
+            phase_ramps = phase_ramps.astype(self.dtype, copy=False)
+            images = cartesian_basis_images(Y, phase_ramps)
+
+            # All values of the slice between the first and last value of the batch are in the batch
+            ii, jj = np.nonzero((df_index >= batch[0]) & (df_index <= batch[-1]))
+            image_index = np.searchsorted(batch, df_index[ii, jj])
+            M_hat[ii, jj] = images[image_index, ii, jj]
+        return M_hat
+
+    def __call__(self, Y: np.ndarray, slices: Optional[Sequence[int]] = None) -> np.ndarray:
+        if Y.ndim == 2:
+            return self._correct_slice(Y, self.df_index)
+        if slices is None:
+            slices = range(Y.shape[2])
+        return np.stack([self._correct_slice(Y[..., i], self.df_index[..., i]) for i in slices], axis=-1)
+
+
+class FSCPREngine:
+    '''
+    Off-resonance correction by frequency-segmented Conjugate Phase Reconstruction for Cartesian data
+    (same method as OCTOPUS.fs_CPR). The basis frequencies, phase ramps, and the interpolation weights
+    of each pixel are calculated once for the whole volume, and stored in the given complex type
+    (and the corresponding real type).
+    '''
+    def __init__(self, kt: np.ndarray, df: np.ndarray, Lx: int = 1, dtype=complex):
+        self.kt = kt
+
+        t_ro = kt[0, -1] - kt[0, 0]
+        df_max = max(np.abs([df.max(), df.min()]))
+        L = ceil(4 * df_max * 2 * pi * t_ro / pi) * Lx
+        if len(np.unique(df)) == 1:
+            L = 1
+        self.f_L = np.linspace(df.min(), df.max(), L + 1)
+        self.phase_ramps = np.exp(1j * 2 * pi * self.f_L[:, None, None] * kt[None, :, :]).astype(dtype, copy=False)
+
+        # Linear interpolation between the two neighboring basis frequencies
+        step = self.f_L[1] - self.f_L[0]
+        position = (df - self.f_L[0]) / step if step > 0 else np.zeros(df.shape)
+        self.lower = np.clip(np.floor(position).astype(np.intp), 0, L - 1)
+        self.weight = (position - self.lower).astype(np.finfo(dtype).dtype, copy=False)
+
+    def __call__(self, Y: np.ndarray, slices: Optional[Sequence[int]] = None) -> np.ndarray:
+        lower = self.lower
+        weight = self.weight
+        if Y.ndim == 3 and slices is not None:
+            Y = Y[..., slices]
+            lower = lower[..., slices]
+            weight = weight[..., slices]
+
+        basis = cartesian_basis_images(Y, self.phase_ramps)
+        M_lower = np.take_along_axis(basis, lower[None], axis=0)[0]
+        M_upper = np.take_along_axis(basis, lower[None] + 1, axis=0)[0]
+        return (1 - weight) * M_lower + weight * M_upper
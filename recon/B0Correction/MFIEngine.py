@@ -0,0 +1,124 @@
+import numpy as np
+from math import ceil, pi
+from typing import Optional, Sequence, Tuple
+
+import recon.fft_provider as fftp
+
+
+def mfi_frequencies(df: np.ndarray, t_ro: float, Lx: int = 1) -> np.ndarray:
+    '''
+    Returns the frequencies (Hz) of the MFI basis images for the (rounded) field map, using the
+    same number of frequency segments as OCTOPUS.
+    '''
+    df_max = max(np.abs([df.max(), df.min()]))
+    L = ceil(df_max * 2 * pi * t_ro / pi) * Lx
+    if len(np.unique(df)) == 1:
+        L = 1
+    return np.linspace(df.min(), df.max(), L + 1)
+
+
+def mfi_coefficient_table(f_L: np.ndarray,
+                          df_range: Tuple[float, float],
+                          t_vector: np.ndarray,
+                          resolution: float = 0.1,
+                          alpha: float = 1.2) -> np.ndarray:
+    '''
+    Calculates the MFI interpolation coefficients for all field-map values between df_range[0] and
+    df_range[1] in steps of the given resolution. All frequency bins are solved with a single
+    least-squares call. Row n of the returned table (bins x basis frequencies) contains the
+    coefficients for the frequency df_range[0] + n * resolution.
+    '''
+    bins = int(np.rint((df_range[1] - df_range[0]) / resolution)) + 1
+    f_sampling = df_range[0] + resolution * np.arange(bins)
+
+    t_vector = np.asarray(t_vector).reshape(-1)
+    T = np.linspace(0, alpha * t_vector[-1], len(t_vector))
+
+    A = np.exp(1j * 2 * pi * np.outer(T, f_L))
+    B = np.exp(1j * 2 * pi * np.outer(T, f_sampling))
+    C = np.linalg.lstsq(A, B, rcond=None)[0]
+    return np.ascontiguousarray(C.T)
+
+
+def cartesian_basis_images(Y: np.ndarray, phase_ramps: np.ndarray) -> np.ndarray:
+    '''
+    Applies each phase ramp (basis x kt.shape) to the Cartesian k-space Y (2D, or 3D with slices
+    along the last axis) and transforms the results in the same way as OCTOPUS.imtransforms.ksp2im.
+    Returns the basis images (basis x Y.shape).
+    '''
+    if Y.ndim == 2:
+        kspace_L = Y[None] * phase_ramps
+    else:
+        kspace_L = Y[None] * phase_ramps[..., None]
+    kspace_L = fftp.fftshift(kspace_L, axes=(1, 2))
+    return fftp.ifft2(kspace_L, axes=(1, 2), overwrite_x=True)
+
+
+class MFIEngine:
+    '''
+    Vectorized off-resonance correction by Multi-Frequency Interpolation for Cartesian data
+    (Man, Pauly and Macovski, 1997). Implements the same method as OCTOPUS.MFI, but
+
+    - stores the coefficients as dense table indexed by quantized field-map bins,
+    - reconstructs all basis images with a single FFT call,
+    - combines the basis images with a single einsum,
+    - processes 3D data (readout x phase x slice) natively, using the same frequencies and
+      coefficients for all slices.
+
+    The phase ramps and coefficients only depend on the trajectory and the field map, so that the
+    engine can be reused for multiple datasets (e.g., repetitions or receive channels). They are
+    calculated in double precision and stored in the given complex type, which is also the type of
+    the corrected images (if the k-space has the same or a lower precision).
+    '''
+    def __init__(self,
+                 kt: np.ndarray,
+                 df: np.ndarray,
+                 Lx: int = 1,
+                 resolution: float = 0.1,
+                 f_L: Optional[np.ndarray] = None,
+                 dtype=complex):
+
+        self.kt = kt  # acq times of each k-space sample (s), same shape as one slice of k-space
+        self.resolution = resolution
+
+        scale = 1 / resolution
+        df = np.rint(df * scale) / scale  # same as np.round(df, 1) for the default resolution
+        df[df == 0] = 0.0  # avoid -0.0
+        self.df = df
+
+        t_vector = kt[0].reshape(-1)
+        t_ro = kt[0, -1] - kt[0, 0]
+        self.f_L = mfi_frequencies(df, t_ro, Lx) if f_L is None else np.asarray(f_L)
+
+        self.df_min = float(df.min())
+        self.coeffs = mfi_coefficient_table(self.f_L, (self.df_min, float(df.max())), t_vector,
+                                            resolution).astype(dtype, copy=False)
+        self.bins = np.clip(np.rint((df - self.df_min) / resolution).astype(np.intp), 0, self.coeffs.shape[0] - 1)
+
+        # Phase ramps of all basis frequencies (basis x kt.shape)
+        self.phase_ramps = np.exp(1j * 2 * pi * self.f_L[:, None, None] * kt[None, :, :]).astype(dtype, copy=False)
+
+    @property
+    def basis_count(self) -> int:
+        return len(self.f_L)
+
+    def basis_images(self, Y: np.ndarray, slices: Optional[Sequence[int]] = None) -> np.ndarray:
+        '''
+        Reconstructs the basis images (basis x image shape) from Cartesian k-space Y (2D or 3D with
+        slices along the last axis) in the same way as OCTOPUS.imtransforms.ksp2im.
+        '''
+        if Y.ndim == 3 and slices is not None:
+            Y = Y[..., slices]
+        return cartesian_basis_images(Y, self.phase_ramps)
+
+    def combine(self, basis: np.ndarray, slices: Optional[Sequence[int]] = None) -> np.ndarray:
+        '''
+        Combines the basis images pixel by pixel with the coefficients of the field-map value.
+        '''
+        bins = self.bins if slices is None else self.bins[..., slices]
+        return np.einsum('l...,...l->...', basis, self.coeffs[bins])
+
+    def __call__(self, Y: np.ndarray, slices: Optional[Sequence[int]] = None) -> np.ndarray:
+        if Y.shape[:2] != self.kt.shape:
+            raise ValueError(f'Data shape {Y.shape} does not match trajectory shape {self.kt.shape}')
+        return self.combine(self.basis_images(Y, slices), slices)
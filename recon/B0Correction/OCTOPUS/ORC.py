@@ -5,7 +5,7 @@ Methods for ORC (Off-Resonance Correction) and off-resonance simulation
 \nLast updated: 01/20/2021
 '''
 
-import numpy.fft as npfft
+import recon.fft_provider as fftp
 import numpy as np
 
 from math import ceil, pi
@@ -211,13 +211,13 @@ def orc(M, kt, df):
         Off-resonance corrected image data
     '''
 
-    kspace = npfft.fftshift(npfft.fft2(M))
+    kspace = fftp.fftshift(fftp.fft2(M))
     M_hat = np.zeros(M.shape, dtype=complex)
     for x in range(M.shape[0]):
         for y in range(M.shape[1]):
             phi = 2 * pi * df[x, y] * kt
             kspace_orc = kspace * np.exp(1j * phi)
-            M_corr = npfft.ifft2(kspace_orc)
+            M_corr = fftp.ifft2(kspace_orc)
             M_hat[x, y] = M_corr[x, y]
 
     return M_hat
@@ -5,7 +5,7 @@ Methods to do k-space to image and image to k-space for both Cartesian and non-c
 \nLast updated: 10/07/2020
 '''
 
-import numpy.fft as npfft
+import recon.fft_provider as fftp
 import numpy as np
 import pynufft
 
@@ -33,7 +33,7 @@ def im2ksp(M, cartesian_opt, NufftObj=None, params=None):
 
     if cartesian_opt == 1:
 
-        kspace = npfft.fftshift(npfft.fft2(M))
+        kspace = fftp.fftshift(fftp.fft2(M))
     elif cartesian_opt == 0:
         # Sample phantom along ktraj
         if 'Npoints' not in params:
@@ -66,8 +66,8 @@ def ksp2im(ksp, cartesian_opt, NufftObj=None, params=None):
     '''
 
     if cartesian_opt == 1:
-        im = npfft.ifft2(npfft.fftshift(ksp))
-        #im = npfft.ifftshift(npfft.ifft2(ksp))
+        im = fftp.ifft2(fftp.fftshift(ksp))
+        #im = fftp.ifftshift(fftp.ifft2(ksp))
 
     elif cartesian_opt == 0:
 
@@ -9,11 +9,30 @@ from pydicom.uid import generate_uid
 from pydicom.uid import UID
 from pydicom.uid import ImplicitVRLittleEndian
 import datetime
-from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.dataset import Dataset, FileDataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from common.types import ResultItem
 from common.constants import *
 
 
+# Number of threads used for writing the DICOM files of a series
+DICOM_WRITE_WORKERS = 8
+
+ENHANCED_MR_IMAGE_STORAGE = UID("1.2.840.10008.5.1.4.1.1.4.1")
+
+# Tags that differ between the instances of a series. They are not stored in the template, so that the
+# elements of the template can be shared by all instances.
+INSTANCE_TAGS = [
+    "SOPInstanceUID",
+    "InstanceNumber",
+    "SliceLocation",
+    "WindowCenter",
+    "WindowWidth",
+    "PixelData",
+]
+
+
 def write_dicom(
     image_ndarray,
     task,
@@ -24,6 +43,7 @@ def write_dicom(
     primary_result=True,
     autoload_viewer=1,
     result_index=0,
+    multiframe=False,
 ):
     """
     Write DICOMS to a specified holder using information from the scan task
@@ -32,6 +52,7 @@ def write_dicom(
     image_ndarray: multi-dimensional (3D) reconstructed complex array
     task: scan task object with scan-specific information
     folder: location to save the DICOM data per slice
+    multiframe: write the series as a single multi-frame (Enhanced MR) file instead of one file per slice
     """
     ndarray_dims = image_ndarray.shape
     assert len(ndarray_dims) == 3  # Assumes 3D ndarray: H x W x Slices
@@ -40,36 +61,16 @@ def write_dicom(
     # Temporary trick to avoid series collision: multiply scan number by 100 and add offset for addition dicom series
     # TODO: Needs better solution to keep track of all DICOM series
     seriesNumber = task.scan_number * 100 + series_offset
+    series_prefix = "series" + str(seriesNumber).zfill(5) + "#"
 
-    instance_counter = 1
-    print(f"Writing {ndarray_dims[-1]} DICOMs")
-
-    val_max = np.max(np.abs(image_ndarray))
-
-    for slc_id in range(ndarray_dims[-1]):
-        # Generate magnitude image per slice
-        # Normalize the value range to avoid clipping (max 32k)
-        pixel_data = np.abs(image_ndarray[..., slc_id]) / val_max * 30000
-        pixel_data = np.uint16(pixel_data)
-
-        """ Create and populate the DICOM header """
-        dicom_dataset = set_dicom_header(
-            studyInstanceUID, seriesInstanceUID, instance_counter, task
-        )
-        dicom_dataset = set_image_information(dicom_dataset, pixel_data)
-        dicom_dataset = set_window_width_level(dicom_dataset, pixel_data)
-        dicom_dataset.PixelData = pixel_data.tobytes()
-        dicom_filename = (
-            "series"
-            + str(seriesNumber).zfill(5)
-            + "#"
-            + str(instance_counter).zfill(5)
-            + ".dcm"
-        )
-        dicom_dataset.file_meta.TransferSyntaxUID = ImplicitVRLittleEndian
-        dicom_file_path = os.path.join(folder, dicom_filename)
-        dicom_dataset.save_as(dicom_file_path)
-        instance_counter = instance_counter + 1
+    writer = DicomSeriesWriter(studyInstanceUID, seriesInstanceUID, task)
+    pixel_volume = writer.normalize(image_ndarray)
+    if multiframe:
+        print(f"Writing multi-frame DICOM with {ndarray_dims[-1]} frames")
+        writer.write_multiframe(pixel_volume, os.path.join(folder, series_prefix + "00001.dcm"))
+    else:
+        print(f"Writing {ndarray_dims[-1]} DICOMs")
+        writer.write_series(pixel_volume, folder, series_prefix)
 
     result = ResultItem()
     result.name = name
@@ -81,13 +82,129 @@ def write_dicom(
     result.type = "dicom"
     result.primary = primary_result
     result.autoload_viewer = autoload_viewer
-    result.file_path = (
-        mri4all_taskdata.DICOM + "/" + "series" + str(seriesNumber).zfill(5) + "#"
-    )
+    result.file_path = mri4all_taskdata.DICOM + "/" + series_prefix
     task.results.insert(result_index, result)
     return
 
 
+class DicomSeriesWriter:
+    """
+    Writes the slices of a volume as DICOM series. The header information that is shared by all slices
+    is created once as template, and only the instance-specific tags are set per slice.
+    """
+
+    def __init__(self, StudyInstanceUID, SeriesInstanceUID, task):
+        self.StudyInstanceUID = StudyInstanceUID
+        self.SeriesInstanceUID = SeriesInstanceUID
+        self.template = set_dicom_header(StudyInstanceUID, SeriesInstanceUID, 1, task)
+        for keyword in INSTANCE_TAGS:
+            if keyword in self.template:
+                delattr(self.template, keyword)
+        self.template.RescaleIntercept = 0
+        self.template.RescaleSlope = 1
+
+    @staticmethod
+    def normalize(image_ndarray):
+        """Converts the complex volume into magnitude images (uint16) in a single pass"""
+        val_max = np.max(np.abs(image_ndarray))
+        if val_max == 0:
+            val_max = 1
+        # Normalize the value range to avoid clipping (max 32k)
+        pixel_volume = np.abs(image_ndarray)
+        pixel_volume *= 30000 / val_max
+        return pixel_volume.astype(np.uint16)
+
+    @staticmethod
+    def window_width_level(pixel_volume):
+        """Calculates window center and width of all slices at once (same as set_window_width_level)"""
+        maxPixel = pixel_volume.max(axis=(0, 1)).astype(float)
+        minPixel = pixel_volume.min(axis=(0, 1)).astype(float)
+        midPixel = (maxPixel + minPixel) / 2
+        windowCenter = (midPixel + pixel_volume.mean(axis=(0, 1))) / 2
+        windowWidth = np.maximum(
+            np.round(windowCenter - minPixel), np.round(maxPixel - windowCenter)
+        )
+        return windowCenter, windowWidth
+
+    def create_instance(self, instance_num, filename=""):
+        """Creates the dataset of an instance, sharing the elements of the template"""
+        file_meta = FileMetaDataset()
+        SOPInstanceUID = UID(self.SeriesInstanceUID + "." + str(instance_num))
+        file_meta.MediaStorageSOPClassUID = self.StudyInstanceUID
+        file_meta.MediaStorageSOPInstanceUID = SOPInstanceUID
+        file_meta.ImplementationClassUID = UID("1.2.3.4")
+        file_meta.TransferSyntaxUID = ImplicitVRLittleEndian
+        dicom_dataset = FileDataset(
+            filename, {}, file_meta=file_meta, preamble=b"\0" * 128
+        )
+        dicom_dataset.update(self.template)
+        dicom_dataset.is_little_endian = True
+        dicom_dataset.is_implicit_VR = True
+        dicom_dataset.SOPInstanceUID = SOPInstanceUID
+        dicom_dataset.InstanceNumber = instance_num
+        return dicom_dataset
+
+    def write_series(self, pixel_volume, folder, series_prefix):
+        """Writes one file per slice. The files are written in parallel"""
+        windowCenter, windowWidth = self.window_width_level(pixel_volume)
+
+        def write_slice(slc_id):
+            instance_num = slc_id + 1
+            dicom_filename = series_prefix + str(instance_num).zfill(5) + ".dcm"
+            pixel_data = pixel_volume[..., slc_id]
+            dicom_dataset = self.create_instance(instance_num, dicom_filename)
+            dicom_dataset.SliceLocation = 0.0 + (instance_num * 0.5)
+            dicom_dataset = set_image_information(dicom_dataset, pixel_data)
+            dicom_dataset.WindowCenter = windowCenter[slc_id]
+            dicom_dataset.WindowWidth = windowWidth[slc_id]
+            dicom_dataset.PixelData = np.ascontiguousarray(pixel_data).tobytes()
+            dicom_dataset.save_as(os.path.join(folder, dicom_filename))
+
+        with ThreadPoolExecutor(max_workers=DICOM_WRITE_WORKERS) as executor:
+            # Consume the results to raise exceptions from the worker threads
+            list(executor.map(write_slice, range(pixel_volume.shape[-1])))
+
+    def write_multiframe(self, pixel_volume, file_path):
+        """Writes all slices as frames of a single Enhanced MR image"""
+        frames = pixel_volume.shape[-1]
+        windowCenter, windowWidth = self.window_width_level(pixel_volume)
+
+        dicom_dataset = self.create_instance(1, os.path.basename(file_path))
+        dicom_dataset.file_meta.MediaStorageSOPClassUID = ENHANCED_MR_IMAGE_STORAGE
+        dicom_dataset.SOPClassUID = ENHANCED_MR_IMAGE_STORAGE
+        dicom_dataset.NumberOfFrames = frames
+        dicom_dataset = set_image_information(dicom_dataset, pixel_volume[..., 0])
+
+        shared = Dataset()
+        pixel_measures = Dataset()
+        pixel_measures.PixelSpacing = self.template.PixelSpacing
+        pixel_measures.SliceThickness = self.template.SliceThickness
+        shared.PixelMeasuresSequence = Sequence([pixel_measures])
+        dicom_dataset.SharedFunctionalGroupsSequence = Sequence([shared])
+
+        per_frame = []
+        for slc_id in range(frames):
+            frame = Dataset()
+            position = Dataset()
+            position.ImagePositionPatient = self.template.ImagePosition
+            frame.PlanePositionSequence = Sequence([position])
+            voi = Dataset()
+            voi.WindowCenter = windowCenter[slc_id]
+            voi.WindowWidth = windowWidth[slc_id]
+            frame.FrameVOILUTSequence = Sequence([voi])
+            content = Dataset()
+            content.InStackPositionNumber = slc_id + 1
+            frame.FrameContentSequence = Sequence([content])
+            per_frame.append(frame)
+        dicom_dataset.PerFrameFunctionalGroupsSequence = Sequence(per_frame)
+
+        # Frames are stored one after the other (slices x rows x columns)
+        dicom_dataset.PixelData = np.ascontiguousarray(
+            np.moveaxis(pixel_volume, -1, 0)
+        ).tobytes()
+        dicom_dataset.save_as(file_path)
+
+
 def set_dicom_header(StudyInstanceUID, SeriesInstanceUID, instance_num, task):
     """
     Create a dicom dataset and populate dicom header fields per slice.
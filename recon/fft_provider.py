@@ -0,0 +1,232 @@
+"""
+Central FFT provider for the reconstruction. All reconstruction paths call the transforms defined here, so
+that the backend can be selected in one place:
+
+- numpy:  numpy.fft (single-threaded, always available, computes in double precision)
+- scipy:  scipy.fft with multiple worker threads (keeps complex64 precision, supports overwrite_x)
+- pyfftw: pyFFTW through its scipy.fft interface, with plan caching and optional wisdom file
+
+If the selected backend is not installed, the provider falls back to the next available backend.
+
+The centered transforms (fftshift(fft(ifftshift(x)))) avoid the copies of the shift operations for axes
+of even length: for even N, the shifts are equivalent to a modulation of the input and output with the
+checkerboard (-1)^n, which is applied in place.
+"""
+import os
+import pickle
+import multiprocessing
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+import common.logger as logger
+
+log = logger.get_logger()
+
+BACKENDS = ["numpy", "scipy", "pyfftw"]
+
+Axes = Optional[Union[int, Sequence[int]]]
+
+_backend = "numpy"
+_module = np.fft  # type: ignore
+_workers = 1
+
+
+def set_backend(backend: str = "scipy", workers: int = -1) -> str:
+    """
+    Selects the FFT backend and the number of threads (-1 = all cores). Returns the name of the backend
+    that is actually used.
+    """
+    global _backend, _module, _workers
+
+    if workers is None or workers < 1:
+        workers = multiprocessing.cpu_count()
+
+    if backend not in BACKENDS:
+        log.warning(f"Unknown FFT backend {backend}. Using scipy instead.")
+        backend = "scipy"
+
+    module = None
+    if backend == "pyfftw":
+        try:
+            import pyfftw  # type: ignore
+            import pyfftw.interfaces.scipy_fft as pyfftw_fft  # type: ignore
+
+            # Keep the FFTW plans of repeated transforms with the same shape
+            pyfftw.interfaces.cache.enable()
+            pyfftw.interfaces.cache.set_keepalive_time(60)
+            module = pyfftw_fft
+        except ImportError:
+            log.warning("pyFFTW not installed. Using scipy instead.")
+            backend = "scipy"
+
+    if backend == "scipy":
+        try:
+            import scipy.fft as scipy_fft
+
+            module = scipy_fft
+        except ImportError:
+            log.warning("scipy.fft not available. Using numpy instead.")
+            backend = "numpy"
+
+    if backend == "numpy":
+        module = np.fft
+        workers = 1
+
+    _backend = backend
+    _module = module
+    _workers = workers
+    return _backend
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def get_workers() -> int:
+    return _workers
+
+
+def load_wisdom(file_path: str) -> bool:
+    """Loads previously collected FFTW wisdom, so that plans do not need to be measured again."""
+    if _backend != "pyfftw" or not os.path.isfile(file_path):
+        return False
+    try:
+        import pyfftw  # type: ignore
+
+        with open(file_path, "rb") as file:
+            pyfftw.import_wisdom(pickle.load(file))
+        return True
+    except Exception as e:
+        log.warning(f"Unable to load FFTW wisdom from {file_path}: {e}")
+        return False
+
+
+def save_wisdom(file_path: str) -> bool:
+    if _backend != "pyfftw":
+        return False
+    try:
+        import pyfftw  # type: ignore
+
+        with open(file_path, "wb") as file:
+            pickle.dump(pyfftw.export_wisdom(), file)
+        return True
+    except Exception as e:
+        log.warning(f"Unable to store FFTW wisdom in {file_path}: {e}")
+        return False
+
+
+def _transform(name: str, x, s=None, axes: Axes = None, norm=None, overwrite_x=False):
+    if _backend == "numpy":
+        return getattr(_module, name)(x, s, axes, norm=norm)
+    return getattr(_module, name)(
+        x, s, axes, norm=norm, overwrite_x=overwrite_x, workers=_workers
+    )
+
+
+def fftn(x, s=None, axes: Axes = None, norm=None, overwrite_x=False) -> np.ndarray:
+    return _transform("fftn", x, s, axes, norm, overwrite_x)
+
+
+def ifftn(x, s=None, axes: Axes = None, norm=None, overwrite_x=False) -> np.ndarray:
+    return _transform("ifftn", x, s, axes, norm, overwrite_x)
+
+
+def fft2(x, s=None, axes: Axes = (-2, -1), norm=None, overwrite_x=False) -> np.ndarray:
+    return _transform("fft2", x, s, axes, norm, overwrite_x)
+
+
+def ifft2(x, s=None, axes: Axes = (-2, -1), norm=None, overwrite_x=False) -> np.ndarray:
+    return _transform("ifft2", x, s, axes, norm, overwrite_x)
+
+
+def fft(x, n=None, axis: int = -1, norm=None, overwrite_x=False) -> np.ndarray:
+    return _transform("fft", x, n, axis, norm, overwrite_x)
+
+
+def ifft(x, n=None, axis: int = -1, norm=None, overwrite_x=False) -> np.ndarray:
+    return _transform("ifft", x, n, axis, norm, overwrite_x)
+
+
+fftshift = np.fft.fftshift
+ifftshift = np.fft.ifftshift
+
+
+def _normalize_axes(ndim: int, axes: Axes) -> Sequence[int]:
+    if axes is None:
+        return list(range(ndim))
+    if isinstance(axes, int):
+        axes = [axes]
+    return [axis % ndim for axis in axes]
+
+
+def _checkerboard(shape, axes: Sequence[int], dtype) -> np.ndarray:
+    """Returns the broadcastable modulation (-1)^(n_0 + n_1 + ...) over the given axes."""
+    modulation = np.ones([1] * len(shape), dtype=dtype)
+    for axis in axes:
+        sign_shape = [1] * len(shape)
+        sign_shape[axis] = shape[axis]
+        signs = 1 - 2 * (np.arange(shape[axis]) % 2)
+        modulation = modulation * signs.reshape(sign_shape).astype(dtype)
+    return modulation
+
+
+def _centered(
+    inverse: bool,
+    x,
+    axes: Axes,
+    norm,
+    overwrite_x: bool,
+    input_shift: str,
+) -> np.ndarray:
+    x = np.asarray(x)
+    if not np.iscomplexobj(x):
+        x = x.astype(complex)
+        overwrite_x = True
+    axes = _normalize_axes(x.ndim, axes)
+    transform = ifftn if inverse else fftn
+
+    even_axes = [axis for axis in axes if x.shape[axis] % 2 == 0]
+    odd_axes = [axis for axis in axes if x.shape[axis] % 2 == 1]
+
+    # Axes of odd length require the actual shift operations
+    if odd_axes:
+        shift = fftshift if input_shift == "fftshift" else ifftshift
+        x = shift(x, axes=odd_axes)
+        overwrite_x = True
+
+    if even_axes:
+        modulation = _checkerboard(x.shape, even_axes, x.dtype)
+        if overwrite_x:
+            x *= modulation
+        else:
+            x = x * modulation
+        overwrite_x = True
+
+    y = transform(x, axes=axes, norm=norm, overwrite_x=overwrite_x)
+
+    if even_axes:
+        # Global sign (-1)^(N/2) of each axis
+        sign = (-1) ** sum(x.shape[axis] // 2 for axis in even_axes)
+        y *= modulation if sign > 0 else -modulation
+    if odd_axes:
+        y = fftshift(y, axes=odd_axes)
+    return y
+
+
+def centered_fftn(
+    x, axes: Axes = None, norm=None, overwrite_x=False, input_shift="ifftshift"
+) -> np.ndarray:
+    """
+    Returns fftshift(fftn(ifftshift(x))) over the given axes. Use input_shift="fftshift" for
+    fftshift(fftn(fftshift(x))) (only differs for axes of odd length). If overwrite_x is set, the input
+    array is used as work space.
+    """
+    return _centered(False, x, axes, norm, overwrite_x, input_shift)
+
+
+def centered_ifftn(
+    x, axes: Axes = None, norm=None, overwrite_x=False, input_shift="ifftshift"
+) -> np.ndarray:
+    """Returns fftshift(ifftn(ifftshift(x))) over the given axes (see centered_fftn)."""
+    return _centered(True, x, axes, norm, overwrite_x, input_shift)
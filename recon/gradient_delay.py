@@ -1,4 +1,5 @@
 import numpy as np
+import recon.fft_provider as fftp
 
 def grad_delay_correction(kData, kTraj, delayT, etLength, BW, ESP):
     ## JChen
@@ -25,6 +26,6 @@ def grad_delay_correction(kData, kTraj, delayT, etLength, BW, ESP):
 
         tmp = kData[:,kTraj[idx_trj,0], kTraj[idx_trj,1]]
         kData[:,kTraj[idx_trj,0], kTraj[idx_trj,1]] \
-        = np.fft.fft(np.fft.ifft(tmp, axis=0) *  np.fft.fftshift(np.exp(-1j * phi)[:,None], axes=0), axis=0)
+        = fftp.fft(fftp.ifft(tmp, axis=0) *  fftp.fftshift(np.exp(-1j * phi)[:,None], axes=0), axis=0)
         
     return kData
\ No newline at end of file
@@ -1,5 +1,8 @@
 import common.logger as logger
+import multiprocessing
+import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from scipy.ndimage import gaussian_filter
 from skimage.restoration import (
     denoise_nl_means,
@@ -11,6 +14,13 @@ log = logger.get_logger()
 
 MAX_DENOISE_STRENGTH = 9
 
+# Number of processes used by denoise_volume_complex (None = number of CPUs)
+DENOISE_WORKERS = None
+# Number of slices of the slabs that are processed in parallel
+DENOISE_SLAB_SLICES = 8
+# Number of context slices added on both sides of a slab for the global TV method
+DENOISE_TV_HALO = 4
+
 def apply_bilateral_denoise(image, sigma_color=0.05, sigma_spatial=15, channel_axis=-1):
     """
     Applies bilateral denoising to the input image.
@@ -119,32 +129,43 @@ def remove_gaussian_noise(image, sigma=0.2):
     return image_gaussian
 
 
-def _apply_filter(real_part, imag_part, method, strength):
+def get_filter_parameters(method, strength):
+    """
+    Returns the parameters of the denoising method for the given strength (0 to MAX_DENOISE_STRENGTH).
+    """
     # Normalize strength to be between 0 and 1
     normalized_strength = strength / MAX_DENOISE_STRENGTH
 
+    if method == "gaussian_filter":
+        return {"sigma": normalized_strength * 0.5}
+    elif method == "bilateral":
+        return {
+            "sigma_color": normalized_strength * 0.05,
+            "sigma_spatial": normalized_strength * 15,
+        }
+    elif method == "nl_means":
+        return {"h": normalized_strength * 0.1}
+    elif method == "total_variation":
+        return {"weight": normalized_strength * 0.1}
+    return None
+
+
+def _apply_filter(real_part, imag_part, method, strength):
+    parameters = get_filter_parameters(method, strength)
+
     # Apply the filter to the real and imaginary parts separately
     if method == "gaussian_filter":
-        sigma = normalized_strength * 0.5
-        real_part_denoised = remove_gaussian_noise(real_part, sigma=sigma)
-        imag_part_denoised = remove_gaussian_noise(imag_part, sigma=sigma)
+        real_part_denoised = remove_gaussian_noise(real_part, **parameters)
+        imag_part_denoised = remove_gaussian_noise(imag_part, **parameters)
     elif method == "bilateral":
-        sigma_color = normalized_strength * 0.05
-        sigma_spatial = normalized_strength * 15
-        real_part_denoised = apply_bilateral_denoise(
-            real_part, sigma_color=sigma_color, sigma_spatial=sigma_spatial
-        )
-        imag_part_denoised = apply_bilateral_denoise(
-            imag_part, sigma_color=sigma_color, sigma_spatial=sigma_spatial
-        )
+        real_part_denoised = apply_bilateral_denoise(real_part, **parameters)
+        imag_part_denoised = apply_bilateral_denoise(imag_part, **parameters)
     elif method == "nl_means":
-        h = normalized_strength * 0.1
-        real_part_denoised = apply_nl_means_denoise(real_part, h=h)
-        imag_part_denoised = apply_nl_means_denoise(imag_part, h=h)
+        real_part_denoised = apply_nl_means_denoise(real_part, **parameters)
+        imag_part_denoised = apply_nl_means_denoise(imag_part, **parameters)
     elif method == "total_variation":
-        weight = normalized_strength * 0.1
-        real_part_denoised = apply_total_variation_denoise(real_part, weight=weight)
-        imag_part_denoised = apply_total_variation_denoise(imag_part, weight=weight)
+        real_part_denoised = apply_total_variation_denoise(real_part, **parameters)
+        imag_part_denoised = apply_total_variation_denoise(imag_part, **parameters)
     else:
         real_part_denoised = real_part
         imag_part_denoised = imag_part
@@ -185,3 +206,166 @@ def remove_gaussian_noise_complex(image_complex, method="gaussian_filter", stren
     image_denoised_complex = real_part_denoised + 1j * imag_part_denoised
 
     return image_denoised_complex
+
+
+def _get_halo(method, parameters):
+    """Number of context slices needed on each side of a slab"""
+    if method == "gaussian_filter":
+        # Radius of the Gaussian kernel (scipy truncates at 4 sigma)
+        return int(4 * parameters["sigma"] + 0.5)
+    elif method == "nl_means":
+        # Radius of the patches plus the search distance of skimage's defaults
+        return 5 // 2 + 3
+    elif method == "total_variation":
+        return DENOISE_TV_HALO
+    # The bilateral filter is applied to every slice separately
+    return 0
+
+
+def _denoise_slab(slab, method, parameters):
+    """Denoises a real-valued slab (x, y, slices) in a worker process"""
+    if slab.ndim == 3 and slab.shape[-1] == 1:
+        # Single slices are processed as 2D images
+        return _denoise_slab(slab[..., 0], method, parameters)[..., np.newaxis]
+
+    if method == "gaussian_filter":
+        return gaussian_filter(slab, **parameters)
+    elif method == "bilateral":
+        if slab.ndim == 2:
+            return denoise_bilateral(slab, channel_axis=None, **parameters)
+        denoised = np.empty_like(slab)
+        for i in range(slab.shape[-1]):
+            denoised[..., i] = denoise_bilateral(
+                slab[..., i], channel_axis=None, **parameters
+            )
+        return denoised
+    elif method == "nl_means":
+        return denoise_nl_means(
+            slab, patch_size=5, patch_distance=3, channel_axis=None, **parameters
+        )
+    elif method == "total_variation":
+        return denoise_tv_chambolle(slab, channel_axis=None, **parameters)
+    return slab
+
+
+def _get_slabs(slices, slab_slices, overlap, extension):
+    """
+    Splits the slice axis into slabs of at least slab_slices and 2 * overlap slices. Returns tuples
+    (start, stop, core_start, core_stop) with the range of the slab including the context slices,
+    and the range of slices that is assigned to the slab.
+    """
+    count = max(1, slices // max(slab_slices, 2 * overlap, 1))
+    bounds = np.linspace(0, slices, count + 1).round().astype(int)
+    return [
+        (max(0, a - extension), min(slices, b + extension), a, b)
+        for a, b in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def _get_blend_weights(slices, start, stop, core_start, core_stop, overlap):
+    """
+    Weights of a slab along the slice axis. Neighboring slabs are blended linearly over overlap
+    slices on both sides of the boundary between them, so that the weights sum to 1.
+    """
+    weights = np.zeros(stop - start, dtype=np.float32)
+    weights[core_start - start : core_stop - start] = 1
+    if overlap > 0:
+        ramp = (np.arange(2 * overlap, dtype=np.float32) + 0.5) / (2 * overlap)
+        if core_start > 0:
+            begin = core_start - overlap - start
+            weights[begin : begin + 2 * overlap] = ramp
+        if core_stop < slices:
+            begin = core_stop - overlap - start
+            weights[begin : begin + 2 * overlap] = ramp[::-1]
+    return weights
+
+
+def denoise_volume_complex(
+    image_complex,
+    method="gaussian_filter",
+    strength=5,
+    workers=None,
+    slab_slices=None,
+    dtype=np.float32,
+):
+    """
+    Removes noise from the real and imaginary parts of a complex image, separately. Same methods
+    and strength as remove_gaussian_noise_complex, but 3D volumes (x, y, slices) are treated as
+    volumes: the Gaussian, NL-means and TV filters operate in 3D, and the bilateral filter is
+    applied slice by slice.
+
+    The volume is split into slabs along the slice axis, which are processed in a process pool.
+    Each slab is extended by context slices (halo), and the overlapping parts of neighboring slabs
+    are blended. All calculations are done with the given floating point type.
+
+    Parameters:
+    image_complex (numpy.ndarray): A complex 2D or 3D input image from which noise is to be removed.
+    method (str, optional): 'gaussian_filter', 'bilateral', 'nl_means', or 'total_variation'.
+    strength (int, optional): The strength of the denoising, from 0 to MAX_DENOISE_STRENGTH.
+    workers (int, optional): Number of worker processes. Default is DENOISE_WORKERS.
+    slab_slices (int, optional): Number of slices per slab. Default is DENOISE_SLAB_SLICES.
+    dtype (numpy.dtype, optional): Floating point type used for the calculation. Default is float32.
+
+    Returns:
+    numpy.ndarray: The denoised complex image.
+    """
+    if not np.iscomplexobj(image_complex):
+        log.error("The input image must be a complex ndarray.")
+        raise ValueError("The input image must be a complex ndarray.")
+
+    complex_dtype = np.result_type(dtype, np.complex64)
+    parameters = get_filter_parameters(method, strength)
+    if parameters is None:
+        log.error(f"Method {method} not recognized.")
+        return image_complex.astype(complex_dtype)
+    if strength <= 0:
+        log.info("Denoising strength is 0. Skipping denoising.")
+        return image_complex.astype(complex_dtype)
+
+    is_2d = image_complex.ndim == 2
+    volume = image_complex[..., np.newaxis] if is_2d else image_complex
+    slices = volume.shape[-1]
+
+    # Slices close to the slab boundaries are blended. Beyond the blended slices, the slabs
+    # are extended by the halo to provide the context needed by the filter
+    if workers is None:
+        workers = DENOISE_WORKERS or os.cpu_count() or 1
+    halo = _get_halo(method, parameters)
+    overlap = halo // 2
+    # Without parallel processing, the volume is processed as single slab to avoid the halo
+    slab_slices = (slab_slices or DENOISE_SLAB_SLICES) if workers > 1 else slices
+    slabs = _get_slabs(slices, slab_slices, overlap, halo + overlap)
+    parts = [np.real(volume).astype(dtype), np.imag(volume).astype(dtype)]
+
+    log.info(
+        f"Denoising volume {volume.shape} with {method} (strength={strength}) "
+        + f"in {len(slabs)} slabs"
+    )
+    tasks = [(part, slab) for part in range(2) for slab in slabs]
+    arguments = [
+        (parts[part][..., start:stop], method, parameters)
+        for part, (start, stop, _, _) in tasks
+    ]
+
+    workers = min(workers, len(tasks))
+    if workers > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            results = list(executor.map(_denoise_slab, *zip(*arguments)))
+    else:
+        results = [_denoise_slab(*args) for args in arguments]
+
+    denoised = [np.zeros(volume.shape, dtype=dtype) for _ in range(2)]
+    for (part, (start, stop, core_start, core_stop)), result in zip(tasks, results):
+        weights = _get_blend_weights(
+            slices, start, stop, core_start, core_stop, overlap
+        )
+        denoised[part][..., start:stop] += result.astype(dtype, copy=False) * weights
+
+    image_denoised_complex = np.empty(volume.shape, dtype=complex_dtype)
+    image_denoised_complex.real = denoised[0]
+    image_denoised_complex.imag = denoised[1]
+    if is_2d:
+        image_denoised_complex = image_denoised_complex[..., 0]
+    return image_denoised_complex
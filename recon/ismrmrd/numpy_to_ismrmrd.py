@@ -1,76 +1,75 @@
 # coding: utf-8
 import ismrmrd
 import ismrmrd.xsd
+import ismrmrd.hdf5
 import numpy as np
 import argparse
 import json
 import os
+from typing import Optional, Tuple
+
+import common.logger as logger
+from recon.recon_utils.kspace_scatter import get_encoding_indices
+
+log = logger.get_logger()
 
 #json_file = "/opt/mri4all/data/acq_queue/e05a03dc-6f73-11ee-b9cb-4be9ddc04f52#scan_1/scan.json"
 
-def create_ismrmrd(folder, raw_data, task):
-    # Opening JSON file
-    #f = open(json_file)
-    data = task
-    ##?############# Following block of code will get replaced by whatever numpy is given to us ##?###############?###############?###############?###############?###############?#############
-    repetitions = 1 #! check
-    coils = 1 #! check
-    acceleration = 1 #! check
-    ##?###############?###############?###############?###############?###############?###############?############# ##?###############?###############?###########?###############?###############?#################
-    # The number of points in x,y,kx,ky
-    nx, ny, nz = raw_data.shape[0], raw_data.shape[1], raw_data.shape[2]
-    nkx, nky, nkz = raw_data.shape[0], raw_data.shape[1], raw_data.shape[2]
-
-    # Open the dataset (creation mode)
-    filename_to_save = os.path.join(folder, "ismrmrd_file.h5")
-    dset = ismrmrd.Dataset(filename_to_save, "dataset", create_if_needed=True)
-
-    # Create the XML header and write it to the file (creation mode)
+ISMRMRD_FILENAME = "ismrmrd_file.h5"
+
+
+def create_ismrmrd_header(task, matrix: Tuple[int, int, int], coils: int = 1, repetitions: int = 1) -> str:
+    '''
+    Creates the XML header for k-space data with the given matrix size (readout x pe x slc).
+    '''
+    nx, ny, nz = matrix
+
+    # Create the XML header
     header = ismrmrd.xsd.ismrmrdHeader()
 
     # Experimental Conditions
-    exp = ismrmrd.xsd.experimentalConditionsType() 
+    exp = ismrmrd.xsd.experimentalConditionsType()
     magneticFieldStrength = 0.048
-    exp.H1resonanceFrequency_Hz = magneticFieldStrength*(42.57e+06) 
+    exp.H1resonanceFrequency_Hz = magneticFieldStrength*(42.57e+06)
 
     header.experimentalConditions = exp
 
     # Acquisition System Information
     sys = ismrmrd.xsd.acquisitionSystemInformationType()
-    sys.receiverChannels = 1 #! assuming single coil
+    sys.receiverChannels = coils
     header.acquisitionSystemInformation = sys
 
 
     # Encoding
-    encoding = ismrmrd.xsd.encodingType()  
+    encoding = ismrmrd.xsd.encodingType()
     #encoding.trajectory = ismrmrd.xsd.trajectoryType.CARTESIAN
-    encoding.trajectory =ismrmrd.xsd.trajectoryType[data.processing.trajectory.upper()]
+    encoding.trajectory =ismrmrd.xsd.trajectoryType[task.processing.trajectory.upper()]
 
     # encoded and recon spaces
-    efov = ismrmrd.xsd.fieldOfViewMm() 
+    efov = ismrmrd.xsd.fieldOfViewMm()
     #efov.x = oversampling*256 #! needed field
     #efov.y = 256 #! needed field
     #efov.z = 5   #! needed field
-    efov.x = raw_data.shape[0]
-    efov.y = raw_data.shape[1]
-    efov.z = raw_data.shape[2]
+    efov.x = nx
+    efov.y = ny
+    efov.z = nz
 
-    rfov = ismrmrd.xsd.fieldOfViewMm() 
-    rfov.x = raw_data.shape[0]
-    rfov.y = raw_data.shape[1]
-    rfov.z = raw_data.shape[2]
+    rfov = ismrmrd.xsd.fieldOfViewMm()
+    rfov.x = nx
+    rfov.y = ny
+    rfov.z = nz
 
     ematrix = ismrmrd.xsd.matrixSizeType()
     rmatrix = ismrmrd.xsd.matrixSizeType()
 
-    ematrix.x = raw_data.shape[0]
-    ematrix.y = raw_data.shape[1]
-    ematrix.z = raw_data.shape[2]
-    rmatrix.x = raw_data.shape[0]
-    rmatrix.y = raw_data.shape[1]
-    rmatrix.z = raw_data.shape[2]
+    ematrix.x = nx
+    ematrix.y = ny
+    ematrix.z = nz
+    rmatrix.x = nx
+    rmatrix.y = ny
+    rmatrix.z = nz
 
-    espace = ismrmrd.xsd.encodingSpaceType() 
+    espace = ismrmrd.xsd.encodingSpaceType()
     espace.matrixSize = ematrix
     espace.fieldOfView_mm = efov
     rspace = ismrmrd.xsd.encodingSpaceType()
@@ -89,6 +88,12 @@ def create_ismrmrd(folder, raw_data, task):
     limits1.maximum = ny - 1
     limits.kspace_encoding_step_1 = limits1
 
+    limits2 = ismrmrd.xsd.limitType()
+    limits2.minimum = 0
+    limits2.center = round(nz/2)
+    limits2.maximum = nz - 1
+    limits.kspace_encoding_step_2 = limits2
+
     limits_rep = ismrmrd.xsd.limitType()
     limits_rep.minimum = 0
     limits_rep.center = round(repetitions / 2)
@@ -100,10 +105,9 @@ def create_ismrmrd(folder, raw_data, task):
     limits_rest.center = 0
     limits_rest.maximum = 0
     limits.kspace_encoding_step_0 = limits_rest
-    limits.slice = limits_rest    
+    limits.slice = limits_rest
     limits.average = limits_rest
     limits.contrast = limits_rest
-    limits.kspaceEncodingStep2 = limits_rest
     limits.phase = limits_rest
     limits.segment = limits_rest
     limits.set = limits_rest
@@ -111,52 +115,159 @@ def create_ismrmrd(folder, raw_data, task):
     encoding.encodingLimits = limits
     header.encoding.append(encoding)
 
-    dset.write_xml_header(header.toXML('utf-8'))           
-
-    # Synthesize the k-space data
-    #Ktrue = transform_image_to_kspace(coil_images,(1,2))
-    Ktrue = raw_data[np.newaxis,np.newaxis,...]
-
-    # Create an acquistion and reuse it
-    acq = ismrmrd.Acquisition()
-    acq.resize(nkx, coils)
-    acq.version = 1
-    acq.available_channels = coils
-    acq.center_sample = round(nkx/2)
-    acq.read_dir[0] = 1.0
-    acq.phase_dir[1] = 1.0
-    acq.slice_dir[2] = 1.0
-
-
-    # Initialize an acquisition counter
-    counter = 0
-
-    # Loop over the repetitions, add noise and write to disk
-    # simulating a T-SENSE type scan
-    for rep in range(repetitions):
-        K = Ktrue  
-        acq.idx.repetition = rep
-        for slice_num in range(nz):
-            acq.idx.slice += 1
-            for acc in range(acceleration):
-                for line in np.arange(acc,nky,acceleration):
-                    # set some fields in the header
-                    acq.scan_counter = counter
-                    acq.idx.kspace_encode_step_1 = line
-                    acq.clearAllFlags()
-                    if line == 0:
-                            acq.setFlag(ismrmrd.ACQ_FIRST_IN_ENCODE_STEP1)
-                            acq.setFlag(ismrmrd.ACQ_FIRST_IN_SLICE)
-                            acq.setFlag(ismrmrd.ACQ_FIRST_IN_REPETITION)
-                    elif line == nky - 1:
-                            acq.setFlag(ismrmrd.ACQ_LAST_IN_ENCODE_STEP1)
-                            acq.setFlag(ismrmrd.ACQ_LAST_IN_SLICE)
-                            acq.setFlag(ismrmrd.ACQ_LAST_IN_REPETITION)
-                    # set the data and append
-                    acq.data[:] = K[rep,acc,:,line,slice_num]
-                    dset.append_acquisition(acq)
-                    counter += 1
-
-    # Clean up
-    dset.close()
-    print("ISMRMRD file created")
\ No newline at end of file
+    return header.toXML('utf-8')
+
+
+class ISMRMRDWriter:
+    '''
+    Writes readouts into an ISMRMRD file as they become available (e.g., while the scan is running).
+    The file and XML header are created when the writer is opened, and each call of append() writes a
+    chunk of readouts with a single resize and write of the HDF5 dataset, instead of one
+    ismrmrd.Acquisition per readout.
+
+    The encoding counters are taken from the pe_order table (pe, slc relative to the k-space center,
+    one row per readout), using the same k-space layout as the reconstruction. Without pe_order, the
+    readouts are expected line by line and partition by partition. Repetitions (or averages) are
+    acquired one after the other, each with all readouts of the pe_order table. Each readout contains
+    the samples of all coils. If the writer is closed before all readouts have been appended, or if
+    it is discarded, the file is removed, so that no incomplete file is left behind.
+    '''
+    def __init__(self, file_path: str, task, matrix: Tuple[int, int, int], coils: int = 1,
+                 repetitions: int = 1, pe_order: Optional[np.ndarray] = None):
+        self.file_path = file_path
+        self.matrix = tuple(int(n) for n in matrix)
+        self.coils = coils
+        nx, ny, nz = self.matrix
+
+        if pe_order is not None:
+            self.step_1, self.step_2 = get_encoding_indices(pe_order, self.matrix)
+        else:
+            lines = np.arange(ny * nz)
+            self.step_1, self.step_2 = lines % ny, lines // ny
+        self.lines = len(self.step_1)
+        self.readouts = self.lines * repetitions
+        self.position = 0
+        self.closed = False
+
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        self.dset = ismrmrd.Dataset(file_path, "dataset", create_if_needed=True)
+        self.dset.write_xml_header(create_ismrmrd_header(task, self.matrix, coils, repetitions))
+        self.data = self.dset._dataset.create_dataset(
+            "data", (0,), maxshape=(None,), dtype=ismrmrd.hdf5.acquisition_dtype
+        )
+
+    def _create_headers(self, start: int, stop: int) -> np.ndarray:
+        count = stop - start
+        scan_counter = np.arange(start, stop)
+        line, repetition = scan_counter % self.lines, scan_counter // self.lines
+        head = np.zeros(count, dtype=ismrmrd.hdf5.acquisition_header_dtype)
+        head['version'] = 1
+        head['scan_counter'] = scan_counter
+        head['number_of_samples'] = self.matrix[0]
+        head['available_channels'] = self.coils
+        head['active_channels'] = self.coils
+        head['channel_mask'][:, 0] = (1 << self.coils) - 1
+        head['center_sample'] = round(self.matrix[0] / 2)
+        head['read_dir'][:, 0] = 1.0
+        head['phase_dir'][:, 1] = 1.0
+        head['slice_dir'][:, 2] = 1.0
+        head['idx']['kspace_encode_step_1'] = self.step_1[line]
+        head['idx']['kspace_encode_step_2'] = self.step_2[line]
+        head['idx']['repetition'] = repetition
+
+        first_flags = (ismrmrd.ACQ_FIRST_IN_ENCODE_STEP1, ismrmrd.ACQ_FIRST_IN_ENCODE_STEP2,
+                       ismrmrd.ACQ_FIRST_IN_SLICE, ismrmrd.ACQ_FIRST_IN_REPETITION)
+        last_flags = (ismrmrd.ACQ_LAST_IN_ENCODE_STEP1, ismrmrd.ACQ_LAST_IN_ENCODE_STEP2,
+                      ismrmrd.ACQ_LAST_IN_SLICE, ismrmrd.ACQ_LAST_IN_REPETITION)
+        to_mask = lambda flags: np.uint64(sum(1 << (flag - 1) for flag in flags))
+        head['flags'][line == 0] |= to_mask(first_flags)
+        head['flags'][line == self.lines - 1] |= to_mask(last_flags)
+        head['flags'][scan_counter == self.readouts - 1] |= to_mask([ismrmrd.ACQ_LAST_IN_MEASUREMENT])
+        return head
+
+    def append(self, readouts: np.ndarray) -> int:
+        '''
+        Appends a chunk of readouts (readouts x samples, or readouts x coils x samples). Returns the
+        number of readouts written so far.
+        '''
+        readouts = np.asarray(readouts, dtype=np.complex64).reshape(-1, self.coils * self.matrix[0])
+        start = self.position
+        stop = start + readouts.shape[0]
+        if stop > self.readouts:
+            raise ValueError(f'Too many readouts for ISMRMRD file ({stop} > {self.readouts})')
+
+        acquisitions = np.zeros(stop - start, dtype=ismrmrd.hdf5.acquisition_dtype)
+        acquisitions['head'] = self._create_headers(start, stop)
+        samples = readouts.view(np.float32)
+        empty_traj = np.zeros(0, dtype=np.float32)
+        for i in range(stop - start):
+            acquisitions[i]['data'] = samples[i]
+            acquisitions[i]['traj'] = empty_traj
+
+        self.data.resize(stop, axis=0)
+        self.data[start:stop] = acquisitions
+        self.position = stop
+        return self.position
+
+    def is_complete(self) -> bool:
+        return self.position == self.readouts
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if not self.is_complete():
+            log.warning(f'ISMRMRD file closed with {self.position} of {self.readouts} readouts. Removing file.')
+            self.discard()
+            return
+        self.dset.close()
+        self.closed = True
+
+    def discard(self) -> None:
+        '''
+        Closes and removes the file (e.g., after an error while appending readouts).
+        '''
+        if not self.closed:
+            self.dset.close()
+            self.closed = True
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+
+def is_complete_ismrmrd(file_path: str) -> bool:
+    '''
+    Checks if the ISMRMRD file exists and contains all readouts of the measurement (i.e., the last
+    acquisition is flagged as last in measurement).
+    '''
+    if not os.path.exists(file_path):
+        return False
+    try:
+        dset = ismrmrd.Dataset(file_path, "dataset", create_if_needed=False)
+        try:
+            count = dset.number_of_acquisitions()
+            return count > 0 and dset.read_acquisition(count - 1).is_flag_set(ismrmrd.ACQ_LAST_IN_MEASUREMENT)
+        finally:
+            dset.close()
+    except Exception as e:
+        log.warning(f'Unable to read ISMRMRD file {file_path}: {e}')
+        return False
+
+
+def create_ismrmrd(folder, raw_data, task):
+    '''
+    Writes the k-space data (readout x pe x slc, optionally x coils x repetitions) into an ISMRMRD file
+    in the given folder, using a single bulk write of all readouts.
+    '''
+    # Add the coil and repetition dimensions if missing
+    raw_data = raw_data.reshape(raw_data.shape + (1,) * (5 - raw_data.ndim))
+    nkx, nky, nkz, coils, repetitions = raw_data.shape
+
+    # Readouts ordered line by line, partition by partition and repetition by repetition, each with
+    # the samples of all coils
+    readouts = np.transpose(raw_data, (4, 2, 1, 3, 0)).reshape(repetitions * nkz * nky, coils * nkx)
+
+    writer = ISMRMRDWriter(os.path.join(folder, ISMRMRD_FILENAME), task, (nkx, nky, nkz), coils,
+                           repetitions)
+    writer.append(readouts)
+    writer.close()
+    log.info('ISMRMRD file created')
@@ -2,7 +2,7 @@
 Helpers for transforming data from k-space to image space and vice-versa.
 """
 import numpy as np
-from numpy.fft import fftshift, ifftshift, fftn, ifftn
+from recon.fft_provider import fftshift, ifftshift, fftn, ifftn, centered_ifftn, centered_fftn
 
 def transform_kspace_to_image(k, dim=None, img_shape=None):
     """ Computes the Fourier transform from k-space to image space
@@ -16,7 +16,11 @@ def transform_kspace_to_image(k, dim=None, img_shape=None):
     if not dim:
         dim = range(k.ndim)
 
-    img = fftshift(ifftn(ifftshift(k, axes=dim), s=img_shape, axes=dim), axes=dim)
+    if img_shape is None:
+        # Shifts are fused into the transform if no resizing is needed
+        img = centered_ifftn(k, axes=list(dim))
+    else:
+        img = fftshift(ifftn(ifftshift(k, axes=dim), s=img_shape, axes=dim), axes=dim)
     img *= np.sqrt(np.prod(np.take(img.shape, dim)))
     return img
 
@@ -33,6 +37,9 @@ def transform_image_to_kspace(img, dim=None, k_shape=None):
     if not dim:
         dim = range(img.ndim)
 
-    k = fftshift(fftn(ifftshift(img, axes=dim), s=k_shape, axes=dim), axes=dim)
+    if k_shape is None:
+        k = centered_fftn(img, axes=list(dim))
+    else:
+        k = fftshift(fftn(ifftshift(img, axes=dim), s=k_shape, axes=dim), axes=dim)
     k /= np.sqrt(np.prod(np.take(img.shape, dim)))
     return k
@@ -1,4 +1,8 @@
 import numpy as np
+from functools import lru_cache
+
+# Number of filter masks kept in memory (masks are reused for scans with the same matrix and filter)
+MASK_CACHE_SIZE = 16
 
 def kspace_center_correction(kspace):
     '''
@@ -40,36 +44,75 @@ def kFilter(kspace, filter_type='fermi', center_correction=True, **kwargs):
         if 3D kspace data, we can adjust z_type, which could be 'same', 'fermi' and 'isotropic'.
             if z_type is 'fermi', we can further adjust radius_z (default 0.9) and width_z (default 0.1). Range from 0 to 1.
         if return_mask is True, return both filtered kspace and filter mask. Default is False
+        if in_place is True, the input k-space is filtered in place (if no center correction is done). Default is False
     
     Returns:
     - ndarray: The filtered k-space data with shape (x), (x, y) or (x, y, z).
-    - ndarray (optional): The filter mask, only if return_mask is True.
+    - ndarray (optional): The filter mask (read-only), only if return_mask is True.
     '''
     # Set default value if not specified
     z_type = kwargs.get('z_type', 'fermi')
     return_mask = kwargs.get('return_mask', False)
+    in_place = kwargs.get('in_place', False)
     width_z = kwargs.get('width_z', 0.1)
     radius_z = kwargs.get('radius_z', 0.9)
+    kspace = np.asarray(kspace)
+    # Masks are created in the precision of the k-space data (float32 for complex64)
+    dtype = np.finfo(kspace.dtype).dtype if np.issubdtype(kspace.dtype, np.inexact) else np.float64
     if filter_type == 'fermi':
         radius = kwargs.get('radius', 0.5)
         width = kwargs.get('width', 0.1)
-        mask = fermi_filter(shape = kspace.shape, cutoff_radius_ratio = radius, transition_width_ratio = width, cutoff_radius_z_ratio = radius_z, transition_width_z_ratio = width_z, z_type = z_type)
+        mask = get_filter_mask(kspace.shape, 'fermi', dtype, cutoff_radius_ratio = radius, transition_width_ratio = width, cutoff_radius_z_ratio = radius_z, transition_width_z_ratio = width_z, z_type = z_type)
     elif filter_type == 'sine_bell':
-        mask = sine_bell_filter(shape = kspace.shape, cutoff_radius_z_ratio = radius_z, transition_width_z_ratio = width_z, z_type = z_type)
+        mask = get_filter_mask(kspace.shape, 'sine_bell', dtype, cutoff_radius_z_ratio = radius_z, transition_width_z_ratio = width_z, z_type = z_type)
     elif filter_type == 'gaussian':
         sigma = kwargs.get('sigma', 0.8)
-        mask = gaussian_filter( shape = kspace.shape, sigma_ratio=sigma, cutoff_radius_z_ratio = radius_z, transition_width_z_ratio = width_z, z_type=z_type)
+        mask = get_filter_mask(kspace.shape, 'gaussian', dtype, sigma_ratio=sigma, cutoff_radius_z_ratio = radius_z, transition_width_z_ratio = width_z, z_type=z_type)
 
     else:
         raise ValueError('Invalid filter type. Options are: fermi, sine_bell, gaussian')
     if center_correction:
+        # Rolling creates a copy that can be filtered in place
         kspace = kspace_center_correction(kspace)
-    kspace = kspace * mask
+    elif not in_place:
+        kspace = kspace.copy()
+    if np.can_cast(mask.dtype, kspace.dtype, casting='same_kind'):
+        kspace *= mask
+    else:
+        kspace = kspace * mask
     if return_mask:
         return kspace, mask
     else:
         return kspace
 
+
+def get_filter_mask(shape, filter_type, dtype=np.float64, **params):
+    '''
+    Returns the (read-only) filter mask for the given shape, filter type, and filter parameters. The masks
+    are cached, so that scans with the same matrix size and filter settings reuse the mask.
+    '''
+    return _cached_filter_mask(tuple(shape), filter_type, np.dtype(dtype).str, tuple(sorted(params.items())))
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _cached_filter_mask(shape, filter_type, dtype, params):
+    filters = {'fermi': fermi_filter, 'sine_bell': sine_bell_filter, 'gaussian': gaussian_filter}
+    mask = filters[filter_type](shape, **dict(params)).astype(dtype, copy=False)
+    mask.setflags(write=False)
+    return mask
+
+
+def _sparse_grid(axes):
+    '''
+    Returns broadcastable 1D profiles with the same layout as np.meshgrid(*axes, indexing='xy'), so that
+    masks can be built without allocating the full position grid.
+    '''
+    return np.meshgrid(*axes, indexing='xy', sparse=True)
+
+
+def _fermi(r, radius, width):
+    return 1/(1+np.exp((r-radius)/width))
+
 ###### different types of filters ######
 
 def gaussian_filter(shape, sigma_ratio=0.8, z_type='fermi', cutoff_radius_z_ratio=0.9, transition_width_z_ratio=0.1):
@@ -91,23 +134,24 @@ def gaussian_filter(shape, sigma_ratio=0.8, z_type='fermi', cutoff_radius_z_rati
         raise ValueError("Matrix size must be a tuple")
     
     axes = [np.linspace(-dim/2, dim/2, dim) for dim in shape]
-    grid = np.meshgrid(*axes, indexing='xy')
-    pos = np.stack(grid, axis=-1)
+    grid = _sparse_grid(axes)
     sigma = sigma_ratio * shape[0]
+    # The Gaussian is separable: product of the 1D profiles
+    profiles = [np.exp(-g**2 / (2*sigma**2)) for g in grid]
     if len(shape) == 3:
         if z_type == 'isotropic':
-            pos = np.stack(grid, axis=-1)
-            filter = np.exp(-np.sum(pos**2, axis=-1) / (2*sigma**2))
+            filter = profiles[0] * profiles[1] * profiles[2]
         if z_type == 'fermi':
             radius_z = cutoff_radius_z_ratio*shape[-1]
             width_z = transition_width_z_ratio*shape[-1]
-            filter = np.exp(-np.sum(pos[...,0:2]**2, axis=-1) / (2*sigma**2))
-            filter_z_1d = 1/(1+np.exp((np.abs(grid[-1])-radius_z)/width_z))
-            filter = filter * filter_z_1d
+            filter = profiles[0] * profiles[1] * _fermi(np.abs(grid[-1]), radius_z, width_z)
         elif z_type == 'same':
-            filter = np.exp(-np.sum(pos[..., :2]**2, axis=-1) / (2*sigma**2))
-    elif len(shape) == 2 or len(shape) == 1:
-        filter = np.exp(-np.sum(pos**2, axis=-1) / (2*sigma**2))
+            filter = profiles[0] * profiles[1]
+            filter = np.broadcast_to(filter, np.broadcast_shapes(*[g.shape for g in grid]))
+    elif len(shape) == 2:
+        filter = profiles[0] * profiles[1]
+    elif len(shape) == 1:
+        filter = profiles[0]
     else:
         raise ValueError("Invalid shape dimension: shape must be either 1D, 2D or 3D")
 
@@ -134,22 +178,25 @@ def fermi_filter(shape, cutoff_radius_ratio=0.5, transition_width_ratio=0.1, z_t
     radius = cutoff_radius_ratio*shape[0]
     width = transition_width_ratio*shape[-1]
     axes = [np.linspace(-dim/2, dim/2, dim) for dim in shape]
-    grid = np.meshgrid(*axes, indexing='xy')
-    pos = np.stack(grid, axis=-1)
+    grid = _sparse_grid(axes)
+    # Radial filter: the squared radius is built from the squared 1D profiles by broadcasting
     if len(shape) == 3:
         if z_type=='isotropic': # 3D isotropic Fermi filter
-            filter = 1/(1+np.exp((np.linalg.norm(pos, axis=-1)-radius)/width))
+            filter = _fermi(np.sqrt(grid[0]**2 + grid[1]**2 + grid[2]**2), radius, width)
         elif z_type=='fermi': # 2D Fermi filter on each slice with 1d Fermi filter on z axis
             radius_z = cutoff_radius_z_ratio*shape[-1]
             width_z = transition_width_z_ratio*shape[-1]
-            filter = 1/(1+np.exp((np.linalg.norm(pos[...,0:2], axis=-1)-radius)/width))
-            filter_z_1d = 1/(1+np.exp((np.abs(grid[-1])-radius_z)/width_z))
+            filter = _fermi(np.sqrt(grid[0]**2 + grid[1]**2), radius, width)
+            filter_z_1d = _fermi(np.abs(grid[-1]), radius_z, width_z)
             filter = filter * filter_z_1d
         elif z_type=='same': # 2D Fermi filter on each slice
-            filter = 1/(1+np.exp((np.linalg.norm(pos[...,0:2], axis=-1)-radius)/width))
+            filter = _fermi(np.sqrt(grid[0]**2 + grid[1]**2), radius, width)
+            filter = np.broadcast_to(filter, np.broadcast_shapes(*[g.shape for g in grid]))
 
-    elif len(shape)==2 or len(shape) == 1:
-        filter = 1/(1+np.exp((np.linalg.norm(pos, axis=-1)-radius)/(width)))
+    elif len(shape)==2:
+        filter = _fermi(np.sqrt(grid[0]**2 + grid[1]**2), radius, width)
+    elif len(shape) == 1:
+        filter = _fermi(np.abs(grid[0]), radius, width)
     else:
         raise ValueError("Invalid shape dimension: shape must be either 1D, 2D or 3D")
     
@@ -171,7 +218,7 @@ def sine_bell_filter(shape, z_type='fermi', cutoff_radius_z_ratio=0.9, transitio
     if not isinstance(shape, tuple):
         raise ValueError("Matrix size must be a tuple of length 2 or 3.")
     axes = [np.linspace(0, np.pi, dim) for dim in shape]
-    grid = np.meshgrid(*axes, indexing='xy')
+    grid = _sparse_grid(axes)
     if len(shape) == 3:
         if z_type=='isotropic': # 3D isotropic sine bell filter
             filter = np.sin(grid[0])**2*np.sin(grid[1])**2*np.sin(grid[2])**2
@@ -180,10 +227,11 @@ def sine_bell_filter(shape, z_type='fermi', cutoff_radius_z_ratio=0.9, transitio
             width_z = transition_width_z_ratio*shape[-1]
             filter = np.sin(grid[0])**2*np.sin(grid[1])**2
             gridz = (grid[-1]/np.pi-0.5)*shape[-1]
-            filter_z_1d = 1/(1+np.exp((np.abs(gridz)-radius_z)/width_z))
+            filter_z_1d = _fermi(np.abs(gridz), radius_z, width_z)
             filter = filter * filter_z_1d
         elif z_type=='same': # 2D sine bell filter on each slice
             filter = np.sin(grid[0])**2*np.sin(grid[1])**2
+            filter = np.broadcast_to(filter, np.broadcast_shapes(*[g.shape for g in grid]))
     elif len(shape)==2:
             # Calculate 2D sine-bell filter
             filter = np.sin(grid[0])**2*np.sin(grid[1])**2 
@@ -195,7 +243,3 @@ def sine_bell_filter(shape, z_type='fermi', cutoff_radius_z_ratio=0.9, transitio
     
     filter = filter/filter.max()
     return filter
-
-
-
-
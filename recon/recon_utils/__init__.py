@@ -1,2 +1,3 @@
 from .imaging import *
-from .visualization import *
\ No newline at end of file
+from .visualization import *
+from .kspace_scatter import *
@@ -1,21 +1,28 @@
 import numpy as np
 from typing import Tuple
 
+import recon.fft_provider as fftp
+
 
 def centered_fft(x: np.ndarray) -> np.ndarray: # n-dim fft
-    return np.fft.fftshift(np.fft.fftn(np.fft.ifftshift(x), norm='ortho'))
+    return fftp.centered_fftn(x, norm='ortho')
 
 
 def centered_ifft(y) -> np.ndarray: # n-dim ifft
-    return np.fft.fftshift(np.fft.ifftn(np.fft.ifftshift(y), norm='ortho'))
+    return fftp.centered_ifftn(y, norm='ortho')
 
 
 def centered_fft2(x: np.ndarray) -> np.ndarray:
-    return np.fft.fftshift(np.fft.fft2(np.fft.ifftshift(x), norm='ortho'))
+    if np.ndim(x) == 2:
+        return fftp.centered_fftn(x, norm='ortho')
+    # The shifts are applied to all axes
+    return fftp.fftshift(fftp.fft2(fftp.ifftshift(x), norm='ortho'))
 
 
 def centered_ifft2(y):
-    return np.fft.fftshift(np.fft.ifft2(np.fft.ifftshift(y), norm='ortho'))
+    if np.ndim(y) == 2:
+        return fftp.centered_ifftn(y, norm='ortho')
+    return fftp.fftshift(fftp.ifft2(fftp.ifftshift(y), norm='ortho'))
 
 
 def nrmse(x, x_hat):
@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Optional, Tuple
+
+
+def get_encoding_indices(
+    order: np.ndarray, shape: Tuple[int, int, int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the phase and slice index in k-space (readout x pe x slc) of each readout, for an
+    order of (pe, slc) encodings relative to the k-space center.
+    """
+    order = np.asarray(order).reshape(len(order), -1)
+    max_pe = shape[1]
+    max_slc = shape[2]
+    center_pe = max_pe - int(max_pe / 2)
+    center_slc = max_slc - int(max_slc / 2)
+    pe_index = (center_pe - order[:, 0]) % max_pe
+    slc_index = (center_slc - order[:, 1]) % max_slc
+    return pe_index, slc_index
+
+
+class KSpaceScatter:
+    """
+    Places readouts into a Cartesian k-space (readout x pe x slc) according to the acquisition order.
+    The target indices and the ADC phase correction are calculated once for all readouts, so that
+    readouts can be scattered in batches with a single fancy-indexing assignment.
+
+    order: array of (pe, slc) encodings relative to the k-space center, one row per readout
+    adc_phases: optional RF spoiling phase of each readout in degrees (removed while scattering)
+    """
+
+    def __init__(
+        self,
+        order: np.ndarray,
+        shape: Tuple[int, int, int],
+        adc_phases: Optional[np.ndarray] = None,
+    ):
+        order = np.asarray(order).reshape(len(order), -1)
+        self.shape = tuple(shape)
+        self.readouts = order.shape[0]
+
+        self.pe_index, self.slc_index = get_encoding_indices(order, self.shape)
+
+        self.phase_correction = None
+        if adc_phases is not None:
+            adc_phases = np.asarray(adc_phases[: self.readouts])
+            self.phase_correction = np.exp(adc_phases / 180.0 * np.pi * 1j)
+
+    def allocate(self, dtype=complex) -> np.ndarray:
+        return np.zeros(self.shape, dtype=dtype)
+
+    def scatter(
+        self,
+        kspace: np.ndarray,
+        data: np.ndarray,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Writes the readouts start..stop (data: readouts x samples) into kspace. If a k-space line has
+        been acquired multiple times, the last readout is used.
+        """
+        if stop is None:
+            stop = start + data.shape[0]
+        data = data[: stop - start]
+        if self.phase_correction is not None:
+            data = data * self.phase_correction[start:stop, None]
+        kspace[:, self.pe_index[start:stop], self.slc_index[start:stop]] = data.T
+        return kspace
+
+    def __call__(self, data: np.ndarray, dtype=complex) -> np.ndarray:
+        """Returns a new k-space that contains all readouts."""
+        data = np.asarray(data).reshape(-1, self.shape[0])
+        return self.scatter(self.allocate(dtype), data[: self.readouts], 0, self.readouts)
+
+
+def apply_phase_ramp(
+    x: np.ndarray, offset: float, slope: float, axis: int = 0
+) -> np.ndarray:
+    """
+    Multiplies x in place with exp(1j * (offset + slope * (n - N / 2))) along the given axis.
+    """
+    n = x.shape[axis]
+    ramp = np.exp(1j * (offset + slope * (np.arange(n) - n / 2)))
+    broadcast_shape = [1] * x.ndim
+    broadcast_shape[axis] = n
+    x *= ramp.reshape(broadcast_shape)
+    return x
@@ -1,8 +1,10 @@
 from importlib import import_module
 from pathlib import Path
-from typing import Dict, TypeVar, Generic
+from typing import Dict, Tuple, TypeVar, Generic
 import os
+import numpy as np
 import common.logger as logger
+from common.constants import mri4all_taskdata, mri4all_scanfiles
 
 log = logger.get_logger()
 
@@ -219,6 +221,36 @@ class PulseqSequence(SequenceBase[SequenceVar], registry_key=""):
     # Path and name of the .seq for simple sequence that only use one file
     seq_file_path = ""
 
+    def open_ismrmrd_writer(
+        self, scan_task, matrix: Tuple[int, int, int], repetitions: int = 1
+    ):
+        """
+        Opens the ISMRMRD file of the scan at scan start, so that run_pulseq can append the readouts
+        as soon as they have been received. The matrix is the k-space size (readout x pe x slc), and
+        the encoding counters are taken from the pe_order table written by calculate_sequence. The
+        table is acquired once per repetition (e.g., for every average). Returns None if the file
+        cannot be created, as the export must not fail the scan (the reconstruction creates the
+        file instead).
+        """
+        # Imported here, so that only sequences that export ISMRMRD files need the ismrmrd package
+        from recon.ismrmrd.numpy_to_ismrmrd import ISMRMRDWriter, ISMRMRD_FILENAME
+
+        folder = self.get_working_folder()
+        try:
+            pe_order = np.load(
+                os.path.join(folder, mri4all_taskdata.RAWDATA, mri4all_scanfiles.PE_ORDER)
+            )
+            return ISMRMRDWriter(
+                os.path.join(folder, ISMRMRD_FILENAME),
+                scan_task,
+                matrix,
+                repetitions=repetitions,
+                pe_order=pe_order,
+            )
+        except Exception as e:
+            log.error(f"Unable to open ISMRMRD file: {e}")
+            return None
+
 
 # Automatically import all sequence classes existing in the /sequences directory.
 # Sequence classes must provide only one Python file in the sequences directory,
@@ -129,7 +129,7 @@ class CalShimAmplitude(PulseqSequence, registry_key=Path(__file__).stem):
         # return the new signal that is produced by user values. should return the FFT or whatever
         # MEASURE THE FFT OF THE SIGNAL
         rxd = abs(sequence_instance.rxd)
-        return rxd.tolist()
+        return rxd
 
     def calculate_sequence(self, scan_task) -> bool:
         scan_task.processing.recon_mode = "bypass"
@@ -158,7 +158,9 @@ class CalShimAmplitude(PulseqSequence, registry_key=Path(__file__).stem):
         # calculate the linear shim
         log.info("Running manual shimming")
 
-        k = Communicator(Communicator.RECON)
+        # Runs in the acquisition service, so the acquisition pipe end is used. The recon pipe end
+        # belongs to the recon service
+        k = Communicator(Communicator.ACQ)
 
         result = k.do_shim(self.new_user_values, self.new_signal)
 
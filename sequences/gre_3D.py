@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 import datetime
 import math
@@ -12,9 +13,11 @@ import external.seq.adjustments_acq.config as cfg
 from external.seq.adjustments_acq.scripts import run_pulseq
 from sequences.common.get_trajectory import choose_pe_order
 from sequences import PulseqSequence
-from sequences.common import make_tse_3D
+from sequences.common import make_tse_3D, get_trajectory
 from common.constants import *
+import common.config as config
 import common.logger as logger
+import common.sequence_cache as sequence_cache
 from common.types import ResultItem
 import common.helper as helper
 
@@ -180,7 +183,16 @@ class SequenceGRE_3D(PulseqSequence, registry_key=Path(__file__).stem):
         scan_task.processing.oversampling_read = 2
         self.seq_file_path = self.get_working_folder() + "/seq/acq0.seq"
 
-        if not self.generate_pulseq():
+        # The sequence is calculated in this module, so its source is part of the cache key
+        cache_key = sequence_cache.get_sequence_key(
+            self.get_name(),
+            {**self.get_parameters(), "dummy_shots": self.param_dummy_shots},
+            modules=[sys.modules[__name__], get_trajectory],
+        )
+
+        if not sequence_cache.calculate_cached(
+            cache_key, self.get_working_folder(), self.generate_pulseq
+        ):
             log.error("Unable to calculate sequence " + self.get_name())
             return False
 
@@ -198,26 +210,48 @@ class SequenceGRE_3D(PulseqSequence, registry_key=Path(__file__).stem):
         )
 
         plot_instructions = True
+        hardware_simulation = config.get_config().is_hardware_simulation()
+
+        # The readouts are exported to ISMRMRD while they are received, so that the export is not
+        # left to the end of the reconstruction
+        ismrmrd_writer = None
+        if not hardware_simulation:
+            ismrmrd_writer = self.open_ismrmrd_writer(
+                scan_task,
+                (
+                    2 * self.param_baseresolution,
+                    self.param_baseresolution,
+                    self.param_slices,
+                ),
+                repetitions=self.param_NSA,
+            )
+
+        try:
+            rxd, rx_t = run_pulseq(
+                seq_file=self.seq_file_path,
+                rf_center=cfg.LARMOR_FREQ,
+                tx_t=1,
+                grad_t=10,
+                tx_warmup=100,
+                shim_x=0.0,
+                shim_y=0.0,
+                shim_z=0.0,
+                grad_cal=False,
+                save_np=True,
+                save_mat=False,
+                save_msgs=False,
+                gui_test=False,
+                case_path=self.get_working_folder(),
+                raw_filename="raw",
+                expected_duration_sec=expected_duration_sec,
+                plot_instructions=plot_instructions,
+                hardware_simulation=hardware_simulation,
+                ismrmrd_writer=ismrmrd_writer,
+            )
+        finally:
+            if ismrmrd_writer is not None:
+                ismrmrd_writer.close()
 
-        rxd, rx_t = run_pulseq(
-            seq_file=self.seq_file_path,
-            rf_center=cfg.LARMOR_FREQ,
-            tx_t=1,
-            grad_t=10,
-            tx_warmup=100,
-            shim_x=0.0,
-            shim_y=0.0,
-            shim_z=0.0,
-            grad_cal=False,
-            save_np=True,
-            save_mat=False,
-            save_msgs=False,
-            gui_test=False,
-            case_path=self.get_working_folder(),
-            raw_filename="raw",
-            expected_duration_sec=expected_duration_sec,
-            plot_instructions=plot_instructions,
-        )
         scan_task.adjustment.rf.larmor_frequency = cfg.LARMOR_FREQ
 
         if plot_instructions:
@@ -11,8 +11,9 @@ import external.seq.adjustments_acq.config as cfg
 from external.seq.adjustments_acq.scripts import run_pulseq
 from sequences.common.get_trajectory import choose_pe_order
 from sequences import PulseqSequence
-from sequences.common import make_tse_3D
+from sequences.common import make_tse_3D, get_trajectory
 import common.logger as logger
+import common.sequence_cache as sequence_cache
 from common.types import ResultItem
 import common.helper as helper
 import common.config as config
@@ -200,28 +201,37 @@ class SequenceTSE_3D(PulseqSequence, registry_key=Path(__file__).stem):
         if "FA2" in scan_task.other:
             fa_ref = int(scan_task.other["FA2"])
 
-        if not make_tse_3D.pypulseq_tse3D(
-            inputs={
-                "TE": self.param_TE,
-                "TR": self.param_TR,
-                "NSA": self.param_NSA,
-                "ETL": self.param_ETL,
-                "FOV": self.param_FOV,
-                "Orientation": self.param_Orientation,
-                "Base_Resolution": self.param_Base_Resolution,
-                "Slices": self.param_Slices,
-                "BW": self.param_BW,
-                "Trajectory": self.param_Trajectory,
-                "Ordering": self.param_Ordering,
-                "Plot_Timing": self.param_plot_timing,
-                "dummy_shots": self.param_dummy_shots,
-                "FA1": fa_exc,
-                "FA2": fa_ref,
-            },
-            check_timing=True,
-            output_file=self.seq_file_path,
-            pe_order_file=self.get_working_folder() + "/rawdata/pe_order.npy",
-            output_folder=self.get_working_folder(),
+        inputs = {
+            "TE": self.param_TE,
+            "TR": self.param_TR,
+            "NSA": self.param_NSA,
+            "ETL": self.param_ETL,
+            "FOV": self.param_FOV,
+            "Orientation": self.param_Orientation,
+            "Base_Resolution": self.param_Base_Resolution,
+            "Slices": self.param_Slices,
+            "BW": self.param_BW,
+            "Trajectory": self.param_Trajectory,
+            "Ordering": self.param_Ordering,
+            "Plot_Timing": self.param_plot_timing,
+            "dummy_shots": self.param_dummy_shots,
+            "FA1": fa_exc,
+            "FA2": fa_ref,
+        }
+        cache_key = sequence_cache.get_sequence_key(
+            self.get_name(), inputs, modules=[make_tse_3D, get_trajectory]
+        )
+
+        if not sequence_cache.calculate_cached(
+            cache_key,
+            self.get_working_folder(),
+            lambda: make_tse_3D.pypulseq_tse3D(
+                inputs=inputs,
+                check_timing=True,
+                output_file=self.seq_file_path,
+                pe_order_file=self.get_working_folder() + "/rawdata/pe_order.npy",
+                output_folder=self.get_working_folder(),
+            ),
         ):
             log.warning("Unable to calculate sequence")
             return False
@@ -245,31 +255,52 @@ class SequenceTSE_3D(PulseqSequence, registry_key=Path(__file__).stem):
         )
 
         plot_instructions = self.param_plot_timing
+        hardware_simulation = config.get_config().is_hardware_simulation()
+
+        # The readouts are exported to ISMRMRD while they are received, so that the export is not
+        # left to the end of the reconstruction
+        ismrmrd_writer = None
+        if not hardware_simulation:
+            ismrmrd_writer = self.open_ismrmrd_writer(
+                scan_task,
+                (
+                    2 * self.param_Base_Resolution,
+                    self.param_Base_Resolution,
+                    self.param_Slices,
+                ),
+                repetitions=self.param_NSA,
+            )
+
+        try:
+            rxd, rx_t = run_pulseq(
+                seq_file=self.seq_file_path,
+                rf_center=cfg.LARMOR_FREQ,
+                tx_t=1,
+                grad_t=10,
+                tx_warmup=100,
+                # TODO: Debug values used here
+                # shim_x=-0.01,
+                # shim_y=-0.01,
+                # shim_z=-0.01,
+                shim_x=0.0,
+                shim_y=0.0,
+                shim_z=0.0,
+                grad_cal=False,
+                save_np=True,
+                save_mat=False,
+                save_msgs=False,
+                gui_test=False,
+                case_path=self.get_working_folder(),
+                raw_filename="raw",
+                expected_duration_sec=expected_duration_sec,
+                plot_instructions=plot_instructions,
+                hardware_simulation=hardware_simulation,
+                ismrmrd_writer=ismrmrd_writer,
+            )
+        finally:
+            if ismrmrd_writer is not None:
+                ismrmrd_writer.close()
 
-        rxd, rx_t = run_pulseq(
-            seq_file=self.seq_file_path,
-            rf_center=cfg.LARMOR_FREQ,
-            tx_t=1,
-            grad_t=10,
-            tx_warmup=100,
-            # TODO: Debug values used here
-            # shim_x=-0.01,
-            # shim_y=-0.01,
-            # shim_z=-0.01,
-            shim_x=0.0,
-            shim_y=0.0,
-            shim_z=0.0,
-            grad_cal=False,
-            save_np=True,
-            save_mat=False,
-            save_msgs=False,
-            gui_test=False,
-            case_path=self.get_working_folder(),
-            raw_filename="raw",
-            expected_duration_sec=expected_duration_sec,
-            plot_instructions=plot_instructions,
-            hardware_simulation=config.get_config().is_hardware_simulation() == "True",
-        )
         scan_task.adjustment.rf.larmor_frequency = cfg.LARMOR_FREQ
 
         if plot_instructions:
@@ -0,0 +1,193 @@
+"""
+Look-ahead preparation of the next scan. While a scan is running, the sequence of the next scan in the
+acquisition queue is calculated in a worker process, so that the next scan can be started without delay.
+The calculation is done in a staging folder, because the task can still be edited or deleted while it is
+waiting in the queue. Before the prepared sequence is used, a fingerprint of the protocol and the
+configuration files is compared, so that changes made in the meantime cause a recalculation.
+"""
+import os
+import json
+import shutil
+import hashlib
+import multiprocessing
+import concurrent.futures
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import common.logger as logger
+import common.runtime as rt
+
+log = logger.get_logger()
+
+import common.task as task
+import common.queue as queue
+import common.config as config
+import common.ipc.ipc as ipc
+from common.types import ScanTask
+from common.constants import *
+from sequences import SequenceBase
+from sequences.common.util import path as acq_config_path
+from common.config import mri4_all_config_path
+
+import external.seq.adjustments_acq.config as cfg
+
+
+def get_fingerprint(scan_task: ScanTask) -> str:
+    """Returns a hash of all settings that affect the calculation of the sequence."""
+    task_data = scan_task.model_dump(
+        include={"sequence", "parameters", "adjustment", "processing", "other"}
+    )
+    fingerprint = hashlib.sha256(
+        json.dumps(task_data, sort_keys=True, default=str).encode()
+    )
+    for config_file in [acq_config_path, mri4_all_config_path]:
+        try:
+            fingerprint.update(Path(config_file).read_bytes())
+        except OSError:
+            pass
+    return fingerprint.hexdigest()
+
+
+def _init_worker() -> None:
+    rt.set_service_name("acq_lookahead")
+    # The worker is forked from the acquisition service and shares its IPC connections
+    ipc.disable_ipc()
+
+
+def _prepare_sequence(scan_name: str) -> Tuple[str, Dict[str, Any], Any]:
+    """
+    Runs in the worker process. Calculates the sequence of the given task in the staging folder and
+    returns the fingerprint, the updated scan task, and the sequence instance.
+    """
+    rt.set_current_task_id(scan_name)
+    config.load_config()
+    cfg.update()
+
+    scan_task = task.read_task(mri4all_paths.DATA_QUEUE_ACQ + "/" + scan_name)
+    if scan_task is None:
+        raise Exception(f"Unable to read task {scan_name}")
+    fingerprint = get_fingerprint(scan_task)
+
+    staging_folder = mri4all_paths.DATA_ACQ_PREPARED + "/" + scan_name
+    shutil.rmtree(staging_folder, ignore_errors=True)
+    os.mkdir(staging_folder)
+    for subfolder in [
+        mri4all_taskdata.SEQ,
+        mri4all_taskdata.RAWDATA,
+        mri4all_taskdata.DICOM,
+        mri4all_taskdata.TEMP,
+        mri4all_taskdata.OTHER,
+    ]:
+        os.mkdir(staging_folder + "/" + subfolder)
+    shutil.copy(
+        mri4all_paths.DATA_QUEUE_ACQ + "/" + scan_name + "/" + mri4all_files.TASK,
+        staging_folder + "/" + mri4all_files.TASK,
+    )
+
+    seq_instance = SequenceBase.get_sequence(scan_task.sequence)()
+    seq_instance.set_working_folder(staging_folder)
+    if not seq_instance.set_parameters(scan_task.parameters, scan_task):
+        raise Exception("Invalid protocol used to initialize sequence.")
+    if not seq_instance.calculate_sequence(scan_task):
+        raise Exception("Sequence did not calculate successfully.")
+
+    return fingerprint, scan_task.model_dump(), seq_instance
+
+
+class SequenceLookahead:
+    """Manages the worker process that prepares the sequence of the next scan in the queue."""
+
+    def __init__(self):
+        self.executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self.scan_name = ""
+        self.future: Optional[concurrent.futures.Future] = None
+
+    def prepare_next(self) -> None:
+        """Starts the preparation of the next scan that is ready for acquisition (if any)."""
+        next_scan = queue.get_scan_ready_for_acq()
+        if not next_scan or next_scan == self.scan_name:
+            return
+        self.discard()
+
+        if self.executor is None:
+            # Forking is required, so that the worker does not register the IPC endpoints again
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker,
+            )
+        log.info(f"Preparing sequence of next scan {next_scan} in the background")
+        self.scan_name = next_scan
+        self.future = self.executor.submit(_prepare_sequence, next_scan)
+
+    def discard(self) -> None:
+        if self.future is not None:
+            self.future.cancel()
+        if self.scan_name:
+            shutil.rmtree(
+                mri4all_paths.DATA_ACQ_PREPARED + "/" + self.scan_name,
+                ignore_errors=True,
+            )
+        self.scan_name = ""
+        self.future = None
+
+    def take(
+        self, scan_name: str, scan_task: ScanTask
+    ) -> Optional[Tuple[Any, ScanTask]]:
+        """
+        Returns the prepared sequence instance and updated scan task if the given scan has been prepared
+        with the current settings. The prepared files are moved into the task folder. If the scan has not
+        been prepared (or the settings have changed), None is returned and the sequence needs to be
+        calculated as usual.
+        """
+        if scan_name != self.scan_name or self.future is None:
+            return None
+
+        try:
+            # If the preparation is still running, waiting is faster than starting from scratch
+            fingerprint, task_data, seq_instance = self.future.result()
+        except Exception as e:
+            log.warning(f"Background preparation of scan {scan_name} failed: {e}")
+            self.discard()
+            return None
+
+        if fingerprint != get_fingerprint(scan_task):
+            log.info("Settings have changed since the sequence was prepared. Recalculating.")
+            self.discard()
+            return None
+
+        staging_folder = mri4all_paths.DATA_ACQ_PREPARED + "/" + scan_name
+        task_folder = mri4all_paths.DATA_ACQ + "/" + scan_name
+        try:
+            for subfolder in os.listdir(staging_folder):
+                if not os.path.isdir(staging_folder + "/" + subfolder):
+                    continue
+                for file in os.listdir(staging_folder + "/" + subfolder):
+                    shutil.move(
+                        staging_folder + "/" + subfolder + "/" + file,
+                        task_folder + "/" + subfolder + "/" + file,
+                    )
+        except Exception as e:
+            log.warning(f"Unable to move prepared sequence files: {e}")
+            self.discard()
+            return None
+        self.discard()
+
+        # Let the paths stored in the sequence instance point to the task folder
+        for attribute, value in vars(seq_instance).items():
+            if isinstance(value, str) and value.startswith(staging_folder):
+                setattr(
+                    seq_instance,
+                    attribute,
+                    task_folder + value[len(staging_folder) :],
+                )
+
+        prepared_task = ScanTask(**task_data)
+        prepared_task.journal = scan_task.journal
+        return seq_instance, prepared_task
+
+    def shutdown(self) -> None:
+        self.discard()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
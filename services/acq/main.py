@@ -1,6 +1,7 @@
 from asyncio.locks import _ContextManagerMixin
 import os
 import sys
+import shutil
 
 sys.path.append("/opt/mri4all/console/external/")
 
@@ -25,11 +26,14 @@ import common.queue as queue
 from common.constants import *
 import common.plotting as plotting
 import common.config as config
+from services.acq.lookahead import SequenceLookahead
 
 import external.seq.adjustments_acq.config as cfg
 
 
 main_loop = None  # type: helper.AsyncTimer # type: ignore
+queue_watcher = queue.QueueWatcher(mri4all_paths.DATA_QUEUE_ACQ)
+lookahead = SequenceLookahead()
 
 communicator = Communicator(Communicator.ACQ)
 
@@ -73,13 +77,20 @@ def process_acquisition(scan_name: str) -> bool:
         move_to_fail(scan_name)
         return False
 
+    # Check if the sequence has been prepared in the background while the previous scan was running
+    prepared = lookahead.take(scan_name, scan_task)
+    if prepared:
+        log.info("Using sequence prepared in the background")
+        scan_task = prepared[1]
+
     scan_task.journal.acquisition_start = helper.get_datetime()
     task.write_task(mri4all_paths.DATA_ACQ + "/" + scan_name, scan_task)
 
     # Clear the seq subfolder to remove any .seq file from previous test runs
-    task.clear_task_subfolder(
-        mri4all_paths.DATA_ACQ + "/" + scan_name, mri4all_taskdata.SEQ
-    )
+    if not prepared:
+        task.clear_task_subfolder(
+            mri4all_paths.DATA_ACQ + "/" + scan_name, mri4all_taskdata.SEQ
+        )
 
     try:
         # TODO: Replace with better management of scanner settings
@@ -89,16 +100,25 @@ def process_acquisition(scan_name: str) -> bool:
 
     current_step = ""
     try:
-        current_step = "instantiation"
-        seq_instance = SequenceBase.get_sequence(scan_task.sequence)()
-        current_step = "set_working_folder"
-        seq_instance.set_working_folder(str(mri4all_paths.DATA_ACQ + "/" + scan_name))
-        current_step = "set_parameters"
-        if not seq_instance.set_parameters(scan_task.parameters, scan_task):
-            raise Exception("Invalid protocol used to initialize sequence.")
-        current_step = "calculate_sequence"
-        if not seq_instance.calculate_sequence(scan_task):
-            raise Exception("Sequence did not calculate successfully.")
+        if prepared:
+            seq_instance = prepared[0]
+        else:
+            current_step = "instantiation"
+            seq_instance = SequenceBase.get_sequence(scan_task.sequence)()
+            current_step = "set_working_folder"
+            seq_instance.set_working_folder(
+                str(mri4all_paths.DATA_ACQ + "/" + scan_name)
+            )
+            current_step = "set_parameters"
+            if not seq_instance.set_parameters(scan_task.parameters, scan_task):
+                raise Exception("Invalid protocol used to initialize sequence.")
+            current_step = "calculate_sequence"
+            if not seq_instance.calculate_sequence(scan_task):
+                raise Exception("Sequence did not calculate successfully.")
+
+        # Prepare the next scan in the queue while this scan is running
+        lookahead.prepare_next()
+
         current_step = "run_sequence"
         if not seq_instance.run_sequence(scan_task):
             raise Exception("Sequence did not run successfully.")
@@ -181,6 +201,11 @@ def prepare_acq_service() -> bool:
     if not queue.clear_folder(mri4all_paths.DATA_ACQ, mri4all_paths.DATA_FAILURE):
         return False
 
+    # Remove sequences that have been prepared by a previous instance
+    shutil.rmtree(mri4all_paths.DATA_ACQ_PREPARED, ignore_errors=True)
+    if not queue.create_folder(mri4all_paths.DATA_ACQ_PREPARED):
+        return False
+
     return True
 
 
@@ -192,6 +217,9 @@ def run():
         log.error("Error while preparing acquisition service. Terminating.")
         sys.exit(1)
 
+    # Receive responses from the UI in the background, so that queries can be overlapped
+    communicator.start_dispatcher()
+
     # Register system signals to be caught
     signals = (signal.SIGTERM, signal.SIGINT)
     for s in signals:
@@ -199,15 +227,21 @@ def run():
             s, lambda s=s: asyncio.create_task(terminate_process(s, helper.loop))
         )
 
-    # Start the timer that will periodically trigger the scan of the task folder
+    # Start the timer that will trigger the scan of the task folder whenever the queue has changed
+    # (or periodically, if change notifications are not available)
     global main_loop
 
-    main_loop = helper.AsyncTimer(0.1, run_acquisition_loop)
+    queue_watcher.start(helper.loop)
+    main_loop = helper.AsyncTimer(
+        queue_watcher.rescan_interval, run_acquisition_loop, queue_watcher.event
+    )
     try:
         main_loop.run_until_complete(helper.loop)
     except Exception as e:
         log.exception(e)
     finally:
+        queue_watcher.stop()
+        lookahead.shutdown()
         # Finish all asyncio tasks that might be still pending
         remaining_tasks = helper.asyncio.all_tasks(helper.loop)  # type: ignore[attr-defined]
         if remaining_tasks:
@@ -26,10 +26,14 @@ import services.recon.reconstruction as reconstruction
 from common.types import ScanTask
 import common.plotting as plotting
 import common.config as config
+import recon.fft_provider as fft_provider
+from services.recon.scheduler import ReconScheduler
 
 main_loop = None  # type: helper.AsyncTimer # type: ignore
+queue_watcher = queue.QueueWatcher(mri4all_paths.DATA_QUEUE_RECON)
+scheduler = None  # type: ReconScheduler # type: ignore
 
-communicator = Communicator(Communicator.ACQ)
+communicator = Communicator(Communicator.RECON)
 
 
 def move_to_fail(scan_name: str) -> bool:
@@ -41,12 +45,25 @@ def move_to_fail(scan_name: str) -> bool:
     return True
 
 
+def configure_fft() -> None:
+    """
+    Selects the FFT backend used by the reconstruction according to the configuration
+    """
+    backend = fft_provider.set_backend(
+        config.get_config().recon_fft_backend, config.get_config().recon_fft_workers
+    )
+    if fft_provider.load_wisdom(str(config.fftw_wisdom_path)):
+        log.info("FFTW wisdom loaded")
+    log.info(f"Using FFT backend {backend} with {fft_provider.get_workers()} threads")
+
+
 def process_reconstruction(scan_name: str) -> bool:
     log.info("Performing reconstruction...")
 
     # Reload the configuration to get the latest settings
     config.load_config()
     plotting.set_plotting_defaults()
+    configure_fft()
 
     # Check if JSON file with task definition exists in the recon folder
     if not os.path.isfile(
@@ -97,6 +114,8 @@ def process_reconstruction(scan_name: str) -> bool:
         return False
 
     log.info("Reconstruction completed.")
+    # Keep the FFTW plans for the next reconstruction
+    fft_provider.save_wisdom(str(config.fftw_wisdom_path))
 
     if not queue.move_task(
         mri4all_paths.DATA_RECON + "/" + scan_name, mri4all_paths.DATA_COMPLETE
@@ -113,27 +132,21 @@ def run_reconstruction_loop():
     Main processing function that is called continuously by the main loop
     """
 
-    selected_scan = queue.get_scan_ready_for_recon()
-    if selected_scan:
-        log.info(f"Reconstructing scan: {selected_scan}")
-        rt.set_current_task_id(selected_scan)
-
-        if not queue.move_task(
-            mri4all_paths.DATA_QUEUE_RECON + "/" + selected_scan,
-            mri4all_paths.DATA_RECON,
-        ):
-            log.error(
-                f"Failed to move scan {selected_scan} to recon folder. Unable to run reconstruction."
-            )
-        else:
-            process_reconstruction(selected_scan)
-
-        rt.clear_current_task_id()
+    # Start reconstructions of waiting scans if workers are available. The scans are reconstructed
+    # in worker processes, so that the loop stays responsive while reconstructions are running
+    scheduler.schedule()
 
     if helper.is_terminated():
         return
 
 
+def trigger_rescan() -> None:
+    """
+    Called from the worker pool when a reconstruction has finished, so that the next scan is started
+    """
+    helper.loop.call_soon_threadsafe(queue_watcher.event.set)
+
+
 async def terminate_process(signalNumber, frame) -> None:
     """
     Triggers the shutdown of the service
@@ -171,6 +184,9 @@ def run():
         log.error("Error while preparing acquisition service. Terminating.")
         sys.exit(1)
 
+    # Receive responses from the UI in the background, so that queries can be overlapped
+    communicator.start_dispatcher()
+
     # Register system signals to be caught
     signals = (signal.SIGTERM, signal.SIGINT)
     for s in signals:
@@ -178,15 +194,28 @@ def run():
             s, lambda s=s: asyncio.create_task(terminate_process(s, helper.loop))
         )
 
-    # Start the timer that will periodically trigger the scan of the task folder
-    global main_loop
-    main_loop = helper.AsyncTimer(0.1, run_reconstruction_loop)
+    # Start the timer that will trigger the scan of the task folder whenever the queue has changed
+    # (or periodically, if change notifications are not available)
+    global main_loop, scheduler
+    config.load_config()
+    scheduler = ReconScheduler(
+        process_reconstruction,
+        config.get_config().recon_max_workers,
+        trigger_rescan,
+    )
+    queue_watcher.start(helper.loop)
+    main_loop = helper.AsyncTimer(
+        queue_watcher.rescan_interval, run_reconstruction_loop, queue_watcher.event
+    )
     # communicator.send_user_alert("recon booting")
     try:
         main_loop.run_until_complete(helper.loop)
     except Exception as e:
         log.exception(e)
     finally:
+        queue_watcher.stop()
+        # Wait until running reconstructions have been completed, so that no task is left behind
+        scheduler.shutdown(wait=True)
         # Finish all asyncio tasks that might be still pending
         remaining_tasks = helper.asyncio.all_tasks(helper.loop)  # type: ignore[attr-defined]
         if remaining_tasks:
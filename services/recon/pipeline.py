@@ -0,0 +1,203 @@
+"""
+Declarative reconstruction pipelines. A pipeline is a list of stages, and each stage declares the
+named data items that it consumes (inputs) and produces (outputs). The data items are passed
+between the stages by name, without copies. Before running, the pipeline checks that every input
+is produced by an earlier stage.
+
+Every stage is timed with time.perf_counter() and the peak memory of the process is recorded after
+the stage. The measurements are added to the journal of the scan task. Complex and floating point
+arrays are kept in single precision (complex64/float32) between the stages. Stages should already
+load and compute their data in single precision, the conversion after each stage only catches
+results that are still in double precision (without copying arrays of the right type).
+
+Stages can be cached. The key of every data item is derived from the keys of the inputs and the
+parameters of the stage that produced it, so that cached stages are only recomputed if their
+inputs or parameters have changed (see stage_cache). A stage can return its outputs wrapped in
+Uncached (e.g., a fallback result after an error), so that they are used but not cached.
+"""
+import resource
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import common.logger as logger
+from common.types import ScanTask, StageTiming
+from services.recon.stage_cache import StageCache, stage_key
+
+log = logger.get_logger()
+
+# Type that arrays are converted to after each stage (if not already of this type)
+SINGLE_PRECISION = {
+    np.dtype(np.complex128): np.complex64,
+    np.dtype(np.float64): np.float32,
+}
+
+
+class PipelineContext:
+    """Data that is passed between the stages of a pipeline"""
+
+    def __init__(self, folder: str, task: ScanTask):
+        self.folder = folder
+        self.task = task
+        self.data: Dict[str, Any] = {}
+        self.keys: Dict[str, str] = {}
+
+
+class Uncached:
+    """Outputs of a stage that are passed on to the next stages, but not stored in the cache"""
+
+    def __init__(self, result: Any):
+        self.result = result
+
+
+class Stage:
+    """
+    Step of a reconstruction pipeline. The function is called with the context and the input
+    items (in the declared order), and returns the output items (a single item, a tuple for
+    multiple outputs, or None for stages without outputs), optionally wrapped in Uncached.
+
+    parameters: optional function that returns the settings affecting the result of the stage,
+                used to derive the cache keys of the outputs
+    cached:     store the outputs in the stage cache and reuse them if inputs and parameters match
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Callable,
+        inputs: List[str] = [],
+        outputs: List[str] = [],
+        parameters: Optional[Callable[[PipelineContext], Dict[str, Any]]] = None,
+        cached: bool = False,
+    ):
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.outputs = outputs
+        self.parameters = parameters
+        self.cached = cached
+
+    def get_keys(self, context: PipelineContext) -> Dict[str, str]:
+        parameters = self.parameters(context) if self.parameters else {}
+        input_keys = [context.keys.get(name, "") for name in self.inputs]
+        return {
+            name: stage_key(f"{self.name}:{name}", ",".join(input_keys), parameters)
+            for name in self.outputs
+        }
+
+    def run(self, context: PipelineContext) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """Returns the outputs and whether they can be cached, or None if the stage failed"""
+        result = self.function(context, *[context.data[name] for name in self.inputs])
+        cacheable = not isinstance(result, Uncached)
+        if not cacheable:
+            result = result.result
+        if not self.outputs:
+            return {}, cacheable
+        if result is None:
+            return None
+        if len(self.outputs) == 1:
+            result = (result,)
+        return dict(zip(self.outputs, result)), cacheable
+
+
+def to_single_precision(item: Any) -> Any:
+    if isinstance(item, np.ndarray) and item.dtype in SINGLE_PRECISION:
+        return item.astype(SINGLE_PRECISION[item.dtype], copy=False)
+    return item
+
+
+def get_peak_memory_mb() -> float:
+    # ru_maxrss is given in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage]):
+        self.name = name
+        self.stages = stages
+
+    def validate(self) -> bool:
+        available = set()
+        for stage in self.stages:
+            missing = [name for name in stage.inputs if name not in available]
+            if missing:
+                log.error(
+                    f"Pipeline {self.name}: inputs {missing} of stage {stage.name} "
+                    + "are not produced by an earlier stage"
+                )
+                return False
+            available.update(stage.outputs)
+        return True
+
+    def run(
+        self, folder: str, task: ScanTask, cache: Optional[StageCache] = None
+    ) -> bool:
+        if not self.validate():
+            return False
+
+        context = PipelineContext(folder, task)
+        task.journal.reconstruction_stages = []
+        for stage in self.stages:
+            start = time.perf_counter()
+            keys = stage.get_keys(context)
+
+            outputs = None
+            if stage.cached and cache:
+                cached_outputs = {name: cache.get(key) for name, key in keys.items()}
+                if all(item is not None for item in cached_outputs.values()):
+                    log.info(f"Using cached result of stage {stage.name}")
+                    outputs = cached_outputs
+            from_cache = outputs is not None
+
+            if not from_cache:
+                result = stage.run(context)
+                if result is None:
+                    log.error(f"Stage {stage.name} of pipeline {self.name} failed")
+                    return False
+                outputs, cacheable = result
+                outputs = {
+                    name: to_single_precision(item) for name, item in outputs.items()
+                }
+                if stage.cached and cache and cacheable:
+                    for name, item in outputs.items():
+                        cache.put(keys[name], item)
+
+            context.data.update(outputs)
+            context.keys.update(keys)
+
+            timing = StageTiming(
+                name=stage.name,
+                duration_sec=time.perf_counter() - start,
+                output_mb=sum(
+                    item.nbytes
+                    for item in outputs.values()
+                    if isinstance(item, np.ndarray)
+                )
+                / (1024 * 1024),
+                peak_memory_mb=get_peak_memory_mb(),
+                cached=from_cache,
+            )
+            task.journal.reconstruction_stages.append(timing)
+            log.info(
+                f"Stage {stage.name} finished in {timing.duration_sec * 1000:.1f} ms "
+                + f"(output {timing.output_mb:.1f} MB, peak {timing.peak_memory_mb:.0f} MB)"
+            )
+        return True
+
+
+# Registry of the available pipelines. The pipeline for a scan is selected by the recon_mode of the
+# processing settings, or by the trajectory if no pipeline exists for the recon_mode.
+pipelines: Dict[str, Pipeline] = {}
+
+
+def register_pipeline(name: str, stages: List[Stage]) -> Pipeline:
+    pipeline = Pipeline(name, stages)
+    pipelines[name] = pipeline
+    return pipeline
+
+
+def get_pipeline(task: ScanTask) -> Optional[Pipeline]:
+    if task.processing.recon_mode in pipelines:
+        return pipelines[task.processing.recon_mode]
+    return pipelines.get(task.processing.trajectory)
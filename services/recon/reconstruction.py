@@ -5,14 +5,31 @@ import time
 import matplotlib.pyplot as plt
 
 import common.logger as logger
+import common.config as config
 from common.constants import *
 from common.types import ScanTask
 import services.recon.utils as utils
+from services.recon.pipeline import (
+    PipelineContext,
+    Stage,
+    Uncached,
+    get_pipeline,
+    register_pipeline,
+)
+from services.recon.streaming import PartitionReconstructor
+from services.recon.stage_cache import StageCache
+from common.file_cache import hash_files
+from common.rawdata import RawDataReader
 
 from recon.kspaceFiltering.kspace_filtering import *
 from recon.B0Correction import B0Corrector
+from recon.recon_utils.kspace_scatter import apply_phase_ramp
 import recon.DICOM.DICOM_utils as DICOM
-from recon.ismrmrd.numpy_to_ismrmrd import create_ismrmrd
+from recon.ismrmrd.numpy_to_ismrmrd import (
+    create_ismrmrd,
+    is_complete_ismrmrd,
+    ISMRMRD_FILENAME,
+)
 from recon.image_filters import denoise
 
 log = logger.get_logger()
@@ -27,48 +44,54 @@ def run_reconstruction(folder: str, task: ScanTask) -> bool:
     # log.info(f"Folder where the task is = {folder}")
     # log.info(f"JSON information = {task}")
 
-    if task.processing.recon_mode == "bypass":
-        log.info("Bypassing reconstruction")
-        return True
+    pipeline = get_pipeline(task)
+    if pipeline is None:
+        log.error(f"Unknown trajectory type: {task.processing.trajectory}")
+        return False
+
+    log.info(f"Running {pipeline.name} reconstruction")
+    cache = StageCache(max_size_mb=config.get_config().recon_cache_size_mb)
+    return pipeline.run(folder, task, cache)
+
+
+def get_rawdata_path(context: PipelineContext, filename: str) -> str:
+    return context.folder + "/" + mri4all_taskdata.RAWDATA + "/" + filename
+
+
+def get_dims(context: PipelineContext) -> list:
+    # dim = slices:pe:read
+    return [int(dim) for dim in context.task.processing.dim_size.split(",")]
+
+
+########################################################################################
+# Bypass and fake DICOMs
+########################################################################################
 
-    if task.processing.recon_mode == "fake_dicoms":
-        log.info("Generating fake DICOMs")
-        utils.generate_fake_dicoms(folder, task)
-        time.sleep(1)
-        return True
 
-    if task.processing.recon_mode == "basic3d":
-        log.info("Running Basic 3D reconstruction")
-        run_reconstruction_basic3d(folder, task)
-        return True
+def generate_fake_dicoms(context: PipelineContext):
+    log.info("Generating fake DICOMs")
+    utils.generate_fake_dicoms(context.folder, context.task)
+    time.sleep(1)
 
-    if task.processing.trajectory == "cartesian":
-        log.info("Running Cartesian reconstruction")
-        run_reconstruction_cartesian(folder, task)
-        return True
 
-    log.error(f"Unknown trajectory type: {task.processing.trajectory}")
-    return False
+register_pipeline("bypass", [])
+register_pipeline("fake_dicoms", [Stage("fake_dicoms", generate_fake_dicoms)])
 
 
-def run_reconstruction_basic3d(folder: str, task: ScanTask) -> bool:
-    if task.processing.dim != 3:
+########################################################################################
+# Basic 3D reconstruction
+########################################################################################
+
+
+def load_basic3d(context: PipelineContext):
+    if context.task.processing.dim != 3:
         log.error(
             "Unable to perform reconstruction. This algorithm only support 3 dimensions"
         )
-        return False
+        return None
 
-    order = np.load(
-        folder + "/" + mri4all_taskdata.RAWDATA + "/" + mri4all_scanfiles.PE_ORDER
-    )
-    adc_phases = np.load(
-        folder + "/" + mri4all_taskdata.RAWDATA + "/" + mri4all_scanfiles.ADC_PHASE
-    )
-    kData = np.load(
-        folder + "/" + mri4all_taskdata.RAWDATA + "/" + mri4all_scanfiles.RAWDATA
-    )
-    dims = task.processing.dim_size.split(",")
-    # dim = slices:pe:read
+    order = np.load(get_rawdata_path(context, mri4all_scanfiles.PE_ORDER))
+    adc_phases = np.load(get_rawdata_path(context, mri4all_scanfiles.ADC_PHASE))
 
     # Simple recon
     # kData = np.reshape(kData, (int(dims[1]) * int(dims[0]), int(dims[2])))
@@ -76,53 +99,55 @@ def run_reconstruction_basic3d(folder: str, task: ScanTask) -> bool:
     # kData = np.transpose(kData, axes=[2, 0, 1])
     # kSpace = kData.copy()
 
-    # Index-based recon
-    kData = np.reshape(kData, (int(dims[1]) * int(dims[0]), int(dims[2])))
-    log.info(f"Readout size = {kData.shape}")
-    kSpace = np.zeros(dtype=complex, shape=(int(dims[2]), int(dims[1]), int(dims[0])))
-    log.info(f"Matrix size = {kSpace.shape}")
-
-    center_slc = kSpace.shape[2] - int(kSpace.shape[2] / 2)
-    center_pe = kSpace.shape[1] - int(kSpace.shape[1] / 2)
-    max_slc = kSpace.shape[2]
-    max_pe = kSpace.shape[1]
-
-    counter = 0
-    for line in order:
-        # kSpace[200:511, center_pe - line[0], center_slc - line[1]] = kData[
-        #     counter, 200:511
-        # ]
-
-        # Remove phase offset, if RF spoiling has been used
-        adc_phase = adc_phases[counter] / 180.0 * np.pi
-
-        kSpace[
-            :, (center_pe - line[0]) % max_pe, (center_slc - line[1]) % max_slc
-        ] = kData[counter, :] * np.exp(adc_phase * 1j)
-        counter += 1
-
-    fft = np.fft.fftshift(np.fft.fftn(np.fft.fftshift(kSpace)))
-
-    base_res = fft.shape[0]
-    for sample in range(0, base_res):
-        fft[sample, :, :] = fft[sample, :, :] * np.exp(
-            # np.pi * 1j + base_res / 16 * (sample - base_res / 2) / (2 * base_res) * np.pi * 1j
-            np.pi * 1j
-            + (sample - base_res / 2) / 32 * np.pi * 1j
-        )
+    reader = RawDataReader(
+        get_rawdata_path(context, mri4all_scanfiles.RAWDATA),
+        samples=get_dims(context)[2],
+    )
+    log.info(f"Readout size = {reader.data.shape}")
+    return reader, order, adc_phases
+
+
+def reconstruct_partitions(context: PipelineContext, reader, order, adc_phases):
+    # Index-based recon. The ADC phase correction, k-space scatter and FFT are fused, and
+    # partitions are transformed as soon as all of their readouts are available
+    dims = get_dims(context)
+    reconstructor = PartitionReconstructor(
+        reader, order, adc_phases, (dims[2], dims[1], dims[0]), dtype=np.complex64
+    )
+    log.info(f"Matrix size = {reconstructor.kspace.shape}")
+    fft = reconstructor.run()
+    if fft is None:
+        return None
+    return reconstructor.kspace, fft
+
+
+def correct_phase_ramp(context: PipelineContext, fft):
+    # Linear phase ramp along the readout direction
+    # (previously: np.pi * 1j + base_res / 16 * (sample - base_res / 2) / (2 * base_res) * np.pi * 1j)
+    apply_phase_ramp(fft, offset=np.pi, slope=np.pi / 32, axis=0)
+    return fft
+
 
-    if task.processing.oversampling_read > 0:
-        offset = int(dims[2]) / 4
+def remove_oversampling(context: PipelineContext, fft):
+    if context.task.processing.oversampling_read > 0:
+        offset = get_dims(context)[2] / 4
         fft = fft[int(offset) : int(3 * offset), :, :]
+    return fft
 
-    DICOM.write_dicom(fft, task, folder + "/" + mri4all_taskdata.DICOM, result_index=0)
 
+def write_magnitude_dicoms(context: PipelineContext, fft):
+    DICOM.write_dicom(
+        fft, context.task, context.folder + "/" + mri4all_taskdata.DICOM, result_index=0
+    )
+
+
+def write_kspace_dicoms(context: PipelineContext, kSpace):
     # kSpace = np.angle(kSpace)
     kSpace = 100 * (kSpace - kSpace.min()) / (kSpace.max() - kSpace.min())
     DICOM.write_dicom(
         kSpace,
-        task,
-        folder + "/" + mri4all_taskdata.DICOM,
+        context.task,
+        context.folder + "/" + mri4all_taskdata.DICOM,
         series_offset=1,
         name="k-Space",
         primary_result=False,
@@ -130,10 +155,12 @@ def run_reconstruction_basic3d(folder: str, task: ScanTask) -> bool:
         result_index=2,
     )
 
+
+def write_phase_dicoms(context: PipelineContext, fft):
     DICOM.write_dicom(
         np.angle(fft),
-        task,
-        folder + "/" + mri4all_taskdata.DICOM,
+        context.task,
+        context.folder + "/" + mri4all_taskdata.DICOM,
         series_offset=2,
         name="Phase",
         primary_result=False,
@@ -141,62 +168,163 @@ def run_reconstruction_basic3d(folder: str, task: ScanTask) -> bool:
         autoload_viewer=3,
     )
 
-    return True
 
+register_pipeline(
+    "basic3d",
+    [
+        Stage("load", load_basic3d, outputs=["reader", "order", "adc_phases"]),
+        Stage(
+            "partitions",
+            reconstruct_partitions,
+            inputs=["reader", "order", "adc_phases"],
+            outputs=["kspace", "image"],
+        ),
+        Stage("phase_ramp", correct_phase_ramp, ["image"], ["image"]),
+        Stage("oversampling", remove_oversampling, ["image"], ["image"]),
+        Stage("dicom", write_magnitude_dicoms, ["image"]),
+        Stage("dicom_kspace", write_kspace_dicoms, ["kspace"]),
+        Stage("dicom_phase", write_phase_dicoms, ["image"]),
+    ],
+)
 
-def run_reconstruction_cartesian(folder: str, task: ScanTask):
-    """
-    Runs the reconstruction pipeline for Cartesian sampling
-    """
-    fnames = os.listdir(folder)
-    if not fnames:
-        log.error(f"Folder {folder} is empty.")
-        return
 
-    # Load the k-space data
-    kData = np.load(
-        folder + "/" + mri4all_taskdata.RAWDATA + "/" + mri4all_scanfiles.RAWDATA
+########################################################################################
+# Cartesian reconstruction
+########################################################################################
+
+CARTESIAN_FILTER_TYPE = "fermi"
+CARTESIAN_DENOISE_METHOD = "gaussian_filter"
+
+
+def get_b0_map_files(context: PipelineContext) -> list:
+    fnames = list(filter(lambda x: mri4all_scanfiles.BDATA in x, os.listdir(context.folder)))
+    return [path.join(context.folder, f) for f in fnames]
+
+
+def load_cartesian(context: PipelineContext):
+    if not os.listdir(context.folder):
+        log.error(f"Folder {context.folder} is empty.")
+        return None
+
+    # Load the k-space data (in single precision for all following stages)
+    kData = np.load(get_rawdata_path(context, mri4all_scanfiles.RAWDATA)).astype(
+        np.complex64, copy=False
     )
     kTraj = np.genfromtxt(
-        folder + "/" + mri4all_taskdata.RAWDATA + "/" + mri4all_scanfiles.TRAJ,
+        get_rawdata_path(context, mri4all_scanfiles.TRAJ),
         delimiter=",",
     )  # pe_table a lot by 2 # check rotation
 
     if kTraj.shape[0] > 2:
         kTraj = np.rot90(kTraj)
     # grad_delay_correction(kData, kTraj, delayT, param)
+    return kData, kTraj
+
 
-    filterType = "fermi"
-    kData = kFilter(kData, filterType, center_correction=True)
-    log.info(f"kSpace {filterType} filtering finished.")
+def filter_kspace(context: PipelineContext, kData):
+    kData = kFilter(kData, CARTESIAN_FILTER_TYPE, center_correction=True)
+    log.info(f"kSpace {CARTESIAN_FILTER_TYPE} filtering finished.")
+    return kData
 
+
+def correct_b0(context: PipelineContext, kData, kTraj):
     # Preform B0 correction and reconstruct the image
-    fname_B0_map = list(filter(lambda x: mri4all_scanfiles.BDATA in x, fnames))
+    fname_B0_map = get_b0_map_files(context)
     Y = kData
     kt = kTraj
-    df = np.load(path.join(folder, fname_B0_map[0])) if fname_B0_map else None
+    df = np.load(fname_B0_map[0]) if fname_B0_map else None
     Lx = 1
     nonCart = None
     params = None
-    b0_corrector = B0Corrector(Y, kt, df, Lx, nonCart, params)
+    b0_corrector = B0Corrector(Y, kt, df, Lx, nonCart, params, dtype=np.complex64)
     iData = b0_corrector()
     log.info(f"B0 correction finished.")
+    return iData
+
 
-    # Denoise the image
+def denoise_image(context: PipelineContext, iData):
+    strength = context.task.processing.denoising_strength
     try:
-        strength = task.processing.denoising_strength
-        iData = denoise.remove_gaussian_noise_complex(
-            iData, method="gaussian_filter", strength=strength
+        iData = denoise.denoise_volume_complex(
+            iData, method=CARTESIAN_DENOISE_METHOD, strength=strength
         )
         log.info(f"Finished image denoising with strength={strength}.")
     except ValueError:
+        # Continue with the image that has not been denoised, but do not cache it as result
         log.error(f"Image denoising failed.")
+        return Uncached(iData)
+    return iData
+
 
+def write_dicoms(context: PipelineContext, iData):
     # Create the DICOM file
-    DICOM.write_dicom(iData, task, folder + "/" + mri4all_taskdata.DICOM)
+    DICOM.write_dicom(iData, context.task, context.folder + "/" + mri4all_taskdata.DICOM)
     log.info(f"DICOM writting finished.")
 
+
+def write_ismrmrd(context: PipelineContext, kData):
+    # Sequences that export the readouts while they are received have written the file already
+    if is_complete_ismrmrd(path.join(context.folder, ISMRMRD_FILENAME)):
+        log.info(f"ISMRMRD file has been written during the acquisition.")
+        return
+
     # Create the ISMRMRD file
     # TODO: Enable ISMRMRD creation after bug fix
-    create_ismrmrd(folder, kData, task)
+    create_ismrmrd(context.folder, kData, context.task)
     log.info(f"ISMRMRD format writting finished.")
+
+
+register_pipeline(
+    "cartesian",
+    [
+        Stage(
+            "load",
+            load_cartesian,
+            outputs=["kspace", "trajectory"],
+            parameters=lambda context: {
+                "rawdata": hash_files(
+                    [
+                        get_rawdata_path(context, mri4all_scanfiles.RAWDATA),
+                        get_rawdata_path(context, mri4all_scanfiles.TRAJ),
+                    ]
+                )
+            },
+        ),
+        Stage(
+            "kfilter",
+            filter_kspace,
+            inputs=["kspace"],
+            outputs=["kspace"],
+            parameters=lambda context: {
+                "filter_type": CARTESIAN_FILTER_TYPE,
+                "trajectory": context.task.processing.trajectory,
+                "dim": context.task.processing.dim,
+                "dim_size": context.task.processing.dim_size,
+            },
+            cached=True,
+        ),
+        Stage(
+            "b0_correction",
+            correct_b0,
+            inputs=["kspace", "trajectory"],
+            outputs=["image"],
+            parameters=lambda context: {
+                "b0_map": hash_files(get_b0_map_files(context))
+            },
+            cached=True,
+        ),
+        Stage(
+            "denoise",
+            denoise_image,
+            inputs=["image"],
+            outputs=["image"],
+            parameters=lambda context: {
+                "method": CARTESIAN_DENOISE_METHOD,
+                "strength": context.task.processing.denoising_strength,
+            },
+            cached=True,
+        ),
+        Stage("dicom", write_dicoms, ["image"]),
+        Stage("ismrmrd", write_ismrmrd, ["kspace"]),
+    ],
+)
@@ -0,0 +1,191 @@
+"""
+Scheduler for running multiple reconstructions in parallel. Scans waiting in the recon queue are
+ordered by priority (adjustments and localizers first, 3D scans last) and by their age. Only as many
+scans are taken from the queue as workers are available, so that scans arriving later with higher
+priority can still overtake scans that are waiting in the queue.
+"""
+import os
+import heapq
+import multiprocessing
+import concurrent.futures
+from typing import Callable, Dict, List, Optional, Tuple
+
+import common.logger as logger
+import common.runtime as rt
+
+log = logger.get_logger()
+
+import common.queue as queue
+import common.task as task
+import common.ipc.ipc as ipc
+from common.constants import *
+
+PRIORITY_ADJUSTMENT = 0
+PRIORITY_LOCALIZER = 1
+PRIORITY_DEFAULT = 2
+PRIORITY_3D = 3
+
+LOCALIZER_KEYWORDS = ["localizer", "localiser", "scout"]
+
+
+def get_priority(scan_name: str) -> int:
+    """Determines the reconstruction priority of a scan in the recon queue (lower value = earlier)."""
+    scan_task = task.read_task(mri4all_paths.DATA_QUEUE_RECON + "/" + scan_name)
+    if scan_task is None:
+        return PRIORITY_DEFAULT
+    if scan_task.sequence.startswith("adj_"):
+        return PRIORITY_ADJUSTMENT
+    protocol = (scan_task.sequence + " " + scan_task.protocol_name).lower()
+    if any(keyword in protocol for keyword in LOCALIZER_KEYWORDS):
+        return PRIORITY_LOCALIZER
+    if scan_task.processing.dim == 3:
+        return PRIORITY_3D
+    return PRIORITY_DEFAULT
+
+
+def _init_worker() -> None:
+    # The worker is forked from the reconstruction service and shares its IPC connections
+    ipc.disable_ipc()
+
+
+def _run_worker(process_function: Callable[[str], bool], scan_name: str) -> bool:
+    rt.set_current_task_id(scan_name)
+    try:
+        return process_function(scan_name)
+    finally:
+        rt.clear_current_task_id()
+
+
+class ReconScheduler:
+    """
+    Runs reconstructions in a pool of worker processes. The process function is called in the worker
+    with the name of the scan, after the scan has been moved into the recon folder.
+
+    If a worker process dies (e.g., killed because it ran out of memory), the pool becomes unusable.
+    The scans that were running in the pool are moved to the failure folder, and the pool is
+    replaced by a new one before the next scan is started.
+    """
+
+    def __init__(
+        self,
+        process_function: Callable[[str], bool],
+        max_workers: int = 1,
+        on_finished: Optional[Callable[[], None]] = None,
+    ):
+        self.process_function = process_function
+        self.max_workers = max(1, max_workers)
+        self.on_finished = on_finished
+        self.executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self.running: Dict[str, concurrent.futures.Future] = {}
+        self.pool_broken = False
+        # Priorities are cached, so that the task files only need to be read once per scan
+        self.priorities: Dict[str, int] = {}
+
+    def has_free_worker(self) -> bool:
+        return len(self.running) < self.max_workers
+
+    def _get_candidates(self) -> List[Tuple[int, int, str]]:
+        candidates: List[Tuple[int, int, str]] = []
+        ready_scans = queue.get_scans_ready_for_recon()
+        for order, scan_name in enumerate(ready_scans):
+            if scan_name not in self.priorities:
+                self.priorities[scan_name] = get_priority(scan_name)
+            # The queue is sorted by age, so the position breaks ties between equal priorities
+            heapq.heappush(candidates, (self.priorities[scan_name], order, scan_name))
+
+        # Forget scans that have left the queue
+        for scan_name in list(self.priorities.keys()):
+            if scan_name not in ready_scans:
+                del self.priorities[scan_name]
+        return candidates
+
+    def schedule(self) -> int:
+        """Starts reconstructions until all workers are busy. Returns the number of started scans."""
+        if not self.has_free_worker():
+            return 0
+        if self.pool_broken:
+            self._reset_executor()
+
+        started = 0
+        candidates = self._get_candidates()
+        while candidates and self.has_free_worker():
+            priority, _, scan_name = heapq.heappop(candidates)
+            log.info(f"Reconstructing scan: {scan_name} (priority {priority})")
+
+            if not queue.move_task(
+                mri4all_paths.DATA_QUEUE_RECON + "/" + scan_name,
+                mri4all_paths.DATA_RECON,
+            ):
+                log.error(
+                    f"Failed to move scan {scan_name} to recon folder. Unable to run reconstruction."
+                )
+                continue
+            self.priorities.pop(scan_name, None)
+
+            if self.executor is None:
+                # Forking is required, so that the workers do not register the IPC endpoints again
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_init_worker,
+                )
+            try:
+                future = self.executor.submit(
+                    _run_worker, self.process_function, scan_name
+                )
+            except RuntimeError as e:
+                # The pool broke before the failure has been reported (BrokenProcessPool). Return
+                # the scan to the queue, so that it is started with a new pool on the next call
+                log.error(f"Unable to start reconstruction of scan {scan_name}: {e}")
+                self._reset_executor()
+                self._return_to_queue(scan_name)
+                break
+            self.running[scan_name] = future
+            future.add_done_callback(
+                lambda future, scan_name=scan_name: self._finished(scan_name, future)
+            )
+            started += 1
+
+        return started
+
+    def _finished(self, scan_name: str, future: concurrent.futures.Future) -> None:
+        # Note: Called from a thread of the executor
+        self.running.pop(scan_name, None)
+        try:
+            future.result()
+        except Exception as e:
+            log.error(f"Reconstruction worker for scan {scan_name} failed: {e}")
+            if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                # The pool is replaced in schedule(), as it cannot be shut down from its own thread
+                self.pool_broken = True
+            # The worker did not complete, so the scan could not be moved out of the recon folder
+            if os.path.isdir(mri4all_paths.DATA_RECON + "/" + scan_name):
+                queue.move_task(
+                    mri4all_paths.DATA_RECON + "/" + scan_name,
+                    mri4all_paths.DATA_FAILURE,
+                )
+        if self.on_finished:
+            self.on_finished()
+
+    def _reset_executor(self) -> None:
+        log.warning("Replacing the reconstruction worker pool")
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pool_broken = False
+
+    def _return_to_queue(self, scan_name: str) -> None:
+        if not queue.move_task(
+            mri4all_paths.DATA_RECON + "/" + scan_name,
+            mri4all_paths.DATA_QUEUE_RECON,
+        ):
+            queue.move_task(
+                mri4all_paths.DATA_RECON + "/" + scan_name,
+                mri4all_paths.DATA_FAILURE,
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the worker pool. By default, waits until the running reconstructions are completed."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
@@ -0,0 +1,64 @@
+"""
+Content-addressed cache for the intermediate results of the reconstruction stages. The key of each
+stage output is derived from the hash of the raw data files and the processing parameters that
+affect the stage (and all stages before it), so that a reconstruction that is repeated with changed
+parameters only recomputes the stages that are affected by the change. The cached arrays are stored
+as .npy files in the cache folder (see common.file_cache).
+"""
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import common.logger as logger
+from common.constants import *
+from common.file_cache import FileCache, hash_description, hash_files
+
+log = logger.get_logger()
+
+# Changing the version invalidates all entries, e.g., if the implementation of a stage changes
+CACHE_VERSION = 1
+
+
+def stage_key(stage: str, parent: str, parameters: Dict[str, Any] = {}) -> str:
+    """Returns the key of a stage output, given the key of its input and the stage parameters"""
+    return hash_description(
+        {
+            "version": CACHE_VERSION,
+            "stage": stage,
+            "parent": parent,
+            "parameters": parameters,
+        }
+    )
+
+
+class StageCache(FileCache):
+    def __init__(
+        self, folder: str = mri4all_paths.DATA_CACHE, max_size_mb: int = 2048
+    ):
+        super().__init__(folder, max_size_mb)
+
+    def is_entry(self, entry: os.DirEntry) -> bool:
+        # The cache folder also contains the folders of other caches (e.g., the sequence cache)
+        return entry.name.endswith(".npy") and entry.is_file()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        try:
+            array = np.load(self.path(key + ".npy"))
+            self.touch(key + ".npy")
+            return array
+        except (OSError, ValueError):
+            # Not cached (or evicted by another reconstruction process)
+            return None
+
+    def put(self, key: str, array: np.ndarray) -> None:
+        if array.nbytes > self.max_bytes:
+            return
+
+        def write_array(temp_path: str) -> None:
+            with open(temp_path, "wb") as f:
+                np.save(f, array)
+
+        self.write(key + ".npy", write_array)
@@ -0,0 +1,101 @@
+"""
+Incremental reconstruction of 3D Cartesian scans from raw data that is still being written. Readouts are
+placed into k-space as soon as they are available, and the 2D FFT (readout and phase direction) of each
+partition is calculated once all lines of the partition have been acquired. When the last partition is
+complete, only the FFT along the partition direction remains to be done.
+
+The scans currently reach the reconstruction only after the acquisition has finished, as the raw data is
+written at the end of run_pulseq (see common.rawdata). The reconstructor then processes the complete data
+in one pass, with the ADC phase correction, gridding and FFT fused per partition.
+"""
+import time
+from typing import Optional
+
+import numpy as np
+
+import common.logger as logger
+from common.rawdata import RawDataReader
+from recon.recon_utils.kspace_scatter import KSpaceScatter
+import recon.fft_provider as fftp
+
+log = logger.get_logger()
+
+
+class PartitionReconstructor:
+    """
+    Reconstructs the k-space layout used by the basic 3D reconstruction (readout x phase x partition).
+    The order contains the phase and partition encoding of each readout (relative to the k-space center)
+    and the ADC phases (in degrees) are removed from the readouts while gridding.
+    """
+
+    def __init__(
+        self,
+        reader: RawDataReader,
+        order: np.ndarray,
+        adc_phases: np.ndarray,
+        shape: tuple,
+        dtype=complex,
+    ):
+        self.reader = reader
+        self.scatter = KSpaceScatter(order, shape, adc_phases)
+        self.kspace = self.scatter.allocate(dtype)
+        self.image = np.zeros(dtype=dtype, shape=shape)
+        self.readouts = self.scatter.readouts
+        self.gridded = 0
+        # Number of readouts that are still missing for each partition
+        self.missing_lines = np.bincount(self.scatter.slc_index, minlength=shape[2])
+        self.transformed = np.zeros(shape[2], dtype=bool)
+
+    def process_available(self) -> int:
+        """
+        Grids all readouts that have been written since the last call and transforms the partitions that
+        are complete. Returns the number of readouts gridded so far.
+        """
+        available = min(self.reader.completed_readouts(), self.readouts)
+        if available <= self.gridded:
+            return self.gridded
+
+        start = self.gridded
+        self.scatter.scatter(self.kspace, self.reader.read(start, available), start)
+        self.gridded = available
+
+        slc_index = self.scatter.slc_index[start:available]
+        np.subtract.at(self.missing_lines, slc_index, 1)
+        for partition in np.unique(slc_index):
+            if self.missing_lines[partition] == 0:
+                self._transform_partition(partition)
+        return self.gridded
+
+    def _transform_partition(self, partition: int) -> None:
+        self.image[:, :, partition] = fftp.centered_fftn(
+            self.kspace[:, :, partition], input_shift="fftshift"
+        )
+        self.transformed[partition] = True
+
+    def is_complete(self) -> bool:
+        return self.gridded == self.readouts
+
+    def run(self, timeout: float = 0, polling_interval: float = 0.1) -> Optional[np.ndarray]:
+        """
+        Processes readouts until the acquisition has been completed and returns the image (the same result
+        as the centered 3D FFT of the k-space). Returns None if the data is incomplete after the timeout.
+        """
+        deadline = time.time() + timeout
+        while True:
+            self.process_available()
+            if self.is_complete() or time.time() >= deadline:
+                break
+            time.sleep(polling_interval)
+
+        if not self.is_complete():
+            log.error(
+                f"Raw data incomplete ({self.gridded} of {self.readouts} readouts available)"
+            )
+            return None
+
+        # Partitions without any acquired line have not been transformed yet
+        for partition in np.flatnonzero(~self.transformed):
+            self._transform_partition(partition)
+        return fftp.centered_fftn(
+            self.image, axes=2, overwrite_x=True, input_shift="fftshift"
+        )
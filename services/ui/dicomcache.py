@@ -0,0 +1,278 @@
+"""
+Cache of decoded DICOM series for the viewers of the UI. The same series is often shown in
+multiple viewers (or reloaded when switching between results), so the decoded volumes are kept
+in memory, limited by a memory budget with least-recently-used eviction.
+"""
+
+import glob
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+import numpy as np
+import pydicom
+
+import common.logger as logger
+
+log = logger.get_logger()
+
+# Maximum memory used by the cached volumes
+CACHE_BUDGET_MB = 1024
+# Number of threads used for reading the DICOM files of a series
+READ_WORKERS = 8
+# Series with at least this number of files are shown before all slices have been decoded
+LAZY_LOAD_MIN_SLICES = 16
+
+CacheKey = Tuple[Tuple[str, float], ...]
+
+
+class DicomSeriesInfo:
+    """
+    Header information of a series, sorted in slice order. Every entry of frames refers to one
+    image of the series as (file index, frame index within the file).
+    """
+
+    def __init__(
+        self,
+        files: List[str],
+        headers: List[pydicom.Dataset],
+        sort_headers: bool = True,
+    ):
+        self.files = files
+        self.frames: List[Tuple[int, int]] = []
+
+        if sort_headers:
+            order = sorted(
+                range(len(files)),
+                key=lambda i: (int(headers[i].get("InstanceNumber", 0) or 0), files[i]),
+            )
+            for i in order:
+                for frame in range(int(headers[i].get("NumberOfFrames", 1) or 1)):
+                    self.frames.append((i, frame))
+        else:
+            # Only the first header is given. The files are in slice order with one frame each
+            order = [0]
+            self.frames = [(i, 0) for i in range(len(files))]
+
+        first = headers[order[0]]
+        self.rows = int(first.Rows)
+        self.columns = int(first.Columns)
+        # Same type as returned by pixel_array for uncompressed data
+        signed = int(first.get("PixelRepresentation", 0)) == 1
+        bytes_allocated = int(first.BitsAllocated) // 8
+        self.dtype = np.dtype(f"{'i' if signed else 'u'}{bytes_allocated}")
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return (len(self.frames), self.rows, self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @property
+    def multiframe(self) -> bool:
+        return len(self.frames) > len(self.files)
+
+
+def get_series_files(input_path: Union[str, List[str]]) -> List[str]:
+    """Returns the sorted list of DICOM files for a file, a list of files, or a series prefix"""
+    if isinstance(input_path, list):
+        files = list(input_path)
+    elif Path(input_path).is_file():
+        files = [input_path]
+    else:
+        files = [str(name) for name in glob.glob(input_path + "*.dcm")]
+    files.sort()
+    return files
+
+
+def get_cache_key(files: List[str]) -> Optional[CacheKey]:
+    """The key contains the modification time of all files, so that updated series are reloaded"""
+    try:
+        return tuple((file, os.stat(file).st_mtime) for file in files)
+    except OSError:
+        return None
+
+
+def read_headers(files: List[str]) -> DicomSeriesInfo:
+    """Reads the headers (without pixel data) of all files of a series in parallel"""
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        headers = list(
+            executor.map(lambda f: pydicom.dcmread(f, stop_before_pixels=True), files)
+        )
+    return DicomSeriesInfo(files, headers)
+
+
+def read_first_header(files: List[str]) -> DicomSeriesInfo:
+    """
+    Reads only the header of the first file. Assumes that the (sorted) file names are in slice
+    order, as written by the reconstruction, so that the time does not depend on the series length.
+    """
+    header = pydicom.dcmread(files[0], stop_before_pixels=True)
+    return DicomSeriesInfo(files, [header], sort_headers=False)
+
+
+def read_file_frames(file: str) -> np.ndarray:
+    """Returns the images of a DICOM file as array (frames x rows x columns)"""
+    pixel_array = pydicom.dcmread(file).pixel_array
+    if pixel_array.ndim == 2:
+        pixel_array = pixel_array[np.newaxis]
+    return pixel_array
+
+
+def decode_volume(info: DicomSeriesInfo) -> np.ndarray:
+    """Decodes the pixel data of all files of a series in parallel"""
+    volume = np.zeros(info.shape, dtype=info.dtype)
+    positions: List[List[Tuple[int, int]]] = [[] for _ in info.files]
+    for slice_index, (file_index, frame) in enumerate(info.frames):
+        positions[file_index].append((slice_index, frame))
+
+    def decode(file_index: int):
+        frames = read_file_frames(info.files[file_index])
+        for slice_index, frame in positions[file_index]:
+            volume[slice_index] = frames[frame]
+
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        list(executor.map(decode, range(len(info.files))))
+    return volume
+
+
+class DicomVolumeCache:
+    """LRU cache of decoded volumes, limited by the total size of the volumes"""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.volumes: OrderedDict[CacheKey, np.ndarray] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(volume.nbytes for volume in self.volumes.values())
+
+    def get(self, key: Optional[CacheKey]) -> Optional[np.ndarray]:
+        if key is None:
+            return None
+        with self.lock:
+            volume = self.volumes.get(key)
+            if volume is not None:
+                self.volumes.move_to_end(key)
+            return volume
+
+    def put(self, key: Optional[CacheKey], volume: np.ndarray) -> None:
+        if key is None or volume.nbytes > self.budget_bytes:
+            return
+        # Cached volumes are shared between the viewers and must not be modified
+        volume.flags.writeable = False
+        with self.lock:
+            self.volumes[key] = volume
+            self.volumes.move_to_end(key)
+            while self.used_bytes > self.budget_bytes:
+                self.volumes.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.volumes.clear()
+
+
+volume_cache = DicomVolumeCache(CACHE_BUDGET_MB * 1024 * 1024)
+
+
+def get_cached_volume(files: List[str]) -> Optional[np.ndarray]:
+    return volume_cache.get(get_cache_key(files))
+
+
+def load_volume(input_path: Union[str, List[str]]) -> Optional[np.ndarray]:
+    """
+    Returns the volume (slices x rows x columns) of a DICOM series, either from the cache or by
+    reading the files. Returns None if no files exist.
+    """
+    files = get_series_files(input_path)
+    if not files:
+        return None
+
+    key = get_cache_key(files)
+    volume = volume_cache.get(key)
+    if volume is not None:
+        return volume
+
+    try:
+        volume = decode_volume(read_headers(files))
+    except Exception as e:
+        log.error(f"Unable to read DICOM series {files[0]}: {e}")
+        return None
+    volume_cache.put(key, volume)
+    return volume
+
+
+class LazyDicomVolume:
+    """
+    Volume of a DICOM series that is decoded slice by slice. The slices requested by the viewer are
+    decoded immediately, while a background thread decodes the remaining slices, starting with the
+    slices closest to the one currently shown. The volume array is filled in place, so that it can
+    be given to the viewer before all slices have been decoded. Once complete, the volume is added
+    to the cache.
+    """
+
+    def __init__(self, files: List[str]):
+        self.key = get_cache_key(files)
+        self.info = read_first_header(files)
+        self.volume = np.zeros(self.info.shape, dtype=self.info.dtype)
+        self.loaded = np.zeros(len(self.info.frames), dtype=bool)
+        self.current_slice = 0
+        self.cancelled = False
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def is_complete(self) -> bool:
+        return bool(self.loaded.all())
+
+    def load_slice(self, index: int) -> None:
+        if self.loaded[index]:
+            return
+        file_index, frame = self.info.frames[index]
+        self.volume[index] = read_file_frames(self.info.files[file_index])[frame]
+        self.loaded[index] = True
+
+    def load_slices(self, index: int, neighbours: int = 1) -> None:
+        """Decodes the given slice and its neighbours, and makes it the current slice"""
+        self.current_slice = index
+        start = max(0, index - neighbours)
+        stop = min(len(self.loaded), index + neighbours + 1)
+        for i in range(start, stop):
+            self.load_slice(i)
+
+    def next_slice(self) -> Optional[int]:
+        missing = np.flatnonzero(~self.loaded)
+        if len(missing) == 0:
+            return None
+        return int(missing[np.argmin(np.abs(missing - self.current_slice))])
+
+    def start(self, on_complete: Optional[Callable[[], None]] = None) -> None:
+        """Decodes the remaining slices in a background thread"""
+        self.thread = threading.Thread(
+            target=self._load_remaining, args=(on_complete,), daemon=True
+        )
+        self.thread.start()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def _load_remaining(self, on_complete: Optional[Callable[[], None]]) -> None:
+        try:
+            while not self.cancelled:
+                index = self.next_slice()
+                if index is None:
+                    break
+                self.load_slice(index)
+        except Exception as e:
+            log.error(f"Unable to read DICOM series {self.info.files[0]}: {e}")
+            return
+        if self.cancelled:
+            return
+        volume_cache.put(self.key, self.volume)
+        if on_complete:
+            on_complete()
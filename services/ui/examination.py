@@ -18,6 +18,7 @@ from common.constants import *
 from common.types import ScanQueueEntry, ScanTask
 from common.ipc import Communicator
 import common.ipc as ipc
+from common.ipc.shared_arrays import SharedArrayReader
 import common.helper as helper
 
 from common.types import ScanQueueEntry, ScanTask, ResultItem
@@ -77,6 +78,7 @@ class ExaminationWindow(QMainWindow):
 
     scanner_status_message = ""
     updating_queue_widget = False
+    shim_dlg = None
 
     shimSignal = pyqtSignal(object)
 
@@ -305,6 +307,12 @@ class ExaminationWindow(QMainWindow):
         self.acq_pipe.received.connect(self.received_acq)
         self.acq_pipe.listen()
 
+        # Arrays streamed by the services through shared memory (one ring per service)
+        self.shared_array_readers = {
+            self.recon_pipe: SharedArrayReader(),
+            self.acq_pipe: SharedArrayReader(),
+        }
+
         self.monitorTimer = QTimer(self)
         self.monitorTimer.timeout.connect(self.update_monitor_status)
         self.monitorTimer.start(1000)
@@ -353,11 +361,13 @@ class ExaminationWindow(QMainWindow):
                         text=dlg.textValue, int=dlg.intValue, float=dlg.doubleValue
                     )[msg_value.input_type]
                     value = get_value()
-                pipe.send_user_response(response=value, error=False)
+                pipe.send_user_response(
+                    response=value, error=False, reply_to=o.id
+                )
 
             except Exception as e:
                 log.exception("Error")
-                pipe.send_user_response(error=True)
+                pipe.send_user_response(error=True, reply_to=o.id)
         elif isinstance(msg_value, ipc.messages.UserAlertMessage):
             try:
                 msg = QMessageBox()
@@ -372,9 +382,9 @@ class ExaminationWindow(QMainWindow):
                 msg.setText(msg_value.message)
                 msg.exec_()
             except:
-                pipe.send_user_response(error=True)
+                pipe.send_user_response(error=True, reply_to=o.id)
             else:
-                pipe.send_user_response(error=False)
+                pipe.send_user_response(error=False, reply_to=o.id)
         elif isinstance(msg_value, ipc.messages.SetStatusMessage):
             self.set_status_message(msg_value.message)
         elif isinstance(msg_value, ipc.messages.ShowPlotMessage):
@@ -383,9 +393,9 @@ class ExaminationWindow(QMainWindow):
                 dlg = CustomMessageBox(self, sc)
                 msg_value.plot.show(sc.axes)
                 result = dlg.exec_()
-                pipe.send_user_response(response=result)
+                pipe.send_user_response(response=result, reply_to=o.id)
             except:
-                pipe.send_user_response(error=True)
+                pipe.send_user_response(error=True, reply_to=o.id)
                 raise
         elif isinstance(msg_value, ipc.messages.ShowDicomMessage):
             try:
@@ -393,22 +403,23 @@ class ExaminationWindow(QMainWindow):
                 dlg = CustomMessageBox(self, w)
                 w.load_dicoms(msg_value.dicom_files)
                 result = dlg.exec_()
-                pipe.send_user_response(response=result)
+                pipe.send_user_response(response=result, reply_to=o.id)
             except:
-                pipe.send_user_response(error=True)
+                pipe.send_user_response(error=True, reply_to=o.id)
                 raise
         elif isinstance(msg_value, ipc.messages.DoShimMessage):
             if msg_value.message == "start":
                 self.shim_dlg = ShimBox(self)
                 self.shimSignal.connect(self.shim_dlg.new_data)
                 self.shim_dlg.show()
-                pipe.send_user_response()
+                pipe.send_user_response(reply_to=o.id)
             elif msg_value.message == "get":
                 pipe.send_user_response(
                     {
                         "values": self.shim_dlg.current_values.model_dump(),
                         "complete": self.shim_dlg.user_clicked != None,
-                    }
+                    },
+                    reply_to=o.id,
                 )
             elif msg_value.message == "put":
                 # self.shim_dlg.canvas.axes.clear()
@@ -416,6 +427,30 @@ class ExaminationWindow(QMainWindow):
                 self.shimSignal.emit(msg_value.data)
                 # self.shim_dlg.canvas.axes.plot([1, 2, 3, 4, 5, 6])  # [msg_value.data])
                 # self.shim_dlg.canvas.axes.up
+        elif isinstance(msg_value, ipc.messages.SharedArrayMessage):
+            data = self.shared_array_readers[pipe].read(msg_value)
+            if msg_value.target == "shim":
+                # Skip frames that have already been overwritten by newer data
+                if data is not None and self.shim_dlg:
+                    self.shimSignal.emit(data)
+            else:
+                try:
+                    if data is None:
+                        raise Exception("Shared array not available anymore")
+                    sc = MplCanvas(width=7, height=4)
+                    dlg = CustomMessageBox(self, sc)
+                    if msg_value.target == "image":
+                        sc.axes.imshow(data)
+                    else:
+                        sc.axes.plot(data.T if data.ndim > 1 else data)
+                    sc.axes.set_xlabel(msg_value.xlabel)
+                    sc.axes.set_ylabel(msg_value.ylabel)
+                    sc.axes.set_title(msg_value.title)
+                    result = dlg.exec_()
+                    pipe.send_user_response(response=result, reply_to=o.id)
+                except:
+                    pipe.send_user_response(error=True, reply_to=o.id)
+                    raise
         elif isinstance(msg_value, ipc.messages.AcqDataMessage):
             try:
                 ui_runtime.status_start_time = datetime.fromisoformat(
@@ -433,7 +468,7 @@ class ExaminationWindow(QMainWindow):
 
     def update_monitor_status(self):
         self.monitorTimer.stop()
-        self.sync_queue_widget(False)
+        self.sync_queue_widget(False, changed_only=True)
 
         new_status_message = ""
 
@@ -1036,11 +1071,12 @@ class ExaminationWindow(QMainWindow):
                 task.set_task_state(scan_path, mri4all_files.STOP, True)
         self.sync_queue_widget(False)
 
-    def sync_queue_widget(self, reset: bool):
+    def sync_queue_widget(self, reset: bool, changed_only: bool = False):
         """
         Update/sync the displayed scan queue list according to the list kept by the runtime
         environment (which is synced with the folders and contains information about the
-        sequence types and state)
+        sequence types and state). If changed_only is set, only entries with changed state
+        are updated in the widget.
         """
         # Avoid running updates in parallel
         if self.updating_queue_widget:
@@ -1062,8 +1098,14 @@ class ExaminationWindow(QMainWindow):
                 if not entry:
                     log.error("Invalid scan queue index while updating widget")
                     continue
+                if (
+                    changed_only
+                    and entry.folder_name not in ui_runtime.scan_queue_changed_entries
+                ):
+                    continue
                 self.update_entry_in_queue_widget(i, entry)
 
+        ui_runtime.scan_queue_changed_entries.clear()
         self.updating_queue_widget = False
 
     def delete_sequence_clicked(self):
@@ -43,13 +43,10 @@ class ShimBox(QDialog):
 
     @pyqtSlot(object)
     def new_data(self, data):
-        self.innerLayout.removeWidget(self.canvas)
-        self.canvas = MplCanvas(width=7, height=4)
-        self.innerLayout.addWidget(self.canvas)
-        # self.canvas = sc
-        # self.canvas.axes.clear()
+        # Reuse the canvas, as recreating it for every update is too slow for streaming
+        self.canvas.axes.clear()
         self.canvas.axes.plot(data)
-        # self.canvas.axes.draw()
+        self.canvas.draw_idle()
 
     def button_clicked(self, button: QPushButton):
         self.user_clicked = button.text()
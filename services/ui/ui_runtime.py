@@ -5,7 +5,7 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *  # type: ignore
 import qtawesome as qta
 
-from typing import Tuple, List, cast
+from typing import Tuple, List, Set, cast
 from typing import Any
 
 from common.types import (
@@ -39,6 +39,10 @@ exam_information = ExamInformation()
 system_information = SystemInformation()
 
 scan_queue_list: List[ScanQueueEntry] = []
+# Folder names of the queue entries that have changed since the queue widget was last synced
+scan_queue_changed_entries: Set[str] = set()
+# Tracks in which state folders changes have occurred, so that only changed tasks need to be checked
+task_state_index = queue.TaskStateIndex()
 editor_sequence_instance: SequenceBase = SequenceBase()
 editor_active: bool = False
 editor_readonly: bool = False
@@ -106,6 +110,8 @@ def register_patient():
         return
 
     scan_queue_list.clear()
+    scan_queue_changed_entries.clear()
+    task_state_index.invalidate()
     examination_widget.prepare_examination_ui()
     stacked_widget.setCurrentIndex(1)
     status_last_completed_scan = -1
@@ -165,6 +171,34 @@ def get_scan_queue_entry(index: int) -> Any:
     return scan_queue_list[index]
 
 
+def get_task_state(folder: str) -> str:
+    """
+    Determines the state of a task from the current location of the task folder. Returns an empty
+    string if the task folder cannot be found.
+    """
+    current_state = ""
+
+    if os.path.isdir(mri4all_paths.DATA_QUEUE_ACQ + "/" + folder):
+        if os.path.isfile(
+            mri4all_paths.DATA_QUEUE_ACQ + "/" + folder + "/" + mri4all_files.PREPARED
+        ):
+            current_state = mri4all_states.SCHEDULED_ACQ
+        else:
+            current_state = mri4all_states.CREATED
+    if os.path.isdir(mri4all_paths.DATA_ACQ + "/" + folder):
+        current_state = mri4all_states.ACQ
+    if os.path.isdir(mri4all_paths.DATA_QUEUE_RECON + "/" + folder):
+        current_state = mri4all_states.SCHEDULED_RECON
+    if os.path.isdir(mri4all_paths.DATA_RECON + "/" + folder):
+        current_state = mri4all_states.RECON
+    if os.path.isdir(mri4all_paths.DATA_COMPLETE + "/" + folder):
+        current_state = mri4all_states.COMPLETE
+    if os.path.isdir(mri4all_paths.DATA_FAILURE + "/" + folder):
+        current_state = mri4all_states.FAILURE
+
+    return current_state
+
+
 def update_scan_queue_list() -> bool:
     global scan_queue_list
     global status_acq_active
@@ -178,43 +212,35 @@ def update_scan_queue_list() -> bool:
 
     status_last_completed_scan = ""
 
+    # Only tasks whose folders have changed need to be checked. If the changes are unknown,
+    # all tasks are checked
+    changed_tasks = task_state_index.get_changed_tasks()
+
     for entry in scan_queue_list:
         folder = entry.folder_name
         old_state = entry.state
-        current_state = ""
-
-        # Check the current location of the task folder to determine the state
-        if os.path.isdir(mri4all_paths.DATA_QUEUE_ACQ + "/" + folder):
-            if os.path.isfile(
-                mri4all_paths.DATA_QUEUE_ACQ
-                + "/"
-                + folder
-                + "/"
-                + mri4all_files.PREPARED
-            ):
-                current_state = mri4all_states.SCHEDULED_ACQ
-            else:
-                current_state = mri4all_states.CREATED
-        if os.path.isdir(mri4all_paths.DATA_ACQ + "/" + folder):
-            current_state = mri4all_states.ACQ
-            acq_active = True
-        if os.path.isdir(mri4all_paths.DATA_QUEUE_RECON + "/" + folder):
-            current_state = mri4all_states.SCHEDULED_RECON
-            recon_active = True
-        if os.path.isdir(mri4all_paths.DATA_RECON + "/" + folder):
-            current_state = mri4all_states.RECON
-            recon_active = True
-        if os.path.isdir(mri4all_paths.DATA_COMPLETE + "/" + folder):
-            current_state = mri4all_states.COMPLETE
-            status_last_completed_scan = entry.folder_name
-            if current_state != old_state:
+        current_state = old_state
+
+        if (changed_tasks is None) or (folder in changed_tasks):
+            # Check the current location of the task folder to determine the state
+            current_state = get_task_state(folder)
+
+            if current_state == mri4all_states.COMPLETE and current_state != old_state:
                 # State has changed to complete. Check if the cas has results. In that
                 # case, an icon will be showed in the UI
                 temp_scan = task.read_task(mri4all_paths.DATA_COMPLETE + "/" + folder)
-                if len(temp_scan.results) > 0:
+                if temp_scan and len(temp_scan.results) > 0:
                     entry.has_results = True
-        if os.path.isdir(mri4all_paths.DATA_FAILURE + "/" + folder):
-            current_state = mri4all_states.FAILURE
+
+            if current_state != old_state:
+                scan_queue_changed_entries.add(folder)
+
+        if current_state == mri4all_states.ACQ:
+            acq_active = True
+        if current_state in [mri4all_states.SCHEDULED_RECON, mri4all_states.RECON]:
+            recon_active = True
+        if current_state == mri4all_states.COMPLETE:
+            status_last_completed_scan = entry.folder_name
 
         # Jobs that have not been found will fall out of the list
         if current_state:
@@ -268,6 +294,7 @@ def create_new_scan(requested_sequence: str) -> bool:
     new_scan.folder_name = task_folder
     new_scan.description = seq_description
     scan_queue_list.append(new_scan)
+    scan_queue_changed_entries.add(task_folder)
 
     # Check if all entries of the scan queue are up-to-date
     update_scan_queue_list()
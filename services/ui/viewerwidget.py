@@ -1,4 +1,3 @@
-import glob
 import sip  # type: ignore
 import pickle
 from pathlib import Path
@@ -8,7 +7,6 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *  # type: ignore
 
 import pyqtgraph as pg  # type: ignore
-import pydicom
 import numpy as np
 from PyQt5 import QtGui
 
@@ -17,6 +15,7 @@ from matplotlib.figure import Figure
 from matplotlib.widgets import SpanSelector
 import matplotlib.pyplot as plt
 import common.logger as logger
+import services.ui.dicomcache as dicomcache
 from common.types import ResultTypes, ScanTask, TimeSeriesResult
 
 log = logger.get_logger()
@@ -52,23 +51,38 @@ class StaticTextItem(pg.TextItem):
         self.updateTextPos()
 
 
+class LazyLoadNotifier(QObject):
+    """
+    Signals the completion of a lazily loaded volume from the background thread to the
+    UI thread.
+    """
+
+    completed = pyqtSignal()
+
+
 class ViewerWidget(QWidget):
     # layout: QBoxLayout
     widget: Optional[QWidget] = None
     viewed_scan_task: Optional[ScanTask] = None
     viewer_mode: ResultTypes = "empty"
+    lazy_volume: Optional[dicomcache.LazyDicomVolume] = None
 
     def __init__(self):
         super(ViewerWidget, self).__init__()
         self.setLayout(QVBoxLayout(self))
         self.layout().setContentsMargins(0, 0, 0, 0)
         self.layout().setSpacing(0)
+        self.lazy_load_notifier = LazyLoadNotifier()
+        self.lazy_load_notifier.completed.connect(self.lazy_load_completed)
         self.set_empty_viewer()
 
     # def __del__(self):
     #     self.clear_view()
 
     def clear_view(self):
+        if self.lazy_volume:
+            self.lazy_volume.cancel()
+            self.lazy_volume = None
         if self.widget:
             widget_to_delete = self.widget
             self.layout().removeWidget(self.widget)
@@ -100,35 +114,46 @@ class ViewerWidget(QWidget):
             return False
 
     def load_dicoms(self, input_path, task: Optional[ScanTask] = None):
+        if self.lazy_volume:
+            self.lazy_volume.cancel()
+            self.lazy_volume = None
         if not input_path:
             self.set_empty_viewer()
             return
 
-        lstFilesDCM = None
-        if isinstance(input_path, list):
-            lstFilesDCM = input_path
-        else:
-            path = Path(input_path)
-            if not path.is_file():
-                lstFilesDCM = [str(name) for name in glob.glob(input_path + "*.dcm")]
-            else:
-                lstFilesDCM = [input_path]
-        lstFilesDCM.sort()
+        lstFilesDCM = dicomcache.get_series_files(input_path)
         if len(lstFilesDCM) < 1:
             self.set_empty_viewer()
             return
 
-        ds = pydicom.dcmread(lstFilesDCM[0])
-        ConstPixelDims = (len(lstFilesDCM), int(ds.Rows), int(ds.Columns))
-        ArrayDicom = np.zeros(ConstPixelDims, dtype=ds.pixel_array.dtype)
-        for filenameDCM in lstFilesDCM:
-            ds = pydicom.dcmread(filenameDCM)
-            ArrayDicom[lstFilesDCM.index(filenameDCM), :, :] = ds.pixel_array
+        ArrayDicom = dicomcache.get_cached_volume(lstFilesDCM)
+        levels = None
+        if ArrayDicom is None and len(lstFilesDCM) >= dicomcache.LAZY_LOAD_MIN_SLICES:
+            # Show the first slices right away and decode the rest in the background
+            try:
+                self.lazy_volume = dicomcache.LazyDicomVolume(lstFilesDCM)
+                self.lazy_volume.load_slices(0)
+            except Exception as e:
+                log.error(f"Unable to read DICOM series {lstFilesDCM[0]}: {e}")
+                self.lazy_volume = None
+                self.set_empty_viewer()
+                return
+            ArrayDicom = self.lazy_volume.volume
+            loaded = ArrayDicom[self.lazy_volume.loaded]
+            levels = (loaded.min(), loaded.max())
+        elif ArrayDicom is None:
+            ArrayDicom = dicomcache.load_volume(lstFilesDCM)
+            if ArrayDicom is None:
+                self.set_empty_viewer()
+                return
 
         pg.setConfigOptions(imageAxisOrder="row-major", antialias=True)
 
         self.widget = pg.ImageView()
-        self.widget.setImage(ArrayDicom)
+        self.widget.setImage(ArrayDicom, levels=levels)
+        if self.lazy_volume:
+            self.widget.sigTimeChanged.connect(self.lazy_slice_changed)
+            self.lazy_volume.start(self.lazy_load_notifier.completed.emit)
         self.widget.timeLine.setPen(color=(200, 200, 200), width=8)
         self.widget.timeLine.setHoverPen(color=(255, 255, 255), width=8)
 
@@ -152,6 +177,24 @@ class ViewerWidget(QWidget):
 
         self.layout().addWidget(self.widget)
 
+    def lazy_slice_changed(self, index, time):
+        """Decodes the shown slice and its neighbours if not done yet in the background"""
+        if not self.lazy_volume:
+            return
+        if not self.lazy_volume.loaded[index]:
+            self.lazy_volume.load_slices(index)
+            self.widget.updateImage()
+        else:
+            self.lazy_volume.current_slice = index
+
+    def lazy_load_completed(self):
+        if not self.lazy_volume or not self.lazy_volume.is_complete:
+            return
+        # All slices are now available, so the histogram can show the full value range
+        self.widget.updateImage(autoHistogramRange=True)
+        self.widget.sigTimeChanged.disconnect(self.lazy_slice_changed)
+        self.lazy_volume = None
+
     def load_pickled_plot(self, input_path, task: Optional[ScanTask] = None):
         if not input_path:
             self.set_empty_viewer()
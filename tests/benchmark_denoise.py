@@ -0,0 +1,68 @@
+import sys
+import time
+
+sys.path.insert(0, ".")
+# setting path
+sys.path.append("../")
+
+import numpy as np
+
+import common.logger as logger
+import common.runtime as rt
+
+rt.set_service_name("tests")
+log = logger.get_logger()
+
+from recon.image_filters import denoise
+
+METHODS = ["gaussian_filter", "total_variation", "nl_means", "bilateral"]
+MATRICES = [(128, 128, 1), (64, 64, 16), (128, 128, 64)]
+# The bilateral and NL-means filters are slow, so they are only measured on small matrices
+FAST_METHODS = ["gaussian_filter", "total_variation"]
+SMALL_MATRIX_SIZE = 64 * 64 * 16
+
+
+def create_test_data(shape):
+    """Creates a noisy complex volume (ellipsoid phantom with Gaussian noise)."""
+    rng = np.random.default_rng(0)
+    axes = [np.linspace(-1, 1, n) if n > 1 else np.zeros(1) for n in shape]
+    x, y, z = np.meshgrid(*axes, indexing="ij")
+    phantom = ((x / 0.8) ** 2 + (y / 0.6) ** 2 + (z / 0.9) ** 2 < 1).astype(float)
+    noise = rng.normal(scale=0.1, size=shape) + 1j * rng.normal(scale=0.1, size=shape)
+    return phantom * np.exp(1j * 0.5) + noise
+
+
+def run_benchmarks(methods=METHODS, matrices=MATRICES) -> bool:
+    log.info("Running denoising benchmark...")
+    log.info("method          | matrix          | strength | legacy (ms) | engine (ms)")
+    for shape in matrices:
+        image = create_test_data(shape)
+        if shape[-1] == 1:
+            image = image[..., 0]
+        for method in methods:
+            if method not in FAST_METHODS and np.prod(shape) > SMALL_MATRIX_SIZE:
+                continue
+            for strength in range(denoise.MAX_DENOISE_STRENGTH + 1):
+                duration_legacy = float("nan")
+                if strength > 0:
+                    start = time.perf_counter()
+                    try:
+                        denoise.remove_gaussian_noise_complex(image, method, strength)
+                        duration_legacy = time.perf_counter() - start
+                    except (NotImplementedError, ValueError):
+                        # The legacy wrappers treat the last axis of 2D images as channels
+                        pass
+
+                start = time.perf_counter()
+                denoise.denoise_volume_complex(image, method, strength)
+                duration_engine = time.perf_counter() - start
+
+                log.info(
+                    f"{method:15s} | {str(shape):15s} | {strength:8d} | "
+                    + f"{duration_legacy * 1000:11.1f} | {duration_engine * 1000:11.1f}"
+                )
+    return True
+
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,69 @@
+import sys
+import time
+import threading
+
+sys.path.insert(0, ".")
+# setting path
+sys.path.append("../")
+
+import common.logger as logger
+import common.runtime as rt
+
+rt.set_service_name("tests")
+log = logger.get_logger()
+
+from common.ipc import Communicator, Transport
+from common.ipc.messages import SetStatusMessage, ShowPlotMessage
+from common.types import IntensityMapResult
+
+
+def benchmark_transport(transport: Transport, message, count: int) -> None:
+    """Sends the message count times from the acq end to the UI end and reports the throughput."""
+    receiver = Communicator(Communicator.UI_ACQ, transport)
+    sender = Communicator(Communicator.ACQ, transport)
+
+    def receive():
+        listener = receiver._listen()
+        for _ in range(count):
+            next(listener)
+
+    receive_thread = threading.Thread(target=receive, daemon=True)
+    receive_thread.start()
+    # Give the receiver time to open its end
+    time.sleep(0.2)
+
+    payload_bytes = len(message.model_dump_json())
+    start = time.perf_counter()
+    for _ in range(count):
+        if not sender._send(message):
+            log.error(f"Sending failed with transport {transport.value}")
+            return
+    receive_thread.join()
+    duration = time.perf_counter() - start
+
+    log.info(
+        f"{transport.value:>6} | {type(message).__name__:<17} | "
+        + f"{count / duration:10.1f} msg/s | "
+        + f"{payload_bytes * count / duration / 1e6:8.1f} MB/s (JSON equivalent)"
+    )
+
+
+def run_benchmarks() -> bool:
+    log.info("Running IPC benchmarks...")
+    log.info("")
+
+    status_message = SetStatusMessage(message="Running scan...")
+    image_message = ShowPlotMessage(
+        plot=IntensityMapResult(
+            data=[[float(x * y) for x in range(256)] for y in range(256)]
+        )
+    )
+
+    for transport in [Transport.FIFO, Transport.SOCKET]:
+        benchmark_transport(transport, status_message, 5000)
+        benchmark_transport(transport, image_message, 50)
+    return True
+
+
+if __name__ == "__main__":
+    run_benchmarks()
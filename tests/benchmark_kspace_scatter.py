@@ -0,0 +1,78 @@
+import sys
+import time
+
+sys.path.insert(0, ".")
+# setting path
+sys.path.append("../")
+
+import numpy as np
+
+import common.logger as logger
+import common.runtime as rt
+
+rt.set_service_name("tests")
+log = logger.get_logger()
+
+from recon.recon_utils.kspace_scatter import KSpaceScatter, apply_phase_ramp
+
+
+def scatter_loop(order, adc_phases, kData, shape):
+    """Previous implementation of the basic 3D reconstruction (one readout per iteration)."""
+    kSpace = np.zeros(dtype=complex, shape=shape)
+    center_slc = kSpace.shape[2] - int(kSpace.shape[2] / 2)
+    center_pe = kSpace.shape[1] - int(kSpace.shape[1] / 2)
+    max_slc = kSpace.shape[2]
+    max_pe = kSpace.shape[1]
+
+    counter = 0
+    for line in order:
+        adc_phase = adc_phases[counter] / 180.0 * np.pi
+        kSpace[
+            :, (center_pe - line[0]) % max_pe, (center_slc - line[1]) % max_slc
+        ] = kData[counter, :] * np.exp(adc_phase * 1j)
+        counter += 1
+
+    base_res = kSpace.shape[0]
+    for sample in range(0, base_res):
+        kSpace[sample, :, :] = kSpace[sample, :, :] * np.exp(
+            np.pi * 1j + (sample - base_res / 2) / 32 * np.pi * 1j
+        )
+    return kSpace
+
+
+def scatter_vectorized(order, adc_phases, kData, shape):
+    kSpace = KSpaceScatter(order, shape, adc_phases)(kData)
+    return apply_phase_ramp(kSpace, offset=np.pi, slope=np.pi / 32, axis=0)
+
+
+def run_benchmarks(read: int = 128, pe: int = 128, slc: int = 64) -> bool:
+    log.info(f"Running k-space scatter benchmark ({read}x{pe}x{slc})...")
+    shape = (read, pe, slc)
+
+    rng = np.random.default_rng(0)
+    order = np.array(
+        [(pe // 2 - p, slc // 2 - s) for s in range(slc) for p in range(pe)]
+    )
+    rng.shuffle(order)
+    adc_phases = rng.uniform(0, 360, len(order))
+    kData = rng.normal(size=(len(order), read)) + 1j * rng.normal(
+        size=(len(order), read)
+    )
+
+    timings = {}
+    results = {}
+    for name, function in [("loop", scatter_loop), ("vectorized", scatter_vectorized)]:
+        start = time.perf_counter()
+        results[name] = function(order, adc_phases, kData, shape)
+        timings[name] = time.perf_counter() - start
+        log.info(f"{name:>10} | {timings[name] * 1000:10.1f} ms")
+
+    if not np.allclose(results["loop"], results["vectorized"]):
+        log.error("Results of the implementations differ")
+        return False
+    log.info(f"Speedup: {timings['loop'] / timings['vectorized']:.1f}x")
+    return True
+
+
+if __name__ == "__main__":
+    run_benchmarks()
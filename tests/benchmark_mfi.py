@@ -0,0 +1,65 @@
+import sys
+import time
+
+sys.path.insert(0, ".")
+# setting path
+sys.path.append("../")
+
+import numpy as np
+
+import common.logger as logger
+import common.runtime as rt
+
+rt.set_service_name("tests")
+log = logger.get_logger()
+
+from recon.B0Correction import OCTOPUS as oc
+from recon.B0Correction.MFIEngine import MFIEngine
+
+
+def create_test_data(N: int, slices: int, df_max: float = 200.0):
+    """Creates random k-space data, a Cartesian readout timing, and a smooth field map (Hz)."""
+    rng = np.random.default_rng(0)
+    Y = rng.normal(size=(N, N, slices)) + 1j * rng.normal(size=(N, N, slices))
+    # Readout along the second axis, 5 us dwell time
+    kt = np.tile(np.arange(N) * 5e-6 + 2e-3, (N, 1))
+    x, y, z = np.meshgrid(
+        np.linspace(-1, 1, N), np.linspace(-1, 1, N), np.linspace(-1, 1, slices), indexing="ij"
+    )
+    df = df_max * np.exp(-(x**2 + y**2 + z**2))
+    return Y, kt, df
+
+
+def run_benchmarks(N: int = 64, slices: int = 8) -> bool:
+    log.info(f"Running MFI benchmark ({N}x{N}x{slices})...")
+    Y, kt, df = create_test_data(N, slices)
+
+    # Single slice: both implementations use the same frequencies and must agree
+    start = time.perf_counter()
+    reference = oc.MFI(Y[..., 0], "raw", kt, df[..., 0], 1)
+    duration_octopus = time.perf_counter() - start
+    start = time.perf_counter()
+    result = MFIEngine(kt, df[..., 0])(Y[..., 0])
+    duration_engine = time.perf_counter() - start
+    log.info(f"    2D OCTOPUS | {duration_octopus * 1000:10.1f} ms")
+    log.info(f"    2D engine  | {duration_engine * 1000:10.1f} ms")
+    if not np.allclose(reference, result):
+        log.error("Results of the implementations differ")
+        return False
+
+    # Volume: slice loop of OCTOPUS vs native 3D processing
+    start = time.perf_counter()
+    for i in range(slices):
+        oc.MFI(Y[..., i], "raw", kt, df[..., i], 1)
+    duration_octopus = time.perf_counter() - start
+    start = time.perf_counter()
+    MFIEngine(kt, df)(Y)
+    duration_engine = time.perf_counter() - start
+    log.info(f"    3D OCTOPUS | {duration_octopus * 1000:10.1f} ms")
+    log.info(f"    3D engine  | {duration_engine * 1000:10.1f} ms")
+    log.info(f"Speedup: {duration_octopus / duration_engine:.1f}x")
+    return True
+
+
+if __name__ == "__main__":
+    run_benchmarks()
@@ -0,0 +1,122 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+# setting path
+sys.path.append("../")
+
+import numpy as np
+
+import common.logger as logger
+import common.runtime as rt
+
+rt.set_service_name("tests")
+log = logger.get_logger()
+
+from pypulseq.event_lib import EventLibrary
+from common.constants import *
+from sequences.common import make_tse_3D
+
+# pypulseq.Sequence is shadowed by the Sequence class, so the module is taken from
+# sys.modules
+pp_sequence = sys.modules["pypulseq.Sequence.sequence"]
+
+# Base resolution, slices and echo train length of the 3D TSE sequences
+MATRICES = [(32, 8, 8), (64, 16, 8), (64, 32, 8)]
+
+
+class LegacyEventLibrary(EventLibrary):
+    """Previous implementation of the event lookup (string keys)."""
+
+    def find(self, new_data):
+        new_data = np.array(new_data)
+        data_string = np.array2string(
+            new_data, formatter={"float": lambda x: f"{x:.6g}"}
+        )
+        data_string = data_string.replace("[", "")
+        data_string = data_string.replace("]", "")
+        try:
+            key_id = self.keymap[data_string]
+            found = True
+        except KeyError:
+            key_id = 1 if len(self.keys) == 0 else max(self.keys) + 1
+            found = False
+        return key_id, found
+
+    def insert(self, key_id, new_data, data_type=str()):
+        new_data = np.array(new_data)
+        self.keys[key_id] = key_id
+        self.data[key_id] = new_data
+        self.lengths[key_id] = max(new_data.shape)
+        data_string = np.array2string(
+            new_data, formatter={"float_kind": lambda x: "%.6g" % x}
+        )
+        data_string = data_string.replace("[", "")
+        data_string = data_string.replace("]", "")
+        self.keymap[data_string] = key_id
+        if data_type != "":
+            self.type[key_id] = data_type
+
+
+def build_sequence(folder: str, matrix, library_class) -> float:
+    """Builds the 3D TSE sequence with the given event library, returns the duration."""
+    base_resolution, slices, etl = matrix
+    os.makedirs(folder + "/" + mri4all_taskdata.RAWDATA, exist_ok=True)
+    pp_sequence.EventLibrary = library_class
+    try:
+        start = time.perf_counter()
+        make_tse_3D.pypulseq_tse3D(
+            inputs={
+                "TE": 20,
+                "TR": 250,
+                "NSA": 1,
+                "ETL": etl,
+                "FOV": 20,
+                "Orientation": "Axial",
+                "Base_Resolution": base_resolution,
+                "Slices": slices,
+                "BW": 32000,
+                "Trajectory": "Cartesian",
+                "Ordering": "linear_up",
+                "Plot_Timing": False,
+                "dummy_shots": 0,
+                "FA1": 90,
+                "FA2": 180,
+            },
+            check_timing=False,
+            output_file=folder + "/acq0.seq",
+            pe_order_file=folder + "/" + mri4all_taskdata.RAWDATA + "/pe_order.npy",
+            output_folder=folder,
+        )
+        return time.perf_counter() - start
+    finally:
+        pp_sequence.EventLibrary = EventLibrary
+
+
+def run_benchmarks(matrices=MATRICES) -> bool:
+    log.info("Running sequence build benchmark...")
+    log.info("matrix          | legacy (ms) | hashed (ms) | identical")
+    success = True
+    for matrix in matrices:
+        with tempfile.TemporaryDirectory() as folder:
+            duration_legacy = build_sequence(
+                folder + "/legacy", matrix, LegacyEventLibrary
+            )
+            duration_hashed = build_sequence(folder + "/hashed", matrix, EventLibrary)
+            with open(folder + "/legacy/acq0.seq") as f:
+                seq_legacy = f.read()
+            with open(folder + "/hashed/acq0.seq") as f:
+                seq_hashed = f.read()
+        identical = seq_legacy == seq_hashed
+        success = success and identical
+        log.info(
+            f"{str(matrix):15s} | {duration_legacy * 1000:11.1f} | "
+            + f"{duration_hashed * 1000:11.1f} | {identical}"
+        )
+    return success
+
+
+if __name__ == "__main__":
+    run_benchmarks()